@@ -6,7 +6,13 @@
 #
 # (c) Copyright 2021 Xilinx Inc.
 
-from aie.compiler.aiecc.main import main
+import os
+
+# Opt in to compiling on a running aiecc-server.py.
+if os.getenv("AIECC_SERVER_SOCKET"):
+    from aie.compiler.aiecc.server import client_main as main
+else:
+    from aie.compiler.aiecc.main import main
 
 if __name__ == "__main__":
     main()
@@ -12,4 +12,14 @@ __email__ = "stephenn@xilinx.com"
 __versioninfo__ = (0, 1, 0)
 __version__ = ".".join(str(v) for v in __versioninfo__) + "dev"
 
-__all__ = []
+__all__ = ["Artifacts", "compile", "compile_async"]
+
+
+# Loaded on first use: the aiecc command line imports this package too, and
+# must not pay for the flow's dependencies before it needs them.
+def __getattr__(name):
+    if name in __all__:
+        import aie.compiler.aiecc.api
+
+        return getattr(aie.compiler.aiecc.api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,118 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Compile a design in-process and get the artifacts back in memory.
+
+Example usage:
+>>> from aie.compiler.aiecc import compile
+>>> artifacts = compile(module, ["--no-xchesscc", "--no-xbridge"])
+>>> artifacts.xclbin[:8], artifacts.insts.dtype
+(b'xclbin2\x00', dtype('uint32'))
+
+The tools still exchange files, so the flow runs in a scratch directory, on
+/dev/shm where there is one, which is removed once the artifacts have been
+read back.  Pass `tmpdir` to keep the files for debugging instead.
+"""
+
+import asyncio
+import contextlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+import aie.compiler.aiecc.cl_arguments
+
+# What compile() produces unless the options say otherwise.
+DEFAULT_OPTIONS = [
+    "--aie-generate-xclbin",
+    "--aie-generate-ipu",
+    "--no-compile-host",
+]
+
+# Scratch directories go to memory-backed storage where there is some.
+SCRATCH_DIR = "/dev/shm"
+
+
+@dataclass
+class Artifacts:
+    # Contents of the xclbin, with --aie-generate-xclbin.
+    xclbin: Optional[bytes] = None
+    # Contents of the PDI the xclbin embeds, with --aie-generate-xclbin.
+    pdi: Optional[bytes] = None
+    # The IPU instruction stream as a NumPy array of uint32, with
+    # --aie-generate-ipu.
+    insts: Optional["numpy.ndarray"] = None
+    # The directory the flow ran in, if it was kept.
+    tmpdir: Optional[str] = None
+
+
+def _read(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _read_insts(path):
+    import numpy as np
+
+    text = _read(path)
+    if text is None:
+        return None
+    return np.array([int(word, 16) for word in text.split()], dtype=np.uint32)
+
+
+@contextlib.contextmanager
+def _scratch(tmpdir):
+    if tmpdir is not None:
+        os.makedirs(tmpdir, exist_ok=True)
+        yield os.path.abspath(tmpdir)
+        return
+    scratch = SCRATCH_DIR if os.access(SCRATCH_DIR, os.W_OK) else None
+    with tempfile.TemporaryDirectory(prefix="aiecc-", dir=scratch) as directory:
+        yield directory
+
+
+async def compile_async(module, options: Sequence[str] = (), tmpdir=None):
+    """Like compile(), for callers that already run an asyncio event loop."""
+    import aie.compiler.aiecc.main as aiecc
+
+    opts = aie.compiler.aiecc.cl_arguments.parse_args([*DEFAULT_OPTIONS, *options])
+    if opts.aiesim and not opts.xbridge:
+        raise ValueError("AIE Simulation (--aiesim) currently requires --xbridge")
+    # Library callers own stdout; only report the Vitis lookup with -v.
+    aiecc.setup_environment(opts, quiet=not opts.verbose)
+
+    with _scratch(tmpdir) as workdir:
+        # Everything, the outputs included, stays in the scratch directory.
+        opts.tmpdir = os.path.join(workdir, "module.prj")
+        opts.xclbin_name = os.path.join(workdir, "final.xclbin")
+        opts.insts_name = os.path.join(workdir, "insts.txt")
+        runner = aiecc.FlowRunner(
+            str(module), opts, aiecc.make_tmpdir(opts, workdir), workdir=workdir
+        )
+        await runner.run_flow()
+        aiecc.report_run(runner)
+        return Artifacts(
+            xclbin=_read(opts.xclbin_name),
+            pdi=_read(runner.prepend_tmp("design.pdi")),
+            insts=_read_insts(opts.insts_name),
+            tmpdir=workdir if tmpdir is not None else None,
+        )
+
+
+def compile(module, options: Sequence[str] = (), tmpdir=None) -> Artifacts:
+    """Compile `module`, an aie.ir.Module or its text, to Artifacts.
+
+    `options` are aiecc command-line options, on top of DEFAULT_OPTIONS; the
+    output file names are chosen by compile().  The flow runs in `tmpdir`,
+    which is kept, if given.  Raises aiecc.main.CompileError if a step of the
+    flow fails.
+    """
+    return asyncio.run(compile_async(module, options, tmpdir))
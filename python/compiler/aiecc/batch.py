@@ -0,0 +1,128 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Batch specifications for aiecc --batch.
+
+A batch is a JSON file listing the designs to compile in one aiecc invocation:
+
+    {
+      "args": ["--aie-generate-cdo", "--no-compile-host"],
+      "designs": [
+        "add_one.mlir",
+        {"name": "passthrough", "file": "passthrough.mlir", "workdir": "build"}
+      ],
+      "sweeps": [
+        {
+          "name": "matmul_{M}x{K}x{N}",
+          "parameters": {"M": [256, 512], "K": {"from": 256, "to": 1024, "step": 256}, "N": [256]},
+          "generate": ["python3", "aie2.py", "-M", "{M}", "-K", "{K}", "-N", "{N}"],
+          "file": "build/aie_{M}x{K}x{N}.mlir",
+          "workdir": "build",
+          "args": ["--xclbin-name=final_{M}x{K}x{N}.xclbin", "--ipu-insts-name=insts_{M}x{K}x{N}.txt"]
+        }
+      ]
+    }
+
+`args` are aiecc options, applied after the ones given on the command line.  A
+sweep expands into one design per point of the cartesian product of its
+parameters ("from"/"to"/"step" ranges include "to"), with "{parameter}" in its
+strings replaced by the value at that point.  If a design has a `generate`
+command, its standard output is written to `file` before compilation.
+
+Relative paths are relative to the directory of the specification, which is
+also where generators run.  The `workdir`, where aiecc runs for a design and
+puts its outputs, defaults to that directory too.
+"""
+
+from dataclasses import dataclass, field
+import itertools
+import json
+import os
+from typing import List, Optional
+
+
+@dataclass
+class BatchDesign:
+    name: str
+    file: str
+    workdir: str
+    args: List[str] = field(default_factory=list)
+    # Command printing the design to standard output, and where it runs.
+    generate: Optional[List[str]] = None
+    generate_cwd: Optional[str] = None
+
+
+def _values(parameter):
+    if isinstance(parameter, dict):
+        return list(
+            range(parameter["from"], parameter["to"] + 1, parameter.get("step", 1))
+        )
+    if isinstance(parameter, list):
+        return parameter
+    return [parameter]
+
+
+def _design(entry, base_dir, common_args, substitutions=None):
+    if isinstance(entry, str):
+        entry = {"file": entry}
+
+    def subst(s):
+        return s.format(**substitutions) if substitutions else s
+
+    file = os.path.join(base_dir, subst(entry["file"]))
+    name = subst(entry.get("name", os.path.splitext(os.path.basename(file))[0]))
+    generate = entry.get("generate")
+    return BatchDesign(
+        name=name,
+        file=file,
+        workdir=os.path.normpath(
+            os.path.join(base_dir, subst(entry.get("workdir", ".")))
+        ),
+        args=common_args + [subst(a) for a in entry.get("args", [])],
+        generate=[subst(a) for a in generate] if generate else None,
+        generate_cwd=base_dir if generate else None,
+    )
+
+
+def expand_batch(spec, base_dir):
+    """List the designs of batch specification `spec`, a parsed JSON object."""
+    common_args = list(spec.get("args", []))
+    designs = [_design(d, base_dir, common_args) for d in spec.get("designs", [])]
+    for sweep in spec.get("sweeps", []):
+        names = list(sweep.get("parameters", {}))
+        values = [_values(sweep["parameters"][n]) for n in names]
+        for point in itertools.product(*values):
+            designs.append(
+                _design(sweep, base_dir, common_args, dict(zip(names, point)))
+            )
+
+    seen = set()
+    for design in designs:
+        if design.name in seen:
+            raise ValueError(f"duplicate design name '{design.name}' in batch")
+        seen.add(design.name)
+    return designs
+
+
+def load_batch(spec_file):
+    with open(spec_file, "r") as f:
+        spec = json.load(f)
+    return expand_batch(spec, os.path.dirname(os.path.abspath(spec_file)))
+
+
+def strip_batch_args(args):
+    """Remove --batch and its value from an aiecc command line."""
+    stripped = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg == "--batch":
+            skip = True
+        elif not arg.startswith("--batch="):
+            stripped.append(arg)
+    return stripped
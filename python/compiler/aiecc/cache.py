@@ -0,0 +1,168 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Content-addressed artifact cache for aiecc.
+
+Each entry is keyed by a hash of everything that determines a tool's outputs
+(the normalized command line, the contents of its input files and a
+fingerprint of the tool itself) and holds copies of the files it produced.
+"""
+
+import functools
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+# Bump this whenever the way keys are computed changes.
+CACHE_FORMAT_VERSION = "1"
+
+
+def default_cache_dir():
+    return os.getenv(
+        "AIECC_CACHE_DIR",
+        os.path.join(
+            os.getenv(
+                "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")
+            ),
+            "aiecc",
+        ),
+    )
+
+
+def file_digest(path):
+    st = os.stat(path)
+    return _file_digest(os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+
+# Memoized on the file's size and mtime: the same inputs (e.g. the lowered
+# design, which every core reads) are hashed for many commands of a build.
+@functools.lru_cache(maxsize=4096)
+def _file_digest(path, size, mtime_ns):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_fingerprint(path):
+    st = os.stat(path)
+    return f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+@functools.lru_cache(maxsize=None)
+def tool_fingerprint(tool):
+    # Resolving the binary and looking at its size/mtime is much cheaper than
+    # spawning `tool --version` and still changes whenever the tool is updated.
+    path = tool if os.path.isfile(tool) else shutil.which(tool)
+    if path is None:
+        return f"{tool}:missing"
+    fingerprint = _stat_fingerprint(path)
+    # The xchesscc wrapper is a thin script; the actual compiler version is
+    # determined by the aietools install it points at.
+    if os.path.basename(path).startswith("xchesscc"):
+        fingerprint += ":" + os.getenv("AIETOOLS", "")
+    return fingerprint
+
+
+# Extract the files a linker script or BCF pulls in, so that their contents
+# take part in the cache key of the link step.
+def extract_link_inputs(script_path, cwd=None):
+    with open(script_path, "r") as f:
+        script = f.read()
+    files = re.findall(r"^_include _file (.*)", script, re.MULTILINE)
+    files += re.findall(r"^INPUT\((.*)\)", script, re.MULTILINE)
+    cwd = cwd or os.getcwd()
+    return [f.strip() for f in files if os.path.isfile(os.path.join(cwd, f.strip()))]
+
+
+def command_key(command, inputs, outputs, extra=(), cwd=None, scratch=()):
+    """Compute the cache key of running `command` on `inputs` to produce `outputs`.
+
+    Input and output paths are replaced by placeholders in the command line so
+    that the same work done in different directories (or for different cores
+    with identical inputs) maps onto the same key.  So are the paths in
+    `scratch`, directories the tool only keeps intermediate files in, such as
+    the work directory of xchesscc.  Relative paths are relative to `cwd`, the
+    directory the command runs in.
+    """
+    cwd = cwd or os.getcwd()
+    h = hashlib.sha256()
+    h.update(CACHE_FORMAT_VERSION.encode())
+    renames = [(p, f"<in{i}>") for i, p in enumerate(inputs)]
+    renames += [(p, f"<out{i}>") for i, p in enumerate(outputs)]
+    renames += [(p, f"<scratch{i}>") for i, p in enumerate(scratch)]
+    # Longest paths first so that a path which is a prefix of another one
+    # doesn't clobber it.
+    renames.sort(key=lambda r: len(r[0]), reverse=True)
+    for arg in command:
+        for path, placeholder in renames:
+            arg = arg.replace(path, placeholder)
+        h.update(b"\0arg:" + arg.encode())
+        # Libraries and other files named directly on the command line.
+        if "<" not in arg and os.path.isfile(os.path.join(cwd, arg)):
+            h.update(b"\0file:" + _stat_fingerprint(os.path.join(cwd, arg)).encode())
+    h.update(b"\0tool:" + tool_fingerprint(command[0]).encode())
+    for path in inputs:
+        h.update(b"\0input:" + file_digest(os.path.join(cwd, path)).encode())
+    for e in extra:
+        h.update(b"\0extra:" + str(e).encode())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or default_cache_dir())
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def lookup(self, key, count):
+        """Paths of the `count` files of the entry for `key`, or None if there
+        is no such entry.  The files must not be modified."""
+        entry = self._entry(key)
+        paths = [os.path.join(entry, str(i)) for i in range(count)]
+        if not all(os.path.isfile(path) for path in paths):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return paths
+
+    def fetch(self, key, outputs):
+        """Restore `outputs` from the entry for `key`; returns whether it was a hit."""
+        paths = self.lookup(key, len(outputs))
+        if paths is None:
+            return False
+        for path, output in zip(paths, outputs):
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            shutil.copyfile(path, output)
+        return True
+
+    def store(self, key, outputs):
+        entry = self._entry(key)
+        if os.path.isdir(entry):
+            return
+        # Populate a private directory and rename it into place so that
+        # concurrent builds never observe a partially written entry.
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            staging = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp-")
+        except OSError:
+            # The cache is only an optimization, e.g. it may be read-only.
+            return
+        try:
+            for i, output in enumerate(outputs):
+                shutil.copyfile(output, os.path.join(staging, str(i)))
+            os.rename(staging, entry)
+        except OSError:
+            # Either another process won the race or an output is missing;
+            # in both cases there is nothing useful left to do.
+            shutil.rmtree(staging, ignore_errors=True)
@@ -21,6 +21,13 @@ def parse_args(args=None):
     parser.add_argument(
         "--sysroot", metavar="sysroot", default="", help="sysroot for cross-compilation"
     )
+    parser.add_argument(
+        "--batch",
+        metavar="spec",
+        dest="batch",
+        default=None,
+        help="Compile all designs listed in JSON batch specification instead of a single file, sharing the -j budget between them (see aie.compiler.aiecc.batch)",
+    )
     parser.add_argument(
         "--tmpdir",
         metavar="tmpdir",
@@ -159,12 +166,84 @@ def parse_args(args=None):
         action="store",
         help="Compile with max n-threads in the machine (default is 4).  An argument of zero corresponds to the maximum number of threads on the machine.",
     )
+    parser.add_argument(
+        "--mem-budget",
+        dest="mem_budget",
+        metavar="size",
+        default="none",
+        type=_memory_size,
+        help="Only run tools concurrently while their peak memory use, as estimated from previous runs, fits in size (e.g. 16G).  'auto' is what the cgroup and the system have available, 'none' (the default) disables the limit.",
+    )
+    parser.add_argument(
+        "--remote-worker",
+        dest="remote_workers",
+        metavar="host:port",
+        default=[],
+        action="append",
+        type=_worker_address,
+        help="Run the tools whose inputs and outputs are known on the aiecc worker (see aiecc-worker.py) at host:port, which authenticates aiecc by the token in $AIECC_WORKER_TOKEN.  Can be given several times, raise -j to the number of tools the workers can run at a time.",
+    )
     parser.add_argument(
         "--profile",
         dest="profiling",
         default=False,
         action="store_true",
-        help="Profile commands to find the most expensive executions.",
+        help="Profile commands to find the most expensive executions.  Also writes a timeline of the build to trace.json in the temporary directory, viewable with chrome://tracing or ui.perfetto.dev.  The passes aiecc runs in-process run one at a time, and their wall times and the number of ops before and after each are written to pass_statistics.json there.",
+    )
+    parser.add_argument(
+        "--profile-report",
+        dest="profile_report",
+        default=False,
+        action="store_true",
+        help="Instead of compiling, show the trend of the compile time of every stage in the compile-time history, of the given file or of all designs, flagging stages that got significantly slower",
+    )
+    parser.add_argument(
+        "--history",
+        dest="history",
+        default=False,
+        action="store_true",
+        help="Record the compile time of every stage in the compile-time history in the cache directory, and warn about stages that got significantly slower than in previous builds",
+    )
+    parser.add_argument(
+        "--no-history",
+        dest="history",
+        default=False,
+        action="store_false",
+        help="Do not record the compile-time history (default)",
+    )
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        default=False,
+        action="store_true",
+        help="Reuse per-core compilation results, and the compiled chess intrinsic wrapper, from a persistent on-disk cache",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        default=True,
+        action="store_false",
+        help="Do not use the persistent compilation cache (default)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        dest="cache_dir",
+        default=None,
+        help="Directory of the persistent compilation cache (default is $AIECC_CACHE_DIR or ~/.cache/aiecc)",
+    )
+    parser.add_argument(
+        "--incremental",
+        dest="incremental",
+        default=False,
+        action="store_true",
+        help="Only rerun the stages whose inputs changed since the last build in the same temporary directory",
+    )
+    parser.add_argument(
+        "--no-incremental",
+        dest="incremental",
+        default=True,
+        action="store_false",
+        help="Rebuild every stage (default)",
     )
     parser.add_argument(
         "--unified",
@@ -180,6 +259,55 @@ def parse_args(args=None):
         action="store_false",
         help="Compile cores independently in separate processes",
     )
+    parser.add_argument(
+        "--in-process",
+        dest="in_process",
+        default=False,
+        action="store_true",
+        help="Lower cores to LLVM IR in a pool of Python worker processes that parse the design once, instead of running aie-opt/aie-translate for each core (requires --no-unified).  Also route the design in-process, starting from the lowered design in memory instead of running aie-opt on input_with_addresses.mlir",
+    )
+    parser.add_argument(
+        "--no-in-process",
+        dest="in_process",
+        default=True,
+        action="store_false",
+        help="Lower cores by running aie-opt/aie-translate for each core (default)",
+    )
+    parser.add_argument(
+        "--pipe",
+        dest="pipe",
+        default=False,
+        action="store_true",
+        help="Stream the code of each core (or of all cores with --unified) from aie-opt to the compiler through pipes instead of intermediate files (ignored with --in-process and --dedup-cores)",
+    )
+    parser.add_argument(
+        "--no-pipe",
+        dest="pipe",
+        default=True,
+        action="store_false",
+        help="Pass code between the compilation stages in intermediate files (default)",
+    )
+    parser.add_argument(
+        "--keep-intermediates",
+        dest="keep_intermediates",
+        default=False,
+        action="store_true",
+        help="Write the intermediate MLIR files as text rather than bytecode and, with --pipe, still write the intermediate files, for debugging",
+    )
+    parser.add_argument(
+        "--dedup-cores",
+        dest="dedup_cores",
+        default=False,
+        action="store_true",
+        help="Compile cores whose code is identical up to tile-specific symbols only once and link that object for every such tile (requires --no-unified)",
+    )
+    parser.add_argument(
+        "--no-dedup-cores",
+        dest="dedup_cores",
+        default=True,
+        action="store_false",
+        help="Compile every core separately (default)",
+    )
     parser.add_argument(
         "-n",
         dest="execute",
@@ -296,6 +424,30 @@ def _int(arg, kind, pred):
     return i
 
 
+# A size in bytes with an optional K/M/G/T suffix, returned in kilobytes, or
+# one of 'auto' and 'none'.
+def _memory_size(arg):
+    arg = arg.strip().lower()
+    if arg in ("auto", "none"):
+        return arg
+    units = {"k": 1, "m": 1 << 10, "g": 1 << 20, "t": 1 << 30}
+    number, unit = (arg[:-1], arg[-1]) if arg[-1:] in units else (arg, None)
+    try:
+        size = float(number)
+    except ValueError:
+        raise _error("invalid memory size: '{}'", arg)
+    if size <= 0:
+        raise _error("invalid memory size: '{}'", arg)
+    return max(int(size * units[unit] if unit else size / 1024), 1)
+
+
+def _worker_address(arg):
+    host, sep, port = arg.rpartition(":")
+    if not sep or not host or not port.isdigit():
+        raise _error("invalid worker address: '{}', expected host:port", arg)
+    return arg
+
+
 def _case_insensitive_regex(arg):
     import re
 
@@ -0,0 +1,134 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+What the aiecc flow needs to know about a design.
+
+The design is analyzed once, when it is parsed, and the DesignInfo is handed to
+the stages that need it instead of each of them parsing and walking the module
+again.  Only the operations directly inside the aie.device (or the module, for
+designs without one) are looked at, not the bodies of the cores.
+"""
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Architecture of each device, as reported by aie-translate
+# --aie-generate-target-arch.  The flow asks aie-translate about devices that
+# are missing here.
+TARGET_ARCH = {
+    "xcvc1902": "AIE",
+    "xcve2302": "AIE2",
+    "xcve2802": "AIE2",
+    "ipu": "AIE2",
+}
+
+
+@dataclass
+class BufferInfo:
+    name: Optional[str]
+    tile: Tuple[int, int]
+    type: str
+    address: Optional[int] = None
+
+
+@dataclass
+class FlowInfo:
+    source: Tuple[int, int]
+    source_bundle: str
+    source_channel: int
+    dest: Tuple[int, int]
+    dest_bundle: str
+    dest_channel: int
+
+
+@dataclass
+class DesignInfo:
+    device: Optional[str] = None
+    # None if the device isn't in TARGET_ARCH.
+    target_arch: Optional[str] = "AIE"
+    # (col, row) of every tile.
+    tiles: List[Tuple[int, int]] = field(default_factory=list)
+    # (col, row, elf_file) of every core, elf_file is None unless given.
+    cores: List[Tuple[int, int, Optional[str]]] = field(default_factory=list)
+    buffers: List[BufferInfo] = field(default_factory=list)
+    flows: List[FlowInfo] = field(default_factory=list)
+
+    @property
+    def columns(self):
+        """The columns used by the design, in ascending order."""
+        return sorted({col for col, _ in self.tiles})
+
+
+def _tile_of(value):
+    tile = value.owner.opview
+    return tile.col.value, tile.row.value
+
+
+def _enum_name(enum, attr):
+    return enum(int(attr)).name
+
+
+def analyze_design(module):
+    """Collect the DesignInfo of the first aie.device of parsed `module`."""
+    from aie.dialects import aie as aiedialect
+
+    info = DesignInfo()
+    device = next(
+        (
+            op.opview
+            for op in module.body.operations
+            if isinstance(op.opview, aiedialect.DeviceOp)
+        ),
+        None,
+    )
+    if device is not None:
+        info.device = _enum_name(aiedialect.AIEDevice, device.device)
+        info.target_arch = TARGET_ARCH.get(info.device)
+        body = device.body_region.blocks[0]
+    else:
+        body = module.body
+
+    for op in body.operations:
+        op = op.opview
+        if isinstance(op, aiedialect.TileOp):
+            info.tiles.append((op.col.value, op.row.value))
+        elif isinstance(op, aiedialect.CoreOp):
+            info.cores.append(
+                (
+                    *_tile_of(op.tile),
+                    op.elf_file.value if op.elf_file is not None else None,
+                )
+            )
+        elif isinstance(op, aiedialect.BufferOp):
+            info.buffers.append(
+                BufferInfo(
+                    name=op.sym_name.value if op.sym_name is not None else None,
+                    tile=_tile_of(op.tile),
+                    type=str(op.buffer.type),
+                    address=op.address.value if op.address is not None else None,
+                )
+            )
+        elif isinstance(op, aiedialect.FlowOp):
+            info.flows.append(
+                FlowInfo(
+                    source=_tile_of(op.source),
+                    source_bundle=_enum_name(aiedialect.WireBundle, op.source_bundle),
+                    source_channel=op.source_channel.value,
+                    dest=_tile_of(op.dest),
+                    dest_bundle=_enum_name(aiedialect.WireBundle, op.dest_bundle),
+                    dest_channel=op.dest_channel.value,
+                )
+            )
+    return info
+
+
+def analyze_design_str(mlir_module_str):
+    """Parse `mlir_module_str` and collect its DesignInfo."""
+    from aie.ir import Context, Location, Module
+
+    with Context(), Location.unknown():
+        return analyze_design(Module.parse(mlir_module_str))
@@ -0,0 +1,482 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Where aiecc runs the tools of the flow.
+
+Every tool invocation of FlowRunner goes through an executor:
+
+  LocalExecutor        runs the tool as a child process of aiecc.
+  ProcessPoolExecutor  additionally runs in-process Python stages (such as the
+                       per-core lowering of --in-process) in a pool of worker
+                       processes.
+  RemoteExecutor       ships the tool's inputs to an aiecc worker (see
+                       worker.py) over TCP, runs it there and copies its
+                       outputs back.  Only commands that declare their inputs
+                       and outputs can run remotely, the others run locally.
+
+Tools run in a process group of their own.  When the coroutine running a tool
+is cancelled, say because another tool of the build failed, the whole group is
+terminated (killed if it doesn't exit within TERMINATE_GRACE seconds) and
+reaped before the cancellation propagates.  A remote tool is killed by its
+worker once the connection to it is closed.
+
+The remote protocol is a single exchange per connection.  The request is a
+header followed by the contents of the input files, in order; the reply is a
+header followed by the contents of the output files the tool produced, in
+order.  Headers are a 4 byte big-endian length and that many bytes of JSON,
+at most MAX_HEADER_LENGTH.
+
+  request  {"version": 2, "token": str, "command": [...], "cwd": path,
+            "inputs": [[path, size, mode], ...], "outputs": [path, ...],
+            "directories": [path, ...]}
+  reply    {"returncode": int, "stdout": str, "stderr": str, "rusage":
+            {"ru_utime": s, "ru_stime": s, "ru_maxrss": kb}, "outputs":
+            [[path, size], ...]}
+            or {"error": str} if the request was refused.
+
+A worker only runs requests that carry its token, a secret shared by aiecc
+and the workers in $AIECC_WORKER_TOKEN.  The token is sent in the clear, so
+connections that leave a trusted network need to be tunnelled (e.g. ssh -L).
+
+Paths in the request are relative to a scratch directory of the worker.  The
+worker replaces SANDBOX in the arguments of the command with the absolute path
+of that directory.  Tools are run by the same path as on the client, so the
+workers need the same installation of the tools.
+"""
+
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import multiprocessing
+import os
+import re
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import types
+
+import aie.compiler.aiecc.profiling
+
+PROTOCOL_VERSION = 2
+
+# Environment variable holding the token the workers authenticate aiecc by.
+TOKEN_ENV = "AIECC_WORKER_TOKEN"
+
+# Stands in for the scratch directory of the worker in remote commands.
+SANDBOX = "@AIECC_SANDBOX@"
+
+HEADER_LENGTH = struct.Struct("!I")
+# Longest header a worker reads, before it knows whether the client has the
+# token.
+MAX_HEADER_LENGTH = 1 << 20
+
+# Seconds a cancelled tool has to exit before it is killed.
+TERMINATE_GRACE = 2.0
+
+
+def encode_header(header):
+    data = json.dumps(header).encode()
+    return HEADER_LENGTH.pack(len(data)) + data
+
+
+async def read_header(reader):
+    (length,) = HEADER_LENGTH.unpack(await reader.readexactly(HEADER_LENGTH.size))
+    return json.loads(await reader.readexactly(length))
+
+
+def kill_group(pid, sig=signal.SIGKILL):
+    """Send `sig` to the process group led by `pid`, if it still exists."""
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+# Terminate the process group of `pid` and wait for `waiter`, the future that
+# reaps it.
+async def _stop(pid, waiter):
+    kill_group(pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter), TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        kill_group(pid)
+        await waiter
+
+
+# Keyword arguments for spawning a tool whose output goes to `log`, if any.
+def _output_to(log):
+    if log is None:
+        return contextlib.nullcontext(dict())
+    return _open_log(log)
+
+
+@contextlib.contextmanager
+def _open_log(log):
+    with open(log, "ab") as f:
+        yield dict(stdout=f, stderr=subprocess.STDOUT)
+
+
+# Wait for the tool `pid` reaped by `waiter`, killing it if cancelled.
+async def _reap(pid, waiter):
+    try:
+        return await asyncio.shield(waiter)
+    except asyncio.CancelledError:
+        await _stop(pid, waiter)
+        raise
+
+
+async def _returncode(proc):
+    await proc.wait()
+    return proc.returncode, None
+
+
+# Run blocking `fn(*args)` in a thread of its own.  Unlike the threads of a
+# pool, it can't be held up behind other blocked calls.
+def _in_thread(fn, *args):
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def target():
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(_settle, future, None, e)
+        else:
+            loop.call_soon_threadsafe(_settle, future, result, None)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+def _settle(future, result, exception):
+    if future.cancelled():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+# Copy everything from file descriptor `source` to `sink` and to file `path`.
+def _tee(source, sink, path):
+    forward = True
+    with open(source, "rb") as src, open(path, "wb") as copy:
+        dst = open(sink, "wb")
+        try:
+            while True:
+                chunk = src.read1(1 << 16)
+                if not chunk:
+                    break
+                copy.write(chunk)
+                if forward:
+                    try:
+                        dst.write(chunk)
+                        dst.flush()
+                    except BrokenPipeError:
+                        # The next stage is gone, still complete the copy.
+                        forward = False
+        finally:
+            try:
+                dst.close()
+            except BrokenPipeError:
+                pass
+
+
+def _read_all(fd):
+    with open(fd, "rb", closefd=True) as f:
+        return f.read()
+
+
+def _close(fd):
+    # Anything but our own pipe ends (DEVNULL, log files, None) is left alone.
+    if isinstance(fd, int) and fd >= 0:
+        os.close(fd)
+
+
+class LocalExecutor:
+    """Runs tools as child processes of aiecc.
+
+    With `measure`, children are reaped in threads (at most `max_waiters` at a
+    time) to get at their own resource usage; see profiling.run_with_rusage.
+    """
+
+    remote = False
+
+    def __init__(self, measure=False, max_waiters=None):
+        self.wait_pool = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_waiters)
+            if measure
+            else None
+        )
+
+    def select(self, inputs, outputs):
+        """The executor to run a command with the given inputs and outputs."""
+        return self
+
+    # Start `command`; returns its pid and a future of its exit code and, if
+    # measured, resource usage.
+    async def _start(self, command, cwd, **kwargs):
+        if self.wait_pool is None:
+            proc = await asyncio.create_subprocess_exec(
+                *command, cwd=cwd, start_new_session=True, **kwargs
+            )
+            return proc.pid, asyncio.ensure_future(_returncode(proc))
+        proc = subprocess.Popen(command, cwd=cwd, start_new_session=True, **kwargs)
+        return proc.pid, asyncio.get_running_loop().run_in_executor(
+            self.wait_pool, aie.compiler.aiecc.profiling.wait_with_rusage, proc
+        )
+
+    # Returns the exit code of `command` and, if measured, its resource usage.
+    # The output of the command is appended to file `log` if given.
+    async def run(self, command, cwd, inputs=None, outputs=None, log=None):
+        with _output_to(log) as output:
+            return await _reap(*await self._start(command, cwd, **output))
+
+    async def run_pipeline(self, commands, cwd, log=None, tees=None, capture=False):
+        """Run `commands` with the output of each piped into the next.
+
+        The output of stage i is also written to file `tees[i]`, if given.  The
+        messages of all stages are appended to `log`, if given, and so is the
+        output of the last stage unless `capture`.  Returns the exit codes and
+        resource usages (see run()) of the stages, and the output of the last
+        stage if `capture`.
+        """
+        tees = tees or dict()
+        started = []
+        helpers = []
+        with _output_to(log) as output:
+            messages = output.get("stdout")
+            stdin = subprocess.DEVNULL
+            try:
+                for i, command in enumerate(commands):
+                    if i == len(commands) - 1 and not capture:
+                        source, stdout = None, messages
+                    else:
+                        source, stdout = os.pipe()
+                    try:
+                        started.append(
+                            await self._start(
+                                command,
+                                cwd,
+                                stdin=stdin,
+                                stdout=stdout,
+                                stderr=subprocess.STDOUT if messages else None,
+                            )
+                        )
+                    except BaseException:
+                        _close(source)
+                        raise
+                    finally:
+                        # The stage has its own copies now.
+                        _close(stdin)
+                        _close(stdout)
+                        stdin = None
+                    stdin = source
+                    if i in tees:
+                        stdin, sink = os.pipe()
+                        helpers.append(_in_thread(_tee, source, sink, tees[i]))
+                if capture:
+                    helpers.append(_in_thread(_read_all, stdin))
+                    stdin = None
+                results = [await asyncio.shield(waiter) for _, waiter in started]
+                captured = await asyncio.gather(*helpers)
+            except BaseException:
+                _close(stdin)
+                await asyncio.gather(*(_stop(pid, waiter) for pid, waiter in started))
+                raise
+        return results, captured[-1] if capture else None
+
+    # Run an in-process stage, `fn(*args)`, without blocking the event loop.
+    async def call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def shutdown(self):
+        if self.wait_pool is not None:
+            self.wait_pool.shutdown()
+            self.wait_pool = None
+
+
+class ProcessPoolExecutor(LocalExecutor):
+    """Runs in-process stages in a pool of `max_workers` worker processes.
+
+    The workers are spawned rather than forked: aiecc already owns MLIR
+    contexts (and their thread pools) which must not be duplicated.  Every
+    worker runs `initializer(*initargs)` first.
+    """
+
+    def __init__(self, max_workers, initializer=None, initargs=(), **kwargs):
+        super().__init__(**kwargs)
+        self.pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    async def call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    # With `cancel`, stages that haven't started yet are dropped.
+    def shutdown(self, cancel=False):
+        self.pool.shutdown(cancel_futures=cancel)
+        super().shutdown()
+
+
+def parse_address(address):
+    """Split a worker address, HOST:PORT, into its host and port."""
+    host, sep, port = address.rpartition(":")
+    if not sep or not host or not port.isdigit():
+        raise ValueError(f"invalid worker address '{address}', expected HOST:PORT")
+    return host.strip("[]"), int(port)
+
+
+# Where the files of a remote command go in the worker's scratch directory.
+# Every root (the working directory and the directories of the command's files)
+# becomes a directory of its own there, unless it is inside another root.
+class _SandboxMap:
+    def __init__(self, roots):
+        self.roots = dict()
+        for root in sorted({os.path.abspath(r) for r in roots}, key=len):
+            if not any(_is_under(root, r) for r in self.roots):
+                self.roots[root] = f"r{len(self.roots)}"
+
+    def map(self, path):
+        path = os.path.abspath(path)
+        for root, mapped in self.roots.items():
+            if _is_under(path, root):
+                return os.path.normpath(
+                    os.path.join(mapped, os.path.relpath(path, root))
+                )
+        raise ValueError(f"{path} is not under any root")
+
+    def contains(self, path):
+        return any(_is_under(path, r) for r in self.roots)
+
+    # Replace the roots in `arg`, wherever they appear as a whole path prefix.
+    def rewrite(self, arg):
+        for root, mapped in self.roots.items():
+            arg = re.sub(
+                re.escape(root) + r"(?=/|$|[^\w.+-])",
+                lambda _: os.path.join(SANDBOX, mapped),
+                arg,
+            )
+        return arg
+
+    # Undo rewrite() in the messages of the tool.
+    def restore(self, text):
+        for root, mapped in self.roots.items():
+            text = text.replace(os.path.join(SANDBOX, mapped), root)
+        return text
+
+
+def _is_under(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class RemoteExecutor(LocalExecutor):
+    """Runs tools on aiecc workers at `addresses` (HOST:PORT), which accept
+    `token`, by default $AIECC_WORKER_TOKEN.
+
+    A command runs on the worker with the fewest commands in flight.  Workers
+    that can't be reached are not tried again, and commands run locally once
+    none is left.
+    """
+
+    remote = True
+
+    def __init__(self, addresses, token=None, **kwargs):
+        super().__init__(**kwargs)
+        self.workers = {parse_address(a): 0 for a in addresses}
+        self.token = os.getenv(TOKEN_ENV, "") if token is None else token
+        self.local = LocalExecutor()
+        self.local.wait_pool = self.wait_pool
+
+    def select(self, inputs, outputs):
+        if not self.workers or inputs is None or not outputs:
+            return self.local
+        return self
+
+    async def run(self, command, cwd, inputs=None, outputs=None, log=None):
+        files = [os.path.join(cwd, p) for p in inputs]
+        produced = [os.path.join(cwd, p) for p in outputs]
+        sandbox = _SandboxMap([cwd] + [os.path.dirname(p) for p in files + produced])
+        try:
+            request = {
+                "version": PROTOCOL_VERSION,
+                "token": self.token,
+                "command": [sandbox.rewrite(a) for a in command],
+                "cwd": sandbox.map(cwd),
+                "inputs": [
+                    [sandbox.map(p), os.path.getsize(p), os.stat(p).st_mode & 0o777]
+                    for p in files
+                ],
+                "outputs": [sandbox.map(p) for p in produced],
+                # Directories the command is given, such as xchesscc's work
+                # directory, must exist on the worker.
+                "directories": [
+                    sandbox.map(a)
+                    for a in command[1:]
+                    if os.path.isabs(a) and os.path.isdir(a) and sandbox.contains(a)
+                ],
+            }
+        except OSError:
+            # Let the tool report what is wrong with its inputs.
+            return await self.local.run(command, cwd, log=log)
+
+        while self.workers:
+            address = min(self.workers, key=self.workers.get)
+            self.workers[address] += 1
+            try:
+                reply, contents = await self._exchange(address, request, files)
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                print(
+                    f"aiecc worker {address[0]}:{address[1]} failed: {e}",
+                    file=sys.stderr,
+                )
+                self.workers.pop(address, None)
+                continue
+            finally:
+                if address in self.workers:
+                    self.workers[address] -= 1
+            break
+        else:
+            return await self.local.run(command, cwd, log=log)
+
+        if log is None:
+            sys.stdout.write(sandbox.restore(reply["stdout"]))
+            sys.stderr.write(sandbox.restore(reply["stderr"]))
+        else:
+            with open(log, "a") as f:
+                f.write(sandbox.restore(reply["stdout"] + reply["stderr"]))
+        local_paths = dict(zip(request["outputs"], produced))
+        for (path, _), data in zip(reply["outputs"], contents):
+            local = local_paths[path]
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            with open(local, "wb") as f:
+                f.write(data)
+        return reply["returncode"], types.SimpleNamespace(**reply["rusage"])
+
+    async def _exchange(self, address, request, files):
+        reader, writer = await asyncio.open_connection(*address)
+        try:
+            writer.write(encode_header(request))
+            for path in files:
+                with open(path, "rb") as f:
+                    writer.write(f.read())
+                await writer.drain()
+            reply = await read_header(reader)
+            if "error" in reply:
+                raise ValueError(reply["error"])
+            contents = [await reader.readexactly(size) for _, size in reply["outputs"]]
+        finally:
+            writer.close()
+        if not {p for p, _ in reply["outputs"]} <= set(request["outputs"]):
+            raise ValueError("worker sent files that weren't asked for")
+        return reply, contents
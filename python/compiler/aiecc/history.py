@@ -0,0 +1,249 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Compile-time history of aiecc builds, see aiecc --profile-report.
+
+Every build run with aiecc --history appends how long the tools of each
+stage (as in profiling.stage_of()) took to an SQLite database in the cache
+directory, keyed by design, stage and a fingerprint of the tool.  A stage is flagged as
+slower when its time per invocation in recent builds is significantly (by
+Welch's t-test) and noticeably longer than in the builds before them, so
+that a toolchain update that slows down, say, llc shows up in the build
+rather than in the users' complaints.
+"""
+
+import collections
+import hashlib
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+# Builds a stage is compared against.
+BASELINE = 20
+# Builds of the stage considered recent by the report.
+RECENT = 3
+# Fewer baseline builds than this are too noisy to compare against.
+MIN_BASELINE = 5
+# A slowdown is flagged if it is at least this large and this significant.
+MIN_SLOWDOWN = 0.1
+MIN_SLOWDOWN_SECONDS = 0.05
+SIGNIFICANCE = 0.01
+
+_SPARKS = "▁▂▃▄▅▆▇█"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS timings (
+    time REAL NOT NULL,
+    design TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    tool_version TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS timings_by_stage ON timings (design, stage, time);
+"""
+
+# One build of a stage: when, with which tool, and the seconds per invocation.
+Sample = collections.namedtuple("Sample", "time tool_version seconds")
+
+Comparison = collections.namedtuple(
+    "Comparison", "design stage baseline recent ratio pvalue tool_changed"
+)
+
+
+def tool_version(fingerprints):
+    """Short, stable name of the tools with `fingerprints` (see
+    cache.tool_fingerprint) for the history."""
+    return hashlib.sha256("\0".join(fingerprints).encode()).hexdigest()[:12]
+
+
+def _t_sf(t, df):
+    # Upper tail of Student's t distribution, by Simpson's rule on its density.
+    if t <= 0:
+        return 1 - _t_sf(-t, df)
+    scale = math.exp(
+        math.lgamma((df + 1) / 2) - math.lgamma(df / 2) - 0.5 * math.log(df * math.pi)
+    )
+
+    def density(x):
+        return scale * (1 + x * x / df) ** (-(df + 1) / 2)
+
+    steps = 200
+    h = t / steps
+    area = density(0) + density(t)
+    area += sum((4 if i % 2 else 2) * density(i * h) for i in range(1, steps))
+    return max(0.5 - area * h / 3, 0.0)
+
+
+def compare(baseline, recent):
+    """Welch's t-test of whether `recent` values are larger than `baseline`
+    ones; returns the ratio of their means and the one-sided p-value.
+
+    A single recent value is assumed to vary like the baseline does.
+    """
+    mean_b, mean_r = statistics.fmean(baseline), statistics.fmean(recent)
+    var_b = statistics.variance(baseline)
+    var_r = statistics.variance(recent) if len(recent) > 1 else var_b
+    ratio = mean_r / mean_b if mean_b > 0 else math.inf
+    se_b, se_r = var_b / len(baseline), var_r / len(recent)
+    if se_b + se_r == 0:
+        return ratio, 0.0 if mean_r > mean_b else 1.0
+    t = (mean_r - mean_b) / math.sqrt(se_b + se_r)
+    # Welch-Satterthwaite degrees of freedom.
+    df = (se_b + se_r) ** 2 / (
+        se_b**2 / (len(baseline) - 1)
+        + (se_r**2 / (len(recent) - 1) if len(recent) > 1 else 0)
+    )
+    return ratio, _t_sf(t, df)
+
+
+def _sparkline(values):
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(_SPARKS[int((v - low) / span * (len(_SPARKS) - 1))] for v in values)
+
+
+class CompileHistory:
+    FILENAME = "history.sqlite"
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, self.FILENAME)
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent builds take turns writing.
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, design, timings, when=None):
+        """Append a build of `design`; `timings` maps stages to (tool version,
+        total seconds, number of invocations)."""
+        when = time.time() if when is None else when
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO timings VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (when, design, stage, version, seconds, count)
+                    for stage, (version, seconds, count) in timings.items()
+                ],
+            )
+
+    def designs(self):
+        rows = self.db.execute("SELECT DISTINCT design FROM timings ORDER BY design")
+        return [design for (design,) in rows]
+
+    def stages(self, design):
+        rows = self.db.execute(
+            "SELECT DISTINCT stage FROM timings WHERE design = ? ORDER BY stage",
+            (design,),
+        )
+        return [stage for (stage,) in rows]
+
+    def samples(self, design, stage, limit=BASELINE + RECENT):
+        """The last `limit` builds of `stage` of `design`, oldest first."""
+        rows = self.db.execute(
+            "SELECT time, tool_version, seconds / count FROM timings "
+            "WHERE design = ? AND stage = ? AND count > 0 "
+            "ORDER BY time DESC LIMIT ?",
+            (design, stage, limit),
+        )
+        return [Sample(*row) for row in reversed(rows.fetchall())]
+
+    def compare(self, design, stage, recent=RECENT):
+        """Compare the last `recent` builds of `stage` of `design` with the
+        builds before them; returns a Comparison, or None if there are too
+        few builds to tell."""
+        samples = self.samples(design, stage, BASELINE + recent)
+        baseline, latest = samples[:-recent], samples[-recent:]
+        if len(baseline) < MIN_BASELINE or not latest:
+            return None
+        ratio, pvalue = compare(
+            [s.seconds for s in baseline], [s.seconds for s in latest]
+        )
+        return Comparison(
+            design,
+            stage,
+            statistics.fmean(s.seconds for s in baseline),
+            statistics.fmean(s.seconds for s in latest),
+            ratio,
+            pvalue,
+            latest[-1].tool_version != baseline[-1].tool_version,
+        )
+
+    def regressions(self, design, stages=None, recent=RECENT):
+        """Comparisons of the stages of `design` that got slower."""
+        found = []
+        for stage in self.stages(design) if stages is None else stages:
+            c = self.compare(design, stage, recent)
+            if c is not None and is_regression(c):
+                found.append(c)
+        return found
+
+
+def is_regression(c):
+    return (
+        c.pvalue < SIGNIFICANCE
+        and c.ratio >= 1 + MIN_SLOWDOWN
+        and c.recent - c.baseline >= MIN_SLOWDOWN_SECONDS
+    )
+
+
+def _pvalue(p):
+    return "p<0.0001" if p < 0.0001 else f"p={p:.2g}"
+
+
+def describe(c):
+    message = (
+        f"{c.design}: {c.stage} is {(c.ratio - 1) * 100:.0f}% slower than in "
+        f"previous builds ({c.recent:.3f} vs {c.baseline:.3f} sec, {_pvalue(c.pvalue)})"
+    )
+    if c.tool_changed:
+        message += ", the tool has changed since"
+    return message
+
+
+def print_report(history, designs=None, out=None):
+    """Print the trend of every stage of `designs` (default all) in `history`,
+    flagging the ones that got slower."""
+    out = out or sys.stdout
+    designs = history.designs() if designs is None else designs
+    rows = []
+    for design in designs:
+        for stage in history.stages(design):
+            samples = history.samples(design, stage)
+            c = history.compare(design, stage)
+            rows.append(
+                (
+                    design,
+                    stage,
+                    str(len(samples)),
+                    f"{c.baseline:.3f}" if c else "-",
+                    f"{samples[-1].seconds:.3f}",
+                    f"{(c.ratio - 1) * 100:+.1f}%" if c else "-",
+                    _sparkline([s.seconds for s in samples]),
+                    (f"SLOWER ({_pvalue(c.pvalue)})" if c and is_regression(c) else ""),
+                )
+            )
+    if not rows:
+        print(f"No compile-time history in {history.path}", file=out)
+        return 0
+    header = ("design", "stage", "builds", "baseline", "latest", "change", "trend", "")
+    widths = [max(len(r[i]) for r in [header, *rows]) for i in range(len(header))]
+    print(f"Compile-time history in {history.path} (seconds per invocation)", file=out)
+    for row in [header, *rows]:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)).rstrip(), file=out)
+    return sum(r[-1] != "" for r in rows)
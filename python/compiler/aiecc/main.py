@@ -9,10 +9,14 @@ aiecc - AIE compiler driver for MLIR tools
 """
 
 import asyncio
+import contextlib
+import copy
+import functools
 import glob
+import hashlib
+import itertools
 import json
 import os
-import random
 import re
 import shutil
 import stat
@@ -21,19 +25,33 @@ import sys
 import tempfile
 from textwrap import dedent
 import time
+import traceback
+import types
 
 from aie.extras.runtime.passes import Pipeline
 
-# this is inside the aie-python-extras (shared) namespace package
-from aie.extras.util import find_ops
-import aiofiles
-import rich.progress as progress
-
+import aie.compiler.aiecc.batch
+import aie.compiler.aiecc.cache
 import aie.compiler.aiecc.cl_arguments
 import aie.compiler.aiecc.configure
-from aie.dialects import aie as aiedialect
-from aie.ir import Context, Location, Module
-from aie.passmanager import PassManager
+import aie.compiler.aiecc.design
+import aie.compiler.aiecc.executor
+import aie.compiler.aiecc.manifest
+import aie.compiler.aiecc.memory
+import aie.compiler.aiecc.profiling
+import aie.compiler.aiecc.xclbin
+from aie.compiler.aiecc.scheduler import (
+    PrioritySemaphore,
+    SharedSlots,
+    TaskGraph,
+    current_group,
+    current_node,
+    current_slot,
+)
+
+# The MLIR bindings, the aie dialects, aiofiles, rich and the compile-time
+# history are imported where they are used: --help, argument errors and up-to-date incremental builds must not
+# pay for loading them.  See utils/aiecc-startup-benchmark.py.
 
 INPUT_WITH_ADDRESSES_PIPELINE = (
     Pipeline()
@@ -89,20 +107,57 @@ AIE_LOWER_TO_LLVM = (
 CREATE_PATH_FINDER_FLOWS = Pipeline().Nested(
     "aie.device", Pipeline().add_pass("aie-create-pathfinder-flows")
 )
+# input_physical.mlir, from input_with_addresses.mlir: the design after routing.
+INPUT_PHYSICAL_PIPELINE = Pipeline().Nested(
+    "aie.device",
+    Pipeline()
+    .add_pass("aie-create-pathfinder-flows")
+    .add_pass("aie-lower-broadcast-packet")
+    .add_pass("aie-create-packet-flows")
+    .add_pass("aie-lower-multicast"),
+)
 DMA_TO_IPU = Pipeline().Nested("aie.device", Pipeline().add_pass("aie-dma-to-ipu"))
 
 
-async def read_file_async(file_path: str) -> str:
-    async with aiofiles.open(file_path, mode="r") as f:
+async def read_file_async(file_path: str, mode="r") -> str:
+    import aiofiles
+
+    async with aiofiles.open(file_path, mode=mode) as f:
         contents = await f.read()
     return contents
 
 
 async def write_file_async(file_content: str, file_path: str):
+    import aiofiles
+
     async with aiofiles.open(file_path, mode="w") as f:
         await f.write(file_content)
 
 
+class CompileError(Exception):
+    """A step of the flow failed; `returncode` is the exit status aiecc reports.
+
+    The details have been reported on stderr by the time this is raised.
+    """
+
+    def __init__(self, message, returncode=1):
+        super().__init__(message)
+        self.returncode = returncode
+
+
+def make_progress_bar():
+    import rich.progress as progress
+
+    return progress.Progress(
+        *progress.Progress.get_default_columns(),
+        progress.TimeElapsedColumn(),
+        progress.MofNCompleteColumn(),
+        progress.TextColumn("{task.fields[command]}"),
+        redirect_stdout=False,
+        redirect_stderr=False,
+    )
+
+
 def emit_design_kernel_json(
     kernel_name="MLIR_AIE",
     kernel_id="0x901",
@@ -182,21 +237,21 @@ mem_topology = {
 }
 
 
-def emit_partition(mlir_module_str, kernel_id="0x901", start_columns=None):
-    with Context(), Location.unknown():
-        module = Module.parse(mlir_module_str)
-        tiles = find_ops(
-            module.operation,
-            lambda o: isinstance(o.operation.opview, aiedialect.TileOp),
-        )
-        min_col = min([t.col.value for t in tiles])
-        max_col = max([t.col.value for t in tiles])
-
-    num_cols = max_col - min_col + 1
+# `design` is the DesignInfo of the design, or its MLIR text.
+# `pdi_uuid` names the PDI (see xclbin.pdi_uuid); by default it is a hash of
+# the design, so that the partition is the same for every build of it.
+def emit_partition(design, kernel_id="0x901", start_columns=None, pdi_uuid=None):
+    if isinstance(design, str):
+        design = aie.compiler.aiecc.design.analyze_design_str(design)
+    columns = design.columns
+    num_cols = columns[-1] - columns[0] + 1
     if start_columns is None:
         start_columns = list(range(1, 6 - num_cols))
+    if pdi_uuid is None:
+        pdi_uuid = aie.compiler.aiecc.xclbin.content_uuid(
+            repr(design), kernel_id, start_columns
+        )
 
-    uuid = random.randint(2222, 9999)
     return {
         "aie_partition": {
             "name": "QoS",
@@ -209,7 +264,7 @@ def emit_partition(mlir_module_str, kernel_id="0x901", start_columns=None):
             },
             "PDIs": [
                 {
-                    "uuid": "00000000-0000-0000-0000-00000000" + str(uuid),
+                    "uuid": pdi_uuid,
                     "file_name": "./design.pdi",
                     "cdo_groups": [
                         {
@@ -227,19 +282,7 @@ def emit_partition(mlir_module_str, kernel_id="0x901", start_columns=None):
 
 
 def generate_cores_list(mlir_module_str):
-    with Context(), Location.unknown():
-        module = Module.parse(mlir_module_str)
-        return [
-            (
-                c.tile.owner.opview.col.value,
-                c.tile.owner.opview.row.value,
-                c.elf_file.value if c.elf_file is not None else None,
-            )
-            for c in find_ops(
-                module.operation,
-                lambda o: isinstance(o.operation.opview, aiedialect.CoreOp),
-            )
-        ]
+    return aie.compiler.aiecc.design.analyze_design_str(mlir_module_str).cores
 
 
 def emit_design_bif(root_path, has_cores=True, enable_cores=True):
@@ -274,25 +317,97 @@ async def extract_input_files(file_core_bcf):
     return " ".join(re.findall(r"^_include _file (.*)", core_bcf, re.MULTILINE))
 
 
-def do_run(command, verbose=False):
-    if verbose:
-        print(" ".join(command))
-    m = subprocess.PIPE
-    ret = subprocess.run(command, stdout=m, stderr=m, universal_newlines=True)
-    return ret
-
+# Run `pass_pipeline` on parsed `module` in place, and write the result to
+# `outputfile` as MLIR bytecode or, unless `bytecode`, as text.
+# With `statistics`, a list, the passes run one at a time and their wall times
+# and op counts are appended to it (see --profile).
+def apply_passes(
+    pass_pipeline,
+    module,
+    outputfile=None,
+    verbose=False,
+    bytecode=False,
+    statistics=None,
+):
+    from aie.extras.runtime.passes import profile_passes
+    from aie.passmanager import PassManager
 
-def run_passes(pass_pipeline, mlir_module_str, outputfile=None, verbose=False):
     if verbose:
         print("Running:", pass_pipeline)
+    if statistics is not None:
+        statistics.append(
+            {
+                "pipeline": pass_pipeline,
+                "output": outputfile and os.path.basename(outputfile),
+                "passes": profile_passes(module, pass_pipeline),
+            }
+        )
+    else:
+        PassManager.parse(pass_pipeline).run(module.operation)
+    if outputfile and bytecode:
+        with open(outputfile, "wb") as g:
+            module.operation.write_bytecode(g)
+    elif outputfile:
+        with open(outputfile, "w") as g:
+            g.write(str(module))
+
+
+def run_passes(
+    pass_pipeline,
+    mlir_module_str,
+    outputfile=None,
+    verbose=False,
+    bytecode=False,
+    statistics=None,
+):
+    from aie.ir import Context, Location, Module
+
     with Context() as ctx, Location.unknown():
         module = Module.parse(mlir_module_str)
-        PassManager.parse(pass_pipeline).run(module.operation)
-        mlir_module_str = str(module)
-        if outputfile:
-            with open(outputfile, "w") as g:
-                g.write(mlir_module_str)
-    return mlir_module_str
+        apply_passes(pass_pipeline, module, outputfile, verbose, bytecode, statistics)
+        return str(module)
+
+
+# State of the worker processes used by --in-process: every worker parses the
+# design once and lowers each core it is handed on a clone of that module.
+_lowering_worker_context = None
+_lowering_worker_module = None
+
+
+def _init_lowering_worker(file_with_addresses):
+    from aie.ir import Context, Location, Module
+
+    global _lowering_worker_context, _lowering_worker_module
+    _lowering_worker_context = Context()
+    # Parallelism comes from the pool, don't oversubscribe the machine.
+    _lowering_worker_context.enable_multithreading(False)
+    with _lowering_worker_context, Location.unknown():
+        # Text or bytecode, see FlowRunner.mlir_output.
+        with open(file_with_addresses, "rb") as f:
+            _lowering_worker_module = Module.parse(f.read())
+
+
+def _lower_core_in_process(col, row, file_core_llvmir, file_core_bcf=None):
+    from aie.dialects.aie import generate_bcf, translate_mlir_to_llvmir
+    from aie.ir import Location
+    from aie.passmanager import PassManager
+
+    with _lowering_worker_context, Location.unknown():
+        if file_core_bcf:
+            with open(file_core_bcf, "w") as f:
+                f.write(generate_bcf(_lowering_worker_module.operation, col, row))
+        core_module = _lowering_worker_module.operation.clone()
+        PassManager.parse(str(AIE_LOWER_TO_LLVM(col, row))).run(core_module.operation)
+        with open(file_core_llvmir, "w") as f:
+            f.write(translate_mlir_to_llvmir(core_module.operation))
+
+
+# Stands in for the command line of a stage the aie Python bindings run
+# in-process: the bindings take the place of the tool.
+def in_process_command(action):
+    from aie._mlir_libs import _aie
+
+    return [_aie.__file__, action]
 
 
 def corefile(dirname, core, ext):
@@ -306,50 +421,200 @@ def aie_target_defines(aie_target):
     return ["-D__AIEARCH__=10"]
 
 
+# xchesscc predates the memory() function attribute; spell each one the way
+# it still understands.
+_CHESSHACK_MEMORY = {
+    "none": "readnone",
+    "read": "readonly",
+    "write": "writeonly",
+    "argmem: readwrite": "argmemonly",
+    "argmem: read": "argmemonly readonly",
+    "argmem: write": "argmemonly writeonly",
+    "inaccessiblemem: readwrite": "inaccessiblememonly",
+    "inaccessiblemem: read": "inaccessiblememonly readonly",
+    "inaccessiblemem: write": "inaccessiblememonly writeonly",
+    "argmem: readwrite, inaccessiblemem: readwrite": "inaccessiblemem_or_argmemonly",
+    "argmem: read, inaccessiblemem: read": "inaccessiblemem_or_argmemonly readonly",
+    "argmem: write, inaccessiblemem: write": "inaccessiblemem_or_argmemonly writeonly",
+}
+_CHESSHACK = re.compile(
+    r"memory\((" + "|".join(map(re.escape, _CHESSHACK_MEMORY)) + r")\)"
+)
+
+
 def chesshack(llvmir_chesslinked):
-    llvmir_chesslinked = (
-        llvmir_chesslinked.replace("memory(none)", "readnone")
-        .replace("memory(read)", "readonly")
-        .replace("memory(write)", "writeonly")
-        .replace("memory(argmem: readwrite)", "argmemonly")
-        .replace("memory(argmem: read)", "argmemonly readonly")
-        .replace("memory(argmem: write)", "argmemonly writeonly")
-        .replace("memory(inaccessiblemem: readwrite)", "inaccessiblememonly")
-        .replace("memory(inaccessiblemem: read)", "inaccessiblememonly readonly")
-        .replace("memory(inaccessiblemem: write)", "inaccessiblememonly writeonly")
-        .replace(
-            "memory(argmem: readwrite, inaccessiblemem: readwrite)",
-            "inaccessiblemem_or_argmemonly",
-        )
-        .replace(
-            "memory(argmem: read, inaccessiblemem: read)",
-            "inaccessiblemem_or_argmemonly readonly",
-        )
-        .replace(
-            "memory(argmem: write, inaccessiblemem: write)",
-            "inaccessiblemem_or_argmemonly writeonly",
-        )
+    return _CHESSHACK.sub(lambda m: _CHESSHACK_MEMORY[m.group(1)], llvmir_chesslinked)
+
+
+# The core function and the buffers are the only tile-specific symbols in the
+# LLVM IR of a core; their addresses are only resolved by the per-tile link.
+_LLVMIR_CORE_FUNCTION = re.compile(r"^define .*@(core_\d+_\d+)\(", re.MULTILINE)
+_LLVMIR_GLOBAL = re.compile(r"^@([\w.$]+) = ", re.MULTILINE)
+
+
+def _symbol_pattern(names, prefix=r"(?<![\w.$])"):
+    names = sorted(names, key=len, reverse=True)
+    return re.compile(prefix + "(" + "|".join(map(re.escape, names)) + r")(?![\w.$])")
+
+
+# Abstract the tile-specific symbols of a core's LLVM IR.  Returns the IR with
+# those symbols replaced by positional placeholders, together with the original
+# names in placeholder order.  Two cores with the same canonical IR compile to
+# the same object up to the names of these symbols.
+def canonicalize_core_llvmir(llvmir):
+    names = _LLVMIR_CORE_FUNCTION.findall(llvmir) + _LLVMIR_GLOBAL.findall(llvmir)
+    names = list(dict.fromkeys(names))
+    if not names:
+        return llvmir, names
+    index = {n: i for i, n in enumerate(names)}
+    canonical = _symbol_pattern(names, prefix="(?<=@)").sub(
+        lambda m: f"__aiecc_symbol_{index[m.group(1)]}", llvmir
     )
-    return llvmir_chesslinked
+    return canonical, names
+
+
+# Rename symbols in a linker script or BCF so that a tile can be linked against
+# an object compiled for another (equivalent) core.  Symbols of that other core
+# which this script also defines, e.g. for a neighbouring memory, are renamed out
+# of the way so they can't clash.
+def rename_script_symbols(script, renames):
+    renames = {k: v for k, v in renames.items() if k != v}
+    if not renames:
+        return script
+    for name in set(renames.values()) - set(renames):
+        renames[name] = f"__aiecc_unused_{name}"
+    return _symbol_pattern(renames).sub(lambda m: renames[m.group(1)], script)
 
 
 class FlowRunner:
-    def __init__(self, mlir_module_str, opts, tmpdirname):
+    # `workdir` is the directory the flow runs in, relative paths in `opts` are
+    # relative to it.  Concurrent flows (aiecc --batch) share one `limit` on the
+    # number of tools running at a time, one MemoryGate `memory` and one
+    # `executor` to run the tools with.  An incremental build that completes is
+    # recorded as `build_key` in the manifest, see design_build_key.
+    def __init__(
+        self,
+        mlir_module_str,
+        opts,
+        tmpdirname,
+        workdir=None,
+        limit=None,
+        name=None,
+        build_key=None,
+        memory=None,
+        executor=None,
+    ):
         self.mlir_module_str = mlir_module_str
         self.opts = opts
         self.tmpdirname = tmpdirname
+        self.workdir = os.path.abspath(workdir or os.getcwd())
+        self.limit = limit
+        self.build_key = build_key
+        self.memory = memory
+        self.executor = executor
+        # DesignInfo of the design, see prepare_flow.
+        self.design = None
+        self.label = f"{name}: " if name else ""
         self.runtimes = dict()
+        # Stage -> [tool fingerprints, seconds, invocations] of the tools that
+        # actually ran, for the compile-time history (with --history).
+        self.stage_times = dict()
         self.progress_bar = None
         self.maxtasks = 5
+        # Set once a step of the flow has failed: the first failure is the
+        # one reported, and no further steps are started.
         self.stopall = False
-        self.peano_clang_path = os.path.join(opts.peano_install_dir, "bin", "clang")
-        self.peano_opt_path = os.path.join(opts.peano_install_dir, "bin", "opt")
-        self.peano_llc_path = os.path.join(opts.peano_install_dir, "bin", "llc")
+        # Every command the flow runs gets a log of its output in log_dir.
+        self.log_dir = self.prepend_tmp("logs")
+        # Options of aie-opt for the MLIR files only the flow reads: bytecode,
+        # which is smaller and much faster to parse, unless they are kept for
+        # debugging.
+        self.mlir_output = [] if self.opts.keep_intermediates else ["--emit-bytecode"]
+        self.log_count = itertools.count()
+        self.peano_clang_path = os.path.join(
+            self.opts.peano_install_dir, "bin", "clang"
+        )
+        self.peano_opt_path = os.path.join(self.opts.peano_install_dir, "bin", "opt")
+        self.peano_llc_path = os.path.join(self.opts.peano_install_dir, "bin", "llc")
+        self.cache = (
+            aie.compiler.aiecc.cache.ArtifactCache(self.opts.cache_dir)
+            if self.opts.cache
+            else None
+        )
+        self.lowering_pool = None
+        # With --in-process, the design as prepare_flow lowered it, until
+        # route_in_process routes it.
+        self.module_with_addresses = None
+        self.chess_intrinsic_wrapper_ll_path = None
+        # Canonical core IR hash -> future of (object, symbol names) of the
+        # first core compiled with that IR; see --dedup-cores.
+        self.core_objects = dict()
+        # Timeline of the build, see --profile.
+        self.trace = (
+            aie.compiler.aiecc.profiling.TraceRecorder()
+            if self.opts.profiling
+            else None
+        )
+        # Per-pass profile of the pipelines run in-process, see --profile.
+        self.pass_statistics = [] if self.opts.profiling else None
+        self.manifest = (
+            aie.compiler.aiecc.manifest.BuildManifest(tmpdirname)
+            if self.opts.incremental
+            else None
+        )
 
     def prepend_tmp(self, x):
         return os.path.join(self.tmpdirname, x)
 
-    async def do_call(self, task, command, force=False):
+    def in_workdir(self, x):
+        return os.path.join(self.workdir, x)
+
+    # Start the log of `command`: its command line, followed by its output.
+    def new_log(self, command):
+        os.makedirs(self.log_dir, exist_ok=True)
+        log = os.path.join(
+            self.log_dir,
+            "%04d-%s.log" % (next(self.log_count), os.path.basename(command[0])),
+        )
+        with open(log, "w") as f:
+            f.write(" ".join(command) + "\n")
+        return log
+
+    @staticmethod
+    def log_output(log):
+        with open(log, "r", errors="replace") as f:
+            f.readline()
+            return f.read()
+
+    # Stop the flow and return the CompileError to raise for a failed step.
+    # Only the first failure is reported, with `output`, the output of the
+    # failed step.  Steps that fail after it do so because they are cancelled.
+    def failure(self, task, message, returncode=1, output="", log=None):
+        if task:
+            self.progress_bar._tasks[task].description = "[red] Error"
+        if not self.stopall:
+            self.stopall = True
+            sys.stderr.write(output)
+            print(message, file=sys.stderr)
+            if log is not None:
+                print(f"The log of the failed command is {log}", file=sys.stderr)
+        return CompileError(message, returncode)
+
+    # `inputs` and `outputs` declare the files a command reads and writes.  Only
+    # commands that declare them are eligible for the artifact cache and can be
+    # skipped by --incremental builds.  Returns False if the command was skipped
+    # because its outputs are up to date.  See do_pipeline for `stages` and
+    # `transform`.
+    async def do_call(
+        self,
+        task,
+        command,
+        force=False,
+        inputs=None,
+        outputs=None,
+        stages=None,
+        transform=None,
+    ):
         if self.stopall:
             return
 
@@ -359,57 +624,477 @@ class FlowRunner:
         start = time.time()
         if self.opts.verbose:
             print(commandstr)
-        if self.opts.execute or force:
-            proc = await asyncio.create_subprocess_exec(*command)
-            await proc.wait()
-            ret = proc.returncode
+        key = None
+        if (
+            (self.cache is not None or self.manifest is not None)
+            and self.opts.execute
+            and inputs is not None
+            and outputs
+        ):
+            # xchesscc keeps its intermediate files in here.
+            scratch = [self.prepend_tmp("work")]
+            key = aie.compiler.aiecc.cache.command_key(
+                command, inputs, outputs, cwd=self.workdir, scratch=scratch
+            )
+            key_args = (command, inputs, outputs)
+            outputs = [self.in_workdir(p) for p in outputs]
+        rusage = None
+        log = None
+        cached = False
+        if key is not None and self.up_to_date(outputs[0], key):
+            if self.opts.verbose:
+                print(f"Up to date: {commandstr}")
+            if task:
+                self.progress_bar.update(task, advance=1, command="")
+            return False
+        if (
+            key is not None
+            and self.cache is not None
+            and self.cache.fetch(key, outputs)
+        ):
+            if self.opts.verbose:
+                print(f"Restored from cache: {commandstr}")
+            ret = 0
+            cached = True
+        elif self.opts.execute or force:
+            log = self.new_log(command)
+            executor = self.executor.select(inputs, outputs)
+            if stages is not None:
+                ret, rusage = await self.run_pipeline(
+                    stages, log, transform, outputs and outputs[0]
+                )
+            # Only the tools running here count against the memory budget.
+            elif self.memory is not None and not executor.remote:
+                async with self.memory.admit(command):
+                    ret, rusage = await executor.run(command, self.workdir, log=log)
+                if rusage is not None:
+                    self.memory.estimates.observe(command, rusage.ru_maxrss)
+            else:
+                ret, rusage = await executor.run(
+                    command, self.workdir, inputs, outputs, log=log
+                )
+            if ret == 0:
+                # Output of concurrent tools doesn't interleave.
+                sys.stderr.write(self.log_output(log))
+            if ret == 0 and key is not None and self.cache is not None:
+                self.cache.store(key, outputs)
         else:
             ret = 0
         end = time.time()
         if self.opts.verbose:
             print(f"Done in {end - start:.3f} sec: {commandstr}")
         self.runtimes[commandstr] = end - start
+        if log is not None and ret == 0:
+            self.add_stage_time(
+                [command for command, _ in stages] if stages else [command],
+                end - start,
+            )
+        if self.trace is not None:
+            self.trace.command(
+                command,
+                start,
+                end,
+                slot=current_slot.get(),
+                rusage=rusage,
+                returncode=ret,
+                cached=cached,
+            )
         if task:
             self.progress_bar.update(task, advance=1, command="")
             self.maxtasks = max(self.progress_bar._tasks[task].completed, self.maxtasks)
             self.progress_bar._tasks[task].total = self.maxtasks
 
         if ret != 0:
+            raise self.failure(
+                task,
+                "Error encountered while running: " + commandstr,
+                ret,
+                self.log_output(log),
+                log,
+            )
+        if key is not None and self.manifest is not None:
+            self.manifest.record(
+                outputs[0], key, *key_args, cwd=self.workdir, scratch=scratch
+            )
+        return True
+
+    # Run the commands of `stages`, (command, file) pairs, with the output of
+    # each piped into the next.  `file` is where the output of the stage goes
+    # without --pipe, it is only written with --keep-intermediates.  With
+    # `transform`, the output of the last stage is passed through it and
+    # written to outputs[0].  Otherwise the pipeline is treated like a single
+    # command by do_call.
+    async def do_pipeline(
+        self, task, stages, inputs=None, outputs=None, transform=None
+    ):
+        command = list(stages[0][0])
+        for stage, _ in stages[1:]:
+            command += ["|", *stage]
+        if transform is not None:
+            command += ["|", transform.__name__, ">", outputs[0]]
+        return await self.do_call(
+            task,
+            command,
+            inputs=inputs,
+            outputs=outputs,
+            stages=stages,
+            transform=transform,
+        )
+
+    # Returns the exit code of the first stage that failed, or 0, and the
+    # resource usage of the stages together.
+    async def run_pipeline(self, stages, log, transform=None, output=None):
+        commands = [command for command, _ in stages]
+        tees = dict()
+        if self.opts.keep_intermediates:
+            tees = {i: f for i, (_, f) in enumerate(stages) if f is not None}
+        run = self.executor.select(None, None).run_pipeline(
+            commands, self.workdir, log, tees, capture=transform is not None
+        )
+        if self.memory is not None:
+            async with self.memory.admit(*commands):
+                results, captured = await run
+        else:
+            results, captured = await run
+
+        usages = [rusage for _, rusage in results if rusage is not None]
+        if self.memory is not None:
+            for command, (_, rusage) in zip(commands, results):
+                if rusage is not None:
+                    self.memory.estimates.observe(command, rusage.ru_maxrss)
+        ret = next((r for r, _ in results if r != 0), 0)
+        if ret == 0 and transform is not None:
+            await write_file_async(
+                transform(captured.decode()), self.in_workdir(output)
+            )
+        if not usages:
+            return ret, None
+        # The stages run at the same time, so their peak RSS add up.
+        return ret, types.SimpleNamespace(
+            **{
+                field: sum(getattr(u, field) for u in usages)
+                for field in ("ru_utime", "ru_stime", "ru_maxrss")
+            }
+        )
+
+    # The commands lowering `core` of the design in `file_with_addresses` to
+    # LLVM IR on their standard output, as stages of do_pipeline.
+    def core_lowering_stages(self, core, file_with_addresses):
+        # fmt: off
+        return [
+            (["aie-opt", "--aie-localize-locks", "--aie-normalize-address-spaces", "--aie-standard-lowering=tilecol=%d tilerow=%d" % core[0:2], "--aiex-standard-lowering", *self.mlir_output, file_with_addresses], corefile(self.tmpdirname, core, "mlir")),
+            (["aie-opt", f"--pass-pipeline={LOWER_TO_LLVM_PIPELINE}", *self.mlir_output, "-"], corefile(self.tmpdirname, core, "opt.mlir")),
+            (["aie-translate", "--mlir-to-llvmir", "-"], corefile(self.tmpdirname, core, "ll")),
+        ]
+        # fmt: on
+
+    # Account `seconds` spent running `commands` to their stage, by default the
+    # stages of the commands piped into each other.
+    def add_stage_time(self, commands, seconds, stage=None):
+        if not self.opts.history:
+            return
+        if stage is None:
+            stage = " | ".join(
+                aie.compiler.aiecc.profiling.stage_of(c) for c in commands
+            )
+        entry = self.stage_times.setdefault(stage, [set(), 0.0, 0])
+        entry[0].update(
+            aie.compiler.aiecc.cache.tool_fingerprint(c[0]) for c in commands
+        )
+        entry[1] += seconds
+        entry[2] += 1
+
+    def up_to_date(self, name, key):
+        return self.manifest is not None and self.manifest.up_to_date(name, key)
+
+    # Key of a stage the aie Python bindings run in-process.
+    def in_process_key(self, action, inputs, outputs, extra=()):
+        if self.manifest is None or not self.opts.execute:
+            return None
+        return aie.compiler.aiecc.cache.command_key(
+            in_process_command(action), inputs, outputs, extra, self.workdir
+        )
+
+    def record_in_process(self, name, key, action, inputs, outputs, extra=(), **kw):
+        self.manifest.record(
+            name,
+            key,
+            in_process_command(action),
+            inputs,
+            outputs,
+            extra,
+            self.workdir,
+            **kw,
+        )
+
+    # Lower one core to LLVM IR (and its BCF) in the --in-process worker pool.
+    # This replaces the aie-opt/aie-translate invocations of process_core.
+    async def lower_core_in_process(
+        self, task, core, file_with_addresses, file_core_llvmir, file_core_bcf
+    ):
+        if self.stopall:
+            return
+
+        corecol, corerow, _ = core
+        commandstr = (
+            f"lower core ({corecol}, {corerow}) in-process -o {file_core_llvmir}"
+        )
+        outputs = [file_core_llvmir] + ([file_core_bcf] if file_core_bcf else [])
+        key = self.in_process_key(
+            "lower-core",
+            [file_with_addresses],
+            outputs,
+            extra=[AIE_LOWER_TO_LLVM(corecol, corerow)],
+        )
+        if key is not None and self.up_to_date(file_core_llvmir, key):
+            if self.opts.verbose:
+                print(f"Up to date: {commandstr}")
             if task:
-                self.progress_bar._tasks[task].description = "[red] Error"
-            print("Error encountered while running: " + commandstr, file=sys.stderr)
-            sys.exit(ret)
+                self.progress_bar.update(task, advance=1, command="")
+            return
+        if task:
+            self.progress_bar.update(task, advance=0, command=commandstr[0:30])
+        start = time.time()
+        if self.opts.verbose:
+            print(commandstr)
+        if self.opts.execute:
+            try:
+                await self.lowering_pool.call(
+                    _lower_core_in_process,
+                    corecol,
+                    corerow,
+                    file_core_llvmir,
+                    file_core_bcf,
+                )
+            except Exception as e:
+                raise self.failure(
+                    task,
+                    "Error encountered while running: " + commandstr,
+                    output=f"{e}\n",
+                ) from e
+            if key is not None:
+                self.record_in_process(
+                    file_core_llvmir,
+                    key,
+                    "lower-core",
+                    [file_with_addresses],
+                    outputs,
+                    extra=[AIE_LOWER_TO_LLVM(corecol, corerow)],
+                )
+        end = time.time()
+        if self.opts.verbose:
+            print(f"Done in {end - start:.3f} sec: {commandstr}")
+        self.runtimes[commandstr] = end - start
+        if self.opts.execute:
+            self.add_stage_time(
+                [in_process_command("lower-core")],
+                end - start,
+                stage="in-process lowering",
+            )
+        if self.trace is not None:
+            self.trace.command(
+                ["in-process lowering", "-o", file_core_llvmir],
+                start,
+                end,
+                slot=current_slot.get(),
+            )
+        if task:
+            self.progress_bar.update(task, advance=1, command="")
+
+    # Route the design to input_physical.mlir with --in-process: the passes
+    # run on the module prepare_flow lowered, which saves aie-opt parsing
+    # input_with_addresses.mlir again.  This replaces the aie-opt invocation
+    # of process_host_cgen.
+    async def route_in_process(self, task, file_with_addresses, file_physical):
+        if self.stopall:
+            return
+
+        pass_pipeline = INPUT_PHYSICAL_PIPELINE.materialize(module=True)
+        commandstr = f"route in-process -o {file_physical}"
+        key = self.in_process_key(pass_pipeline, [file_with_addresses], [file_physical])
+        if key is not None and self.up_to_date(file_physical, key):
+            if self.opts.verbose:
+                print(f"Up to date: {commandstr}")
+            return
+        if task:
+            self.progress_bar.update(task, advance=0, command=commandstr[0:30])
+        start = time.time()
+        if self.opts.verbose:
+            print(commandstr)
+        if self.opts.execute:
+            module, self.module_with_addresses = self.module_with_addresses, None
+
+            def route():
+                from aie.ir import Location
+
+                with module.context, Location.unknown():
+                    apply_passes(
+                        pass_pipeline,
+                        module,
+                        file_physical,
+                        bytecode=bool(self.mlir_output),
+                        statistics=self.pass_statistics,
+                    )
+
+            try:
+                await self.executor.call(route)
+            except Exception as e:
+                raise self.failure(
+                    task,
+                    "Error encountered while running: " + commandstr,
+                    output=f"{e}\n",
+                ) from e
+            if key is not None:
+                self.record_in_process(
+                    file_physical,
+                    key,
+                    pass_pipeline,
+                    [file_with_addresses],
+                    [file_physical],
+                )
+        end = time.time()
+        if self.opts.verbose:
+            print(f"Done in {end - start:.3f} sec: {commandstr}")
+        self.runtimes[commandstr] = end - start
+        if self.opts.execute:
+            self.add_stage_time(
+                [in_process_command("route")], end - start, stage="in-process routing"
+            )
+        if self.trace is not None:
+            self.trace.command(
+                ["in-process routing", "-o", file_physical],
+                start,
+                end,
+                slot=current_slot.get(),
+            )
+
+    # Compile the LLVM IR of a single core to an object.
+    async def compile_core(
+        self,
+        task,
+        core,
+        file_core_llvmir,
+        file_core_obj,
+        aie_target,
+        chess_intrinsic_wrapper_ll_path,
+    ):
+        # fmt: off
+        if self.opts.xchesscc:
+            file_core_llvmir_chesslinked = await self.chesshack(task, file_core_llvmir, chess_intrinsic_wrapper_ll_path)
+            await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_core_llvmir_chesslinked, "-o", file_core_obj], inputs=[file_core_llvmir_chesslinked], outputs=[file_core_obj])
+        else:
+            file_core_llvmir_stripped = corefile(self.tmpdirname, core, "stripped.ll")
+            await self.do_call(task, [self.peano_opt_path, "--passes=default<O2>,strip", "-S", file_core_llvmir, "-o", file_core_llvmir_stripped], inputs=[file_core_llvmir], outputs=[file_core_llvmir_stripped])
+            await self.do_call(task, [self.peano_llc_path, file_core_llvmir_stripped, "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", file_core_obj], inputs=[file_core_llvmir_stripped], outputs=[file_core_obj])
+        # fmt: on
+
+    # Compile a core unless an equivalent core (see canonicalize_core_llvmir)
+    # has already been compiled.  Returns the object to link the core with and
+    # the symbol renames its linker script/BCF needs to match that object.
+    async def compile_core_once(
+        self,
+        task,
+        core,
+        file_core_llvmir,
+        file_core_obj,
+        aie_target,
+        chess_intrinsic_wrapper_ll_path,
+    ):
+        if not self.opts.execute:
+            await self.compile_core(
+                task,
+                core,
+                file_core_llvmir,
+                file_core_obj,
+                aie_target,
+                chess_intrinsic_wrapper_ll_path,
+            )
+            return file_core_obj, {}
+
+        canonical, names = canonicalize_core_llvmir(
+            await read_file_async(file_core_llvmir)
+        )
+        key = hashlib.sha256(canonical.encode()).hexdigest()
+        if key not in self.core_objects:
+            shared = asyncio.get_running_loop().create_future()
+            # A failure is raised here and in the cores waiting for the
+            # object, if there are any; don't have asyncio log it as well.
+            shared.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self.core_objects[key] = shared
+            try:
+                await self.compile_core(
+                    task,
+                    core,
+                    file_core_llvmir,
+                    file_core_obj,
+                    aie_target,
+                    chess_intrinsic_wrapper_ll_path,
+                )
+            except asyncio.CancelledError:
+                shared.cancel()
+                raise
+            except BaseException as e:
+                shared.set_exception(e)
+                raise
+            shared.set_result((core, file_core_obj, names))
+            return file_core_obj, {}
+
+        shared = self.core_objects[key]
+        if not shared.done():
+            # Give the -j slot of this core to other work while the object
+            # is being compiled.
+            self.limit.release()
+            try:
+                await asyncio.shield(shared)
+            finally:
+                await self.limit.acquire()
+        shared_core, shared_obj, shared_names = shared.result()
+        if self.opts.verbose:
+            print(
+                "Core (%d, %d) reuses the object of core (%d, %d): %s"
+                % (*core[0:2], *shared_core[0:2], shared_obj)
+            )
+        return shared_obj, dict(zip(names, shared_names))
+
+    # Write a copy of a core's linker script/BCF with its symbols renamed to
+    # those of the object it is linked with.
+    async def rename_link_script(self, core, file_script, renames):
+        if not renames:
+            return file_script
+        base, ext = os.path.splitext(os.path.basename(file_script))
+        file_renamed = self.prepend_tmp(base + ".shared" + ext)
+        script = await read_file_async(file_script)
+        await write_file_async(rename_script_symbols(script, renames), file_renamed)
+        return file_renamed
+
+    # Inputs of a link step: the object, the linker script/BCF and whatever
+    # additional objects the script pulls in.
+    def link_inputs(self, file_obj, file_script):
+        if not self.opts.execute or (
+            self.cache is None and self.manifest is None and not self.executor.remote
+        ):
+            return None
+        return [
+            file_obj,
+            file_script,
+            *aie.compiler.aiecc.cache.extract_link_inputs(file_script, self.workdir),
+        ]
 
     # In order to run xchesscc on modern ll code, we need a bunch of hacks.
+    # They are applied to the output of llvm-link as it comes out.
     async def chesshack(self, task, llvmir, chess_intrinsic_wrapper_ll_path):
-        llvmir_chesshack = llvmir + "chesshack.ll"
         llvmir_chesslinked_path = llvmir + "chesslinked.ll"
-        if not self.opts.execute:
-            return llvmir_chesslinked_path
-        llvmir = await read_file_async(llvmir)
-
-        await write_file_async(llvmir, llvmir_chesshack)
-        assert os.path.exists(llvmir_chesshack)
-        await self.do_call(
+        await self.do_pipeline(
             task,
-            [
-                "llvm-link",
-                llvmir_chesshack,
-                chess_intrinsic_wrapper_ll_path,
-                "-S",
-                "-o",
-                llvmir_chesslinked_path,
-            ],
+            [(["llvm-link", llvmir, chess_intrinsic_wrapper_ll_path, "-S"], None)],
+            inputs=[llvmir, chess_intrinsic_wrapper_ll_path],
+            outputs=[llvmir_chesslinked_path],
+            transform=chesshack,
         )
-
-        llvmir_chesslinked_ir = await read_file_async(llvmir_chesslinked_path)
-        llvmir_chesslinked_ir = chesshack(llvmir_chesslinked_ir)
-        await write_file_async(llvmir_chesslinked_ir, llvmir_chesslinked_path)
-
         return llvmir_chesslinked_path
 
     async def prepare_for_chesshack(self, task, aie_target):
-        if opts.compile and opts.xchesscc:
+        if self.opts.compile and self.opts.xchesscc:
             install_path = aie.compiler.aiecc.configure.install_path()
             runtime_lib_path = os.path.join(install_path, "aie_runtime_lib")
             chess_intrinsic_wrapper_cpp = os.path.join(
@@ -421,12 +1106,40 @@ class FlowRunner:
             )
 
             # fmt: off
-            await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+f", "+P", "4", chess_intrinsic_wrapper_cpp, "-o", chess_intrinsic_wrapper_ll_path])
+            command = ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+f", "+P", "4", chess_intrinsic_wrapper_cpp, "-o", chess_intrinsic_wrapper_ll_path]
             # fmt: on
 
+            # The wrapper only depends on the target and the aietools install,
+            # so with --cache it is shared by all builds and designs.
+            if self.opts.execute and self.cache is not None:
+                key = aie.compiler.aiecc.cache.command_key(
+                    command,
+                    [chess_intrinsic_wrapper_cpp],
+                    [chess_intrinsic_wrapper_ll_path],
+                    extra=["target stripped"],
+                    cwd=self.workdir,
+                    scratch=[self.prepend_tmp("work")],
+                )
+                if self.cache.fetch(key, [chess_intrinsic_wrapper_ll_path]):
+                    if self.opts.verbose:
+                        print(f"Restored from cache: {' '.join(command)}")
+                    if task:
+                        self.progress_bar.update(task, advance=1, command="")
+                    return chess_intrinsic_wrapper_ll_path
+
+            compiled = await self.do_call(
+                task,
+                command,
+                inputs=[chess_intrinsic_wrapper_cpp],
+                outputs=[chess_intrinsic_wrapper_ll_path],
+            )
+
             # this has to be here and not higher because there are tests that check for the command string for the above do_call
             if not self.opts.execute:
                 return
+            # An up to date wrapper has already had its target stripped.
+            if not compiled:
+                return chess_intrinsic_wrapper_ll_path
             chess_intrinsic_wrapper = await read_file_async(
                 chess_intrinsic_wrapper_ll_path
             )
@@ -436,6 +1149,10 @@ class FlowRunner:
             await write_file_async(
                 chess_intrinsic_wrapper, chess_intrinsic_wrapper_ll_path
             )
+            if self.manifest is not None:
+                self.manifest.refresh(chess_intrinsic_wrapper_ll_path)
+            if self.cache is not None:
+                self.cache.store(key, [chess_intrinsic_wrapper_ll_path])
             return chess_intrinsic_wrapper_ll_path
 
     async def process_core(
@@ -480,7 +1197,7 @@ class FlowRunner:
 
             clang_link_args = [me_basic_o, libc, "-Wl,--gc-sections"]
 
-            if opts.progress:
+            if self.opts.progress:
                 task = self.progress_bar.add_task(
                     "[yellow] Core (%d, %d)" % core[0:2],
                     total=self.maxtasks,
@@ -491,81 +1208,130 @@ class FlowRunner:
 
             # fmt: off
             corecol, corerow, elf_file = core
-            if not opts.unified:
+            aie.compiler.aiecc.profiling.current_core.set((corecol, corerow))
+            # With --pipe, the code of the core streams from aie-opt to the compiler.
+            piped = self.opts.pipe and self.opts.compile and not (self.opts.unified or self.opts.in_process or self.opts.dedup_cores)
+            if not self.opts.unified and not self.opts.in_process and not piped:
                 file_core = corefile(self.tmpdirname, core, "mlir")
-                await self.do_call(task, ["aie-opt", "--aie-localize-locks", "--aie-normalize-address-spaces", "--aie-standard-lowering=tilecol=%d tilerow=%d" % core[0:2], "--aiex-standard-lowering", file_with_addresses, "-o", file_core])
+                await self.do_call(task, ["aie-opt", "--aie-localize-locks", "--aie-normalize-address-spaces", "--aie-standard-lowering=tilecol=%d tilerow=%d" % core[0:2], "--aiex-standard-lowering", *self.mlir_output, file_with_addresses, "-o", file_core], inputs=[file_with_addresses], outputs=[file_core])
                 file_opt_core = corefile(self.tmpdirname, core, "opt.mlir")
-                await self.do_call(task, ["aie-opt", f"--pass-pipeline={LOWER_TO_LLVM_PIPELINE}", file_core, "-o", file_opt_core])
+                await self.do_call(task, ["aie-opt", f"--pass-pipeline={LOWER_TO_LLVM_PIPELINE}", *self.mlir_output, file_core, "-o", file_opt_core], inputs=[file_core], outputs=[file_opt_core])
             if self.opts.xbridge:
                 file_core_bcf = corefile(self.tmpdirname, core, "bcf")
-                await self.do_call(task, ["aie-translate", file_with_addresses, "--aie-generate-bcf", "--tilecol=%d" % corecol, "--tilerow=%d" % corerow, "-o", file_core_bcf])
+                if self.opts.unified or not self.opts.in_process:
+                    await self.do_call(task, ["aie-translate", file_with_addresses, "--aie-generate-bcf", "--tilecol=%d" % corecol, "--tilerow=%d" % corerow, "-o", file_core_bcf], inputs=[file_with_addresses], outputs=[file_core_bcf])
             else:
                 file_core_ldscript = corefile(self.tmpdirname, core, "ld.script")
-                await self.do_call(task, ["aie-translate", file_with_addresses, "--aie-generate-ldscript", "--tilecol=%d" % corecol, "--tilerow=%d" % corerow, "-o", file_core_ldscript])
+                await self.do_call(task, ["aie-translate", file_with_addresses, "--aie-generate-ldscript", "--tilecol=%d" % corecol, "--tilerow=%d" % corerow, "-o", file_core_ldscript], inputs=[file_with_addresses], outputs=[file_core_ldscript])
             if not self.opts.unified:
                 file_core_llvmir = corefile(self.tmpdirname, core, "ll")
-                await self.do_call(task, ["aie-translate", "--mlir-to-llvmir", file_opt_core, "-o", file_core_llvmir])
+                if self.opts.in_process:
+                    await self.lower_core_in_process(task, core, file_with_addresses, file_core_llvmir, file_core_bcf if self.opts.xbridge else None)
+                elif not piped:
+                    await self.do_call(task, ["aie-translate", "--mlir-to-llvmir", file_opt_core, "-o", file_core_llvmir], inputs=[file_opt_core], outputs=[file_core_llvmir])
                 file_core_obj = corefile(self.tmpdirname, core, "o")
 
             file_core_elf = elf_file if elf_file else corefile(".", core, "elf")
 
-            if opts.compile and opts.xchesscc:
-                if not opts.unified:
-                    file_core_llvmir_chesslinked = await self.chesshack(task, file_core_llvmir, chess_intrinsic_wrapper_ll_path)
+            if self.opts.compile and self.opts.dedup_cores and not self.opts.unified:
+                file_core_obj, renames = await self.compile_core_once(task, core, file_core_llvmir, file_core_obj, aie_target, chess_intrinsic_wrapper_ll_path)
+                if self.opts.link and self.opts.xbridge:
+                    file_core_bcf = await self.rename_link_script(core, file_core_bcf, renames)
+                    link_with_obj = await extract_input_files(file_core_bcf)
+                    await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", file_core_obj, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_bcf), outputs=[file_core_elf])
+                elif self.opts.link:
+                    file_core_ldscript = await self.rename_link_script(core, file_core_ldscript, renames)
+                    await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_ldscript), outputs=[file_core_elf])
+
+            elif self.opts.compile and self.opts.xchesscc:
+                if piped:
+                    # The wrapper is only prepared when executing.
+                    chess_intrinsic_wrapper_ll_path = chess_intrinsic_wrapper_ll_path or self.prepend_tmp("chess_intrinsic_wrapper.ll")
+                    file_core_llvmir_chesslinked = file_core_llvmir + "chesslinked.ll"
+                    await self.do_pipeline(task, [*self.core_lowering_stages(core, file_with_addresses), (["llvm-link", "-", chess_intrinsic_wrapper_ll_path, "-S"], None)], inputs=[file_with_addresses, chess_intrinsic_wrapper_ll_path], outputs=[file_core_llvmir_chesslinked], transform=chesshack)
+                if not self.opts.unified:
+                    if not piped:
+                        file_core_llvmir_chesslinked = await self.chesshack(task, file_core_llvmir, chess_intrinsic_wrapper_ll_path)
                     if self.opts.link and self.opts.xbridge:
                         link_with_obj = await extract_input_files(file_core_bcf)
-                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", "+P", "4", file_core_llvmir_chesslinked, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf])
+                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", "+P", "4", file_core_llvmir_chesslinked, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf], inputs=self.link_inputs(file_core_llvmir_chesslinked, file_core_bcf), outputs=[file_core_elf])
                     elif self.opts.link:
-                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_core_llvmir_chesslinked, "-o", file_core_obj])
-                        await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf])
+                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_core_llvmir_chesslinked, "-o", file_core_obj], inputs=[file_core_llvmir_chesslinked], outputs=[file_core_obj])
+                        await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_ldscript), outputs=[file_core_elf])
                 else:
                     file_core_obj = self.unified_file_core_obj
-                    if opts.link and opts.xbridge:
+                    if self.opts.link and self.opts.xbridge:
                         link_with_obj = await extract_input_files(file_core_bcf)
-                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", file_core_obj, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf])
-                    elif opts.link:
-                        await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf])
+                        await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", file_core_obj, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_bcf), outputs=[file_core_elf])
+                    elif self.opts.link:
+                        await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_ldscript), outputs=[file_core_elf])
 
-            elif opts.compile:
-                if not opts.unified:
+            elif self.opts.compile:
+                if piped:
+                    await self.do_pipeline(task, [*self.core_lowering_stages(core, file_with_addresses), ([self.peano_opt_path, "--passes=default<O2>,strip", "-S", "-"], corefile(self.tmpdirname, core, "stripped.ll")), ([self.peano_llc_path, "-", "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", file_core_obj], None)], inputs=[file_with_addresses], outputs=[file_core_obj])
+                elif not self.opts.unified:
                     file_core_llvmir_stripped = corefile(self.tmpdirname, core, "stripped.ll")
-                    await self.do_call(task, [self.peano_opt_path, "--passes=default<O2>,strip", "-S", file_core_llvmir, "-o", file_core_llvmir_stripped])
-                    await self.do_call(task, [self.peano_llc_path, file_core_llvmir_stripped, "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", file_core_obj])
+                    await self.do_call(task, [self.peano_opt_path, "--passes=default<O2>,strip", "-S", file_core_llvmir, "-o", file_core_llvmir_stripped], inputs=[file_core_llvmir], outputs=[file_core_llvmir_stripped])
+                    await self.do_call(task, [self.peano_llc_path, file_core_llvmir_stripped, "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", file_core_obj], inputs=[file_core_llvmir_stripped], outputs=[file_core_obj])
                 else:
                     file_core_obj = self.unified_file_core_obj
 
-                if opts.link and opts.xbridge:
+                if self.opts.link and self.opts.xbridge:
                     link_with_obj = await extract_input_files(file_core_bcf)
-                    await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", file_core_obj, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf])
-                elif opts.link:
-                    await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf])
+                    await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-d", "-f", file_core_obj, link_with_obj, "+l", file_core_bcf, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_bcf), outputs=[file_core_elf])
+                elif self.opts.link:
+                    await self.do_call(task, [self.peano_clang_path, "-O2", "--target=" + aie_peano_target, file_core_obj, *clang_link_args, "-Wl,-T," + file_core_ldscript, "-o", file_core_elf], inputs=self.link_inputs(file_core_obj, file_core_ldscript), outputs=[file_core_elf])
 
-            self.progress_bar.update(self.progress_bar.task_completed, advance=1)
+            self.progress_bar.update(self.progress_task_completed, advance=1)
             if task:
                 self.progress_bar.update(task, advance=0, visible=False)
             # fmt: on
 
     async def process_cdo(self):
         from aie.dialects.aie import generate_cdo
-
+        from aie.ir import Context, Location, Module
+
+        for elf in glob.glob(self.in_workdir("*.elf")):
+            try:
+                shutil.copy(elf, self.tmpdirname)
+            except shutil.SameFileError:
+                pass
+        for elf_map in glob.glob(self.in_workdir("*.elf.map")):
+            try:
+                shutil.copy(elf_map, self.tmpdirname)
+            except shutil.SameFileError:
+                pass
+        file_physical = self.prepend_tmp("input_physical.mlir")
+        # The ELFs generate_cdo loads, by the same names.
+        elfs = [
+            self.prepend_tmp(elf or f"core_{col}_{row}.elf")
+            for col, row, elf in self.design.cores
+        ]
+        inputs = [file_physical, *(elf for elf in elfs if os.path.exists(elf))]
+        # The CDO files are only known once they have been generated.
+        name = self.prepend_tmp("aie_cdo_init.bin")
+        key = self.in_process_key("generate-cdo", inputs, [])
+        if key is not None and self.up_to_date(name, key):
+            if self.opts.verbose:
+                print(f"Up to date: generate_cdo {file_physical}")
+            return
+        # input_physical.mlir is the design after routing, which only exists
+        # as a file; this is the one other place it has to be parsed.
         with Context(), Location.unknown():
-            for elf in glob.glob("*.elf"):
-                try:
-                    shutil.copy(elf, self.tmpdirname)
-                except shutil.SameFileError:
-                    pass
-            for elf_map in glob.glob("*.elf.map"):
-                try:
-                    shutil.copy(elf_map, self.tmpdirname)
-                except shutil.SameFileError:
-                    pass
-            input_physical = Module.parse(
-                await read_file_async(self.prepend_tmp("input_physical.mlir"))
-            )
+            input_physical = Module.parse(await read_file_async(file_physical, "rb"))
             generate_cdo(input_physical.operation, self.tmpdirname)
+            if key is not None:
+                self.record_in_process(
+                    name,
+                    key,
+                    "generate-cdo",
+                    inputs,
+                    [],
+                    produced=sorted(glob.glob(self.prepend_tmp("aie_cdo_*.bin"))),
+                )
 
     async def process_xclbin_gen(self, has_cores):
-        if opts.progress:
+        if self.opts.progress:
             task = self.progress_bar.add_task(
                 "[yellow] XCLBIN generation ", total=10, command="starting"
             )
@@ -577,18 +1343,13 @@ class FlowRunner:
             self.prepend_tmp("mem_topology.json"),
         )
 
-        await write_file_async(
-            json.dumps(emit_partition(self.mlir_module_str, opts.kernel_id), indent=2),
-            self.prepend_tmp("aie_partition.json"),
-        )
-
         buffer_arg_names = ["in", "tmp", "out"]
         await write_file_async(
             json.dumps(
                 emit_design_kernel_json(
-                    opts.kernel_name,
-                    opts.kernel_id,
-                    opts.instance_name,
+                    self.opts.kernel_name,
+                    self.opts.kernel_id,
+                    self.opts.instance_name,
                     buffer_arg_names,
                 ),
                 indent=2,
@@ -596,22 +1357,38 @@ class FlowRunner:
             self.prepend_tmp("kernels.json"),
         )
 
-        await write_file_async(
-            emit_design_bif(self.tmpdirname, has_cores),
-            self.prepend_tmp("design.bif"),
+        design_bif = emit_design_bif(self.tmpdirname, has_cores)
+        await write_file_async(design_bif, self.prepend_tmp("design.bif"))
+        cdo_files = re.findall(r"file=(\S+)", design_bif)
+
+        # Everything that goes into the xclbin is a function of the design, so
+        # that rebuilding an unchanged design produces the same xclbin.
+        file_partition = self.prepend_tmp("aie_partition.json")
+        pdi_uuid = await self.executor.call(
+            aie.compiler.aiecc.xclbin.pdi_uuid, design_bif
         )
+        partition = emit_partition(self.design, self.opts.kernel_id, pdi_uuid=pdi_uuid)
+        await write_file_async(json.dumps(partition, indent=2), file_partition)
 
         # fmt: off
-        await self.do_call(task, ["bootgen", "-arch", "versal", "-image", self.prepend_tmp("design.bif"), "-o", self.prepend_tmp("design.pdi"), "-w"])
-        await self.do_call(task, ["xclbinutil", "--add-replace-section", "MEM_TOPOLOGY:JSON:" + self.prepend_tmp("mem_topology.json"), "--add-kernel", self.prepend_tmp("kernels.json"), "--add-replace-section", "AIE_PARTITION:JSON:" + self.prepend_tmp("aie_partition.json"), "--force", "--output", opts.xclbin_name])
+        await self.do_call(task, ["bootgen", "-arch", "versal", "-image", self.prepend_tmp("design.bif"), "-o", self.prepend_tmp("design.pdi"), "-w"], inputs=[self.prepend_tmp("design.bif"), *cdo_files], outputs=[self.prepend_tmp("design.pdi")])
+        packaged = await self.do_call(task, ["xclbinutil", "--add-replace-section", "MEM_TOPOLOGY:JSON:" + self.prepend_tmp("mem_topology.json"), "--add-kernel", self.prepend_tmp("kernels.json"), "--add-replace-section", "AIE_PARTITION:JSON:" + file_partition, "--force", "--output", self.opts.xclbin_name], inputs=[self.prepend_tmp("mem_topology.json"), self.prepend_tmp("kernels.json"), file_partition, self.prepend_tmp("design.pdi")], outputs=[self.opts.xclbin_name])
         # fmt: on
+        # An up to date xclbin has already been made deterministic.
+        if packaged and self.opts.execute:
+            xclbin = self.in_workdir(self.opts.xclbin_name)
+            await self.executor.call(
+                aie.compiler.aiecc.xclbin.make_deterministic, xclbin
+            )
+            if self.manifest is not None:
+                self.manifest.refresh(xclbin)
 
     async def process_host_cgen(self, aie_target, file_with_addresses):
         async with self.limit:
             if self.stopall:
                 return
 
-            if opts.progress:
+            if self.opts.progress:
                 task = self.progress_bar.add_task(
                     "[yellow] Host compilation ", total=10, command="starting"
                 )
@@ -620,21 +1397,27 @@ class FlowRunner:
 
             # Generate the included host interface
             file_physical = self.prepend_tmp("input_physical.mlir")
-            await self.do_call(
-                task,
-                [
-                    "aie-opt",
-                    "--aie-create-pathfinder-flows",
-                    "--aie-lower-broadcast-packet",
-                    "--aie-create-packet-flows",
-                    "--aie-lower-multicast",
-                    file_with_addresses,
-                    "-o",
-                    file_physical,
-                ],
-            )
+            if self.module_with_addresses is not None:
+                await self.route_in_process(task, file_with_addresses, file_physical)
+            else:
+                await self.do_call(
+                    task,
+                    [
+                        "aie-opt",
+                        "--aie-create-pathfinder-flows",
+                        "--aie-lower-broadcast-packet",
+                        "--aie-create-packet-flows",
+                        "--aie-lower-multicast",
+                        *self.mlir_output,
+                        file_with_addresses,
+                        "-o",
+                        file_physical,
+                    ],
+                    inputs=[file_with_addresses],
+                    outputs=[file_physical],
+                )
 
-            if opts.airbin:
+            if self.opts.airbin:
                 file_airbin = self.prepend_tmp("air.bin")
                 await self.do_call(
                     task,
@@ -645,6 +1428,8 @@ class FlowRunner:
                         "-o",
                         file_airbin,
                     ],
+                    inputs=[file_physical],
+                    outputs=[file_airbin],
                 )
             else:
                 file_inc_cpp = self.prepend_tmp("aie_inc.cpp")
@@ -657,9 +1442,11 @@ class FlowRunner:
                         "-o",
                         file_inc_cpp,
                     ],
+                    inputs=[file_physical],
+                    outputs=[file_inc_cpp],
                 )
 
-            if opts.link_against_hsa:
+            if self.opts.link_against_hsa:
                 file_inc_cpp = self.prepend_tmp("aie_data_movement.cpp")
                 await self.do_call(
                     task,
@@ -670,54 +1457,61 @@ class FlowRunner:
                         "-o",
                         file_inc_cpp,
                     ],
+                    inputs=[file_physical],
+                    outputs=[file_inc_cpp],
                 )
 
             cmd = ["clang++", "-std=c++17"]
-            if opts.host_target:
-                cmd += ["--target=" + opts.host_target]
+            if self.opts.host_target:
+                cmd += ["--target=" + self.opts.host_target]
                 if (
-                    opts.aiesim
-                    and opts.host_target
+                    self.opts.aiesim
+                    and self.opts.host_target
                     != aie.compiler.aiecc.configure.host_architecture
                 ):
-                    sys.exit(
+                    message = (
                         "Host cross-compile from "
                         + aie.compiler.aiecc.configure.host_architecture
                         + " to --target="
-                        + opts.host_target
+                        + self.opts.host_target
                         + " is not supported with --aiesim"
                     )
+                    raise self.failure(task, message)
 
             if self.opts.sysroot:
-                cmd += ["--sysroot=" + opts.sysroot]
+                cmd += ["--sysroot=" + self.opts.sysroot]
                 # In order to find the toolchain in the sysroot, we need to have
                 # a 'target' that includes 'linux' and for the 'lib/gcc/$target/$version'
                 # directory to have a corresponding 'include/gcc/$target/$version'.
                 # In some of our sysroots, it seems that we find a lib/gcc, but it
                 # doesn't have a corresponding include/gcc directory.  Instead
                 # force using '/usr/lib,include/gcc'
-                if opts.host_target == "aarch64-linux-gnu":
-                    cmd += [f"--gcc-toolchain={opts.sysroot}/usr"]
+                if self.opts.host_target == "aarch64-linux-gnu":
+                    cmd += [f"--gcc-toolchain={self.opts.sysroot}/usr"]
                     # It looks like the G++ distribution is non standard, so add
                     # an explicit handling of C++ library.
                     # Perhaps related to https://discourse.llvm.org/t/add-gcc-install-dir-deprecate-gcc-toolchain-and-remove-gcc-install-prefix/65091/23
-                    cxx_include = glob.glob(f"{opts.sysroot}/usr/include/c++/*.*.*")[0]
-                    triple = os.path.basename(opts.sysroot)
+                    cxx_include = glob.glob(
+                        f"{self.opts.sysroot}/usr/include/c++/*.*.*"
+                    )[0]
+                    triple = os.path.basename(self.opts.sysroot)
                     cmd += [f"-I{cxx_include}", f"-I{cxx_include}/{triple}"]
-                    gcc_lib = glob.glob(f"{opts.sysroot}/usr/lib/{triple}/*.*.*")[0]
+                    gcc_lib = glob.glob(f"{self.opts.sysroot}/usr/lib/{triple}/*.*.*")[
+                        0
+                    ]
                     cmd += [f"-B{gcc_lib}", f"-L{gcc_lib}"]
             install_path = aie.compiler.aiecc.configure.install_path()
 
             # Setting everything up if linking against HSA
-            if opts.link_against_hsa:
+            if self.opts.link_against_hsa:
                 cmd += ["-DHSA_RUNTIME"]
-                arch_name = opts.host_target.split("-")[0] + "-hsa"
+                arch_name = self.opts.host_target.split("-")[0] + "-hsa"
                 hsa_path = os.path.join(aie.compiler.aiecc.configure.hsa_dir)
                 hsa_include_path = os.path.join(hsa_path, "..", "..", "..", "include")
                 hsa_lib_path = os.path.join(hsa_path, "..", "..")
                 hsa_so_path = os.path.join(hsa_lib_path, "libhsa-runtime64.so")
             else:
-                arch_name = opts.host_target.split("-")[0]
+                arch_name = self.opts.host_target.split("-")[0]
 
             # Getting a pointer to the libxaie include and library
             runtime_xaiengine_path = os.path.join(
@@ -736,7 +1530,7 @@ class FlowRunner:
             )
 
             # Linking against the correct memory allocator
-            if opts.link_against_hsa:
+            if self.opts.link_against_hsa:
                 memory_allocator = os.path.join(
                     runtime_testlib_path, "libmemory_allocator_hsa.a"
                 )
@@ -749,7 +1543,7 @@ class FlowRunner:
                 memory_allocator,
                 "-I" + xaiengine_include_path,
                 "-L" + xaiengine_lib_path,
-                "-L" + os.path.join(opts.aietools_path, "lib", "lnx64.o"),
+                "-L" + os.path.join(self.opts.aietools_path, "lib", "lnx64.o"),
                 "-Wl,-R" + xaiengine_lib_path,
                 "-I" + self.tmpdirname,
                 "-fuse-ld=lld",
@@ -757,26 +1551,26 @@ class FlowRunner:
                 "-lxaiengine",
             ]
             # Linking against HSA
-            if opts.link_against_hsa:
+            if self.opts.link_against_hsa:
                 cmd += [hsa_so_path]
                 cmd += ["-I%s" % hsa_include_path]
                 cmd += ["-Wl,-rpath,%s" % hsa_lib_path]
 
             cmd += aie_target_defines(aie_target)
 
-            if len(opts.host_args) > 0:
-                await self.do_call(task, cmd + opts.host_args)
+            if len(self.opts.host_args) > 0:
+                await self.do_call(task, cmd + self.opts.host_args)
 
-            self.progress_bar.update(self.progress_bar.task_completed, advance=1)
+            self.progress_bar.update(self.progress_task_completed, advance=1)
             if task:
                 self.progress_bar.update(task, advance=0, visible=False)
 
     async def gen_sim(self, task, aie_target):
         # For simulation, we need to additionally parse the 'remaining' options to avoid things
         # which conflict with the options below (e.g. -o)
-        print(opts.host_args)
+        print(self.opts.host_args)
         host_opts = aie.compiler.aiecc.cl_arguments.strip_host_args_for_aiesim(
-            opts.host_args
+            self.opts.host_args
         )
 
         sim_dir = self.prepend_tmp("sim")
@@ -795,10 +1589,10 @@ class FlowRunner:
         install_path = aie.compiler.aiecc.configure.install_path()
 
         # Setting everything up if linking against HSA
-        if opts.link_against_hsa:
-            arch_name = opts.host_target.split("-")[0] + "-hsa"
+        if self.opts.link_against_hsa:
+            arch_name = self.opts.host_target.split("-")[0] + "-hsa"
         else:
-            arch_name = opts.host_target.split("-")[0]
+            arch_name = self.opts.host_target.split("-")[0]
 
         runtime_simlib_path = os.path.join(
             install_path, "aie_runtime_lib", aie_target.upper(), "aiesim"
@@ -838,19 +1632,21 @@ class FlowRunner:
             "-Og",
             "-Dmain(...)=ps_main(...)",
             "-I" + self.tmpdirname,
-            "-I" + opts.aietools_path + "/include",
-            "-I" + opts.aietools_path + "/include/drivers/aiengine",
-            "-I" + opts.aietools_path + "/data/osci_systemc/include",
-            "-I" + opts.aietools_path + "/include/xtlm/include",
-            "-I" + opts.aietools_path + "/include/common_cpp/common_cpp_v1_0/include",
+            "-I" + self.opts.aietools_path + "/include",
+            "-I" + self.opts.aietools_path + "/include/drivers/aiengine",
+            "-I" + self.opts.aietools_path + "/data/osci_systemc/include",
+            "-I" + self.opts.aietools_path + "/include/xtlm/include",
+            "-I"
+            + self.opts.aietools_path
+            + "/include/common_cpp/common_cpp_v1_0/include",
             "-I" + runtime_testlib_include_path,
             memory_allocator,
         ]  # clang is picky  # Pickup aie_inc.cpp
 
         # Don't use shipped version of xaiengine?
         sim_link_args = [
-            "-L" + opts.aietools_path + "/lib/lnx64.o",
-            "-L" + opts.aietools_path + "/data/osci_systemc/lib/lnx64",
+            "-L" + self.opts.aietools_path + "/lib/lnx64.o",
+            "-L" + self.opts.aietools_path + "/data/osci_systemc/lib/lnx64",
             "-Wl,--as-needed",
             "-lxioutils",
             "-lxaiengine",
@@ -871,6 +1667,8 @@ class FlowRunner:
                     "-o",
                     os.path.join(sim_reports_dir, "graph.xpe"),
                 ],
+                inputs=[file_physical],
+                outputs=[os.path.join(sim_reports_dir, "graph.xpe")],
             )
         )
         processes.append(
@@ -883,6 +1681,8 @@ class FlowRunner:
                     "-o",
                     os.path.join(sim_arch_dir, "aieshim_solution.aiesol"),
                 ],
+                inputs=[file_physical],
+                outputs=[os.path.join(sim_arch_dir, "aieshim_solution.aiesol")],
             )
         )
         processes.append(
@@ -895,6 +1695,8 @@ class FlowRunner:
                     "-o",
                     os.path.join(sim_config_dir, "scsim_config.json"),
                 ],
+                inputs=[file_physical],
+                outputs=[os.path.join(sim_config_dir, "scsim_config.json")],
             )
         )
         processes.append(
@@ -907,6 +1709,8 @@ class FlowRunner:
                     "-o",
                     os.path.join(sim_dir, "flows_physical.mlir"),
                 ],
+                inputs=[file_physical],
+                outputs=[os.path.join(sim_dir, "flows_physical.mlir")],
             )
         )
         processes.append(self.do_call(task, ["cp", sim_makefile, sim_dir]))
@@ -939,6 +1743,8 @@ class FlowRunner:
                 "-o",
                 os.path.join(sim_dir, "flows_physical.json"),
             ],
+            inputs=[os.path.join(sim_dir, "flows_physical.mlir")],
+            outputs=[os.path.join(sim_dir, "flows_physical.json")],
         )
 
         sim_script = self.prepend_tmp("aiesim.sh")
@@ -967,131 +1773,327 @@ class FlowRunner:
         print("Simulation generated...")
         print("To run simulation: " + sim_script)
 
-    async def run_flow(self):
-        nworkers = int(opts.nthreads)
+    # Run the whole flow.  A batch passes in the progress display it shares
+    # between its designs.
+    async def run_flow(self, progress_bar=None):
+        nworkers = int(self.opts.nthreads)
         if nworkers == 0:
             nworkers = os.cpu_count()
 
-        self.limit = asyncio.Semaphore(nworkers)
-        with progress.Progress(
-            *progress.Progress.get_default_columns(),
-            progress.TimeElapsedColumn(),
-            progress.MofNCompleteColumn(),
-            progress.TextColumn("{task.fields[command]}"),
-            redirect_stdout=False,
-            redirect_stderr=False,
+        if self.limit is None:
+            self.limit = PrioritySemaphore(
+                nworkers, shared=SharedSlots.from_environment()
+            )
+            if self.trace is not None:
+                self.limit.on_acquire = lambda slot, requested, granted: (
+                    self.trace.queued(current_node.get(), requested, granted, slot)
+                )
+        owns_memory = self.memory is None
+        if owns_memory:
+            self.memory = make_memory_gate(self.opts)
+        owns_executor = self.executor is None
+        if owns_executor:
+            self.executor = make_executor(
+                self.opts, nworkers, self.trace is not None or self.memory is not None
+            )
+        with (
+            contextlib.nullcontext(progress_bar)
+            if progress_bar is not None
+            else make_progress_bar()
         ) as progress_bar:
             self.progress_bar = progress_bar
-            progress_bar.task = progress_bar.add_task(
-                "[green] MLIR compilation:", total=1, command="1 Worker"
+            self.progress_task = progress_bar.add_task(
+                f"[green] {self.label}MLIR compilation:", total=1, command="1 Worker"
             )
 
+            # Logs of a previous build of the design would be mixed up with ours.
+            shutil.rmtree(self.log_dir, ignore_errors=True)
             file_with_addresses = self.prepend_tmp("input_with_addresses.mlir")
-            pass_pipeline = INPUT_WITH_ADDRESSES_PIPELINE.materialize(module=True)
-            run_passes(
-                pass_pipeline,
-                self.mlir_module_str,
-                file_with_addresses,
-                self.opts.verbose,
-            )
-
-            cores = generate_cores_list(await read_file_async(file_with_addresses))
-            t = do_run(
-                [
-                    "aie-translate",
-                    "--aie-generate-target-arch",
-                    file_with_addresses,
-                ],
-                self.opts.verbose,
-            )
-            aie_target = t.stdout.strip()
+            # The steps up to the flow graph run in this process.  Take a slot
+            # for them and keep the event loop free for concurrent flows.
+            async with self.limit:
+                self.design = await self.executor.call(
+                    self.prepare_flow, file_with_addresses
+                )
+            cores = self.design.cores
+            aie_target = self.design.target_arch
             if not re.fullmatch("AIE.?", aie_target):
                 print(
                     "Unexpected target " + aie_target + ". Exiting...",
                     file=sys.stderr,
                 )
-                exit(-3)
+                raise CompileError("Unexpected target " + aie_target, -3)
             aie_peano_target = aie_target.lower() + "-none-elf"
 
-            # Optionally generate insts.txt for IPU instruction stream
-            if opts.ipu or opts.only_ipu:
-                generated_insts_mlir = self.prepend_tmp("generated_ipu_insts.mlir")
-                await self.do_call(
-                    progress_bar.task,
-                    [
-                        "aie-opt",
-                        "--aie-dma-to-ipu",
-                        file_with_addresses,
-                        "-o",
-                        generated_insts_mlir,
-                    ],
+            self.progress_task_completed = progress_bar.add_task(
+                f"[green] {self.label}AIE Compilation:",
+                total=len(cores) + 1,
+                command="%d Workers" % nworkers,
+            )
+
+            if (
+                self.opts.in_process
+                and not self.opts.unified
+                and self.opts.execute
+                and cores
+            ):
+                self.lowering_pool = aie.compiler.aiecc.executor.ProcessPoolExecutor(
+                    max_workers=min(nworkers, len(cores)),
+                    initializer=_init_lowering_worker,
+                    initargs=(file_with_addresses,),
                 )
-                await self.do_call(
-                    progress_bar.task,
-                    [
-                        "aie-translate",
-                        "--aie-ipu-instgen",
-                        generated_insts_mlir,
-                        "-o",
-                        opts.insts_name,
-                    ],
+            try:
+                graph = self.build_flow_graph(
+                    cores, aie_target, aie_peano_target, file_with_addresses
+                )
+                await graph.run()
+                if self.manifest is not None and self.build_key is not None:
+                    self.manifest.complete(self.build_key)
+            finally:
+                if self.lowering_pool is not None:
+                    self.lowering_pool.shutdown(cancel=True)
+                    self.lowering_pool = None
+                if owns_executor:
+                    self.executor.shutdown()
+                if self.manifest is not None:
+                    self.manifest.save()
+                if owns_memory and self.memory is not None:
+                    self.memory.estimates.save()
+            progress_bar.update(self.progress_task, advance=0, visible=False)
+            if self.label:
+                progress_bar.update(self.progress_task_completed, visible=False)
+
+    # Lower the design to input_with_addresses.mlir and analyze the result.
+    # This is the only time the flow parses the design.
+    def prepare_flow(self, file_with_addresses):
+        from aie.ir import Context, Location, Module
+
+        pass_pipeline = INPUT_WITH_ADDRESSES_PIPELINE.materialize(module=True)
+        extra = [hashlib.sha256(self.mlir_module_str.encode()).hexdigest()]
+        key = self.in_process_key(pass_pipeline, [], [file_with_addresses], extra)
+        with Context(), Location.unknown():
+            if key is not None and self.up_to_date(file_with_addresses, key):
+                if self.opts.verbose:
+                    print(f"Up to date: {file_with_addresses}")
+                with open(file_with_addresses, "rb") as f:
+                    module = Module.parse(f.read())
+            else:
+                module = Module.parse(self.mlir_module_str)
+                apply_passes(
+                    pass_pipeline,
+                    module,
+                    file_with_addresses,
+                    self.opts.verbose,
+                    bytecode=bool(self.mlir_output),
+                    statistics=self.pass_statistics,
                 )
-                if opts.only_ipu:
-                    return
+                if key is not None:
+                    self.record_in_process(
+                        file_with_addresses,
+                        key,
+                        pass_pipeline,
+                        [],
+                        [file_with_addresses],
+                        extra,
+                    )
+            if self.opts.in_process:
+                # Routing starts from this module rather than from parsing
+                # input_with_addresses.mlir again.
+                self.module_with_addresses = module
+            design = aie.compiler.aiecc.design.analyze_design(module)
+        if design.target_arch is None:
+            design.target_arch = self.query_target_arch(file_with_addresses)
+        return design
+
+    # Ask aie-translate for the architecture of a device aiecc doesn't know.
+    def query_target_arch(self, file_with_addresses):
+        command = ["aie-translate", "--aie-generate-target-arch", file_with_addresses]
+        if self.opts.verbose:
+            print(" ".join(command))
+        t = subprocess.run(command, capture_output=True, text=True)
+        if t.returncode != 0:
+            sys.stderr.write(t.stderr)
+        return t.stdout.strip()
+
+    # Rough relative run times of the flow's stages, used to schedule the
+    # longest remaining path through the flow first.
+    STAGE_COSTS = {
+        "ipu": 1.0,
+        "chess_wrapper": 5.0,
+        "unified": 10.0,
+        "host": 3.0,
+        "sim": 5.0,
+        "core": 10.0,
+        "cdo": 2.0,
+        "xclbin": 2.0,
+    }
 
-            chess_intrinsic_wrapper_ll_path = await self.prepare_for_chesshack(
-                progress_bar.task, aie_target
+    # Express the flow as a graph of its stages and their data dependencies.
+    def build_flow_graph(
+        self, cores, aie_target, aie_peano_target, file_with_addresses
+    ):
+        graph = TaskGraph()
+        cost = self.STAGE_COSTS
+
+        # Optionally generate insts.txt for IPU instruction stream
+        if self.opts.ipu or self.opts.only_ipu:
+            graph.add(
+                "ipu",
+                lambda: self.process_ipu(file_with_addresses),
+                cost=cost["ipu"],
+                limit=self.limit,
             )
+            if self.opts.only_ipu:
+                return graph
 
-            # fmt: off
-            if opts.unified:
-                file_opt_with_addresses = self.prepend_tmp("input_opt_with_addresses.mlir")
-                await self.do_call(progress_bar.task, ["aie-opt", f"--pass-pipeline={AIE_LOWER_TO_LLVM()}", file_with_addresses, "-o", file_opt_with_addresses])
-
-                file_llvmir = self.prepend_tmp("input.ll")
-                await self.do_call(progress_bar.task, ["aie-translate", "--mlir-to-llvmir", file_opt_with_addresses, "-o", file_llvmir])
-
-                self.unified_file_core_obj = self.prepend_tmp("input.o")
-                if opts.compile and opts.xchesscc:
-                    file_llvmir_hacked = await self.chesshack(progress_bar.task, file_llvmir, chess_intrinsic_wrapper_ll_path)
-                    await self.do_call(progress_bar.task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_llvmir_hacked, "-o", self.unified_file_core_obj])
-                elif opts.compile:
-                    file_llvmir_opt = self.prepend_tmp("input.opt.ll")
-                    await self.do_call(progress_bar.task, [self.peano_opt_path, "--passes=default<O2>", "-inline-threshold=10", "-S", file_llvmir, "-o", file_llvmir_opt])
-                    await self.do_call(progress_bar.task, [self.peano_llc_path, file_llvmir_opt, "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", self.unified_file_core_obj])
-            # fmt: on
+        async def prepare_chess_wrapper():
+            self.chess_intrinsic_wrapper_ll_path = await self.prepare_for_chesshack(
+                self.progress_task, aie_target
+            )
 
-            progress_bar.update(progress_bar.task, advance=0, visible=False)
-            progress_bar.task_completed = progress_bar.add_task(
-                "[green] AIE Compilation:",
-                total=len(cores) + 1,
-                command="%d Workers" % nworkers,
+        core_deps = [
+            graph.add(
+                "chess_wrapper",
+                prepare_chess_wrapper,
+                cost=cost["chess_wrapper"],
+                limit=self.limit,
+            )
+        ]
+        if self.opts.unified:
+            core_deps.append(
+                graph.add(
+                    "unified",
+                    lambda: self.process_unified(aie_target, file_with_addresses),
+                    deps=core_deps,
+                    cost=cost["unified"],
+                    limit=self.limit,
+                )
             )
 
-            processes = [self.process_host_cgen(aie_target, file_with_addresses)]
-            await asyncio.gather(
-                *processes
-            )  # ensure that process_host_cgen finishes before running gen_sim
-            processes = []
-            if opts.aiesim:
-                processes.append(self.gen_sim(progress_bar.task, aie_target))
-            for core in cores:
-                processes.append(
-                    self.process_core(
-                        core,
-                        aie_target,
-                        aie_peano_target,
-                        chess_intrinsic_wrapper_ll_path,
-                        file_with_addresses,
-                    )
+        # process_host_cgen generates input_physical.mlir, which is needed by
+        # gen_sim and process_cdo.  It takes a slot of self.limit itself.
+        host = graph.add(
+            "host",
+            lambda: self.process_host_cgen(aie_target, file_with_addresses),
+            cost=cost["host"],
+        )
+        if self.opts.aiesim:
+            graph.add(
+                "sim",
+                lambda: self.gen_sim(self.progress_task, aie_target),
+                deps=[host],
+                cost=cost["sim"],
+                limit=self.limit,
+            )
+
+        # process_core takes a slot of self.limit itself.
+        core_nodes = [
+            graph.add(
+                "core_%d_%d" % core[0:2],
+                functools.partial(
+                    self.process_core_after_wrapper,
+                    core,
+                    aie_target,
+                    aie_peano_target,
+                    file_with_addresses,
+                ),
+                deps=core_deps,
+                cost=cost["core"],
+            )
+            for core in cores
+        ]
+
+        # Must have elfs, before we build the final binary assembly
+        xclbin_deps = core_nodes
+        if self.opts.cdo and self.opts.execute:
+            xclbin_deps = [
+                graph.add(
+                    "cdo",
+                    self.process_cdo,
+                    deps=[host, *core_nodes],
+                    cost=cost["cdo"],
+                    limit=self.limit,
                 )
-            await asyncio.gather(*processes)
+            ]
+        if self.opts.cdo or self.opts.xcl:
+            graph.add(
+                "xclbin",
+                lambda: self.process_xclbin_gen(bool(cores)),
+                deps=xclbin_deps,
+                cost=cost["xclbin"],
+                limit=self.limit,
+            )
+        return graph
 
-            # Must have elfs, before we build the final binary assembly
-            if opts.cdo and opts.execute:
-                await self.process_cdo()
-            if opts.cdo or opts.xcl:
-                await self.process_xclbin_gen(bool(len(cores)))
+    async def process_core_after_wrapper(
+        self, core, aie_target, aie_peano_target, file_with_addresses
+    ):
+        await self.process_core(
+            core,
+            aie_target,
+            aie_peano_target,
+            self.chess_intrinsic_wrapper_ll_path,
+            file_with_addresses,
+        )
+
+    async def process_ipu(self, file_with_addresses):
+        generated_insts_mlir = self.prepend_tmp("generated_ipu_insts.mlir")
+        await self.do_call(
+            self.progress_task,
+            [
+                "aie-opt",
+                "--aie-dma-to-ipu",
+                *self.mlir_output,
+                file_with_addresses,
+                "-o",
+                generated_insts_mlir,
+            ],
+            inputs=[file_with_addresses],
+            outputs=[generated_insts_mlir],
+        )
+        await self.do_call(
+            self.progress_task,
+            [
+                "aie-translate",
+                "--aie-ipu-instgen",
+                generated_insts_mlir,
+                "-o",
+                self.opts.insts_name,
+            ],
+            inputs=[generated_insts_mlir],
+            outputs=[self.opts.insts_name],
+        )
+
+    async def process_unified(self, aie_target, file_with_addresses):
+        task = self.progress_task
+        chess_intrinsic_wrapper_ll_path = self.chess_intrinsic_wrapper_ll_path
+        # fmt: off
+        file_opt_with_addresses = self.prepend_tmp("input_opt_with_addresses.mlir")
+        file_llvmir = self.prepend_tmp("input.ll")
+        self.unified_file_core_obj = self.prepend_tmp("input.o")
+        if self.opts.pipe and self.opts.compile:
+            # Stream the code from aie-opt to the compiler.
+            lowering = [(["aie-opt", f"--pass-pipeline={AIE_LOWER_TO_LLVM()}", *self.mlir_output, file_with_addresses], file_opt_with_addresses), (["aie-translate", "--mlir-to-llvmir", "-"], file_llvmir)]
+            if self.opts.xchesscc:
+                chess_intrinsic_wrapper_ll_path = chess_intrinsic_wrapper_ll_path or self.prepend_tmp("chess_intrinsic_wrapper.ll")
+                file_llvmir_hacked = file_llvmir + "chesslinked.ll"
+                await self.do_pipeline(task, [*lowering, (["llvm-link", "-", chess_intrinsic_wrapper_ll_path, "-S"], None)], inputs=[file_with_addresses, chess_intrinsic_wrapper_ll_path], outputs=[file_llvmir_hacked], transform=chesshack)
+                await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_llvmir_hacked, "-o", self.unified_file_core_obj], inputs=[file_llvmir_hacked], outputs=[self.unified_file_core_obj])
+            else:
+                await self.do_pipeline(task, [*lowering, ([self.peano_opt_path, "--passes=default<O2>", "-inline-threshold=10", "-S", "-"], self.prepend_tmp("input.opt.ll")), ([self.peano_llc_path, "-", "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", self.unified_file_core_obj], None)], inputs=[file_with_addresses], outputs=[self.unified_file_core_obj])
+            return
+
+        await self.do_call(task, ["aie-opt", f"--pass-pipeline={AIE_LOWER_TO_LLVM()}", *self.mlir_output, file_with_addresses, "-o", file_opt_with_addresses], inputs=[file_with_addresses], outputs=[file_opt_with_addresses])
+        await self.do_call(task, ["aie-translate", "--mlir-to-llvmir", file_opt_with_addresses, "-o", file_llvmir], inputs=[file_opt_with_addresses], outputs=[file_llvmir])
+
+        if self.opts.compile and self.opts.xchesscc:
+            file_llvmir_hacked = await self.chesshack(task, file_llvmir, chess_intrinsic_wrapper_ll_path)
+            await self.do_call(task, ["xchesscc_wrapper", aie_target.lower(), "+w", self.prepend_tmp("work"), "-c", "-d", "-f", "+P", "4", file_llvmir_hacked, "-o", self.unified_file_core_obj], inputs=[file_llvmir_hacked], outputs=[self.unified_file_core_obj])
+        elif self.opts.compile:
+            file_llvmir_opt = self.prepend_tmp("input.opt.ll")
+            await self.do_call(task, [self.peano_opt_path, "--passes=default<O2>", "-inline-threshold=10", "-S", file_llvmir, "-o", file_llvmir_opt], inputs=[file_llvmir], outputs=[file_llvmir_opt])
+            await self.do_call(task, [self.peano_llc_path, file_llvmir_opt, "-O2", "--march=" + aie_target.lower(), "--function-sections", "--filetype=obj", "-o", self.unified_file_core_obj], inputs=[file_llvmir_opt], outputs=[self.unified_file_core_obj])
+        # fmt: on
 
     def dumpprofile(self):
         sortedruntimes = sorted(
@@ -1103,20 +2105,71 @@ class FlowRunner:
                 print(f"{s1:.4f} sec: {s0}")
 
 
-def run(mlir_module, args=None):
-    global opts
-    if args is not None:
-        opts = aie.compiler.aiecc.cl_arguments.parse_args(args)
+# Probing for Vitis searches all of PATH; do it once, not on every run.
+@functools.lru_cache(maxsize=None)
+def find_vitis(search_path):
+    vpp_path = shutil.which("v++", path=search_path)
+    if not vpp_path:
+        return None
+    return os.path.dirname(os.path.dirname(os.path.realpath(vpp_path)))
+
+
+@functools.lru_cache(maxsize=None)
+def find_aietools(vitis_path):
+    aietools_path = os.path.join(vitis_path, "aietools")
+    if not os.path.exists(aietools_path):
+        aietools_path = os.path.join(vitis_path, "cardano")
+    return aietools_path
+
+
+# Add `directory` to PATH, in front of everything else if `prepend`.  PATH
+# doesn't grow when this is repeated in one process (batches, the compile
+# server, Python callers).
+def add_to_path(directory, prepend=False):
+    entries = [e for e in os.environ.get("PATH", "").split(os.pathsep) if e]
+    if prepend:
+        entries = [directory, *(e for e in entries if e != directory)]
+    elif directory not in entries:
+        entries.append(directory)
+    os.environ["PATH"] = os.pathsep.join(entries)
+
+
+# The MemoryGate that admits the commands of a build, or None if --mem-budget
+# doesn't limit them.
+def make_memory_gate(opts):
+    if not opts.execute or opts.mem_budget == "none":
+        return None
+    budget = opts.mem_budget
+    if budget == "auto":
+        budget = aie.compiler.aiecc.memory.default_budget_kb()
+        if budget is None:
+            return None
+    if opts.verbose:
+        print(f"Memory budget: {budget >> 10} MiB")
+    estimates = aie.compiler.aiecc.memory.RssEstimates(
+        opts.cache_dir or aie.compiler.aiecc.cache.default_cache_dir()
+    )
+    return aie.compiler.aiecc.memory.MemoryGate(budget, estimates)
 
+
+def make_executor(opts, nworkers, measure=False):
+    # Commands are waited for in threads when measured.  Stages such as gen_sim
+    # run several commands under a single slot.
+    kwargs = dict(measure=measure, max_waiters=2 * nworkers + 8)
+    if opts.remote_workers:
+        return aie.compiler.aiecc.executor.RemoteExecutor(opts.remote_workers, **kwargs)
+    return aie.compiler.aiecc.executor.LocalExecutor(**kwargs)
+
+
+def setup_environment(opts, quiet=False):
     if "VITIS" not in os.environ:
         # Try to find vitis in the path
-        vpp_path = shutil.which("v++")
-        if vpp_path:
-            vitis_bin_path = os.path.dirname(os.path.realpath(vpp_path))
-            vitis_path = os.path.dirname(vitis_bin_path)
+        vitis_path = find_vitis(os.environ.get("PATH", os.defpath))
+        if vitis_path:
             os.environ["VITIS"] = vitis_path
-            print("Found Vitis at " + vitis_path)
-            os.environ["PATH"] = os.pathsep.join([os.environ["PATH"], vitis_bin_path])
+            if not quiet:
+                print("Found Vitis at " + vitis_path)
+            add_to_path(os.path.join(vitis_path, "bin"))
 
     opts.aietools_path = ""
     if "VITIS" in os.environ:
@@ -1124,66 +2177,314 @@ def run(mlir_module, args=None):
         vitis_bin_path = os.path.join(vitis_path, "bin")
         # Find the aietools directory, needed by xchesscc_wrapper
 
-        opts.aietools_path = os.path.join(vitis_path, "aietools")
-        if not os.path.exists(opts.aietools_path):
-            opts.aietools_path = os.path.join(vitis_path, "cardano")
+        opts.aietools_path = find_aietools(vitis_path)
         os.environ["AIETOOLS"] = opts.aietools_path
 
-        aietools_bin_path = os.path.join(opts.aietools_path, "bin")
-        os.environ["PATH"] = os.pathsep.join(
-            [os.environ["PATH"], aietools_bin_path, vitis_bin_path]
-        )
+        add_to_path(os.path.join(opts.aietools_path, "bin"))
+        add_to_path(vitis_bin_path)
 
-    else:
+    elif not quiet:
         print("Vitis not found...")
 
     # This path should be generated from cmake
     aie_path = aie.compiler.aiecc.configure.install_path()
     peano_path = os.path.join(opts.peano_install_dir, "bin")
-    os.environ["PATH"] = os.pathsep.join([aie_path, os.environ["PATH"]])
-    os.environ["PATH"] = os.pathsep.join([peano_path, os.environ["PATH"]])
-
-    if opts.aiesim and not opts.xbridge:
-        sys.exit("AIE Simulation (--aiesim) currently requires --xbridge")
+    add_to_path(aie_path, prepend=True)
+    add_to_path(peano_path, prepend=True)
 
-    if opts.verbose:
-        sys.stderr.write(f"\ncompiling {opts.filename}\n")
 
+def tmpdir_path(opts, workdir=None):
     if opts.tmpdir:
         tmpdirname = opts.tmpdir
     elif opts.filename:
         tmpdirname = os.path.basename(opts.filename) + ".prj"
     else:
         tmpdirname = tempfile.mkdtemp()
-    tmpdirname = os.path.abspath(tmpdirname)
+    return os.path.abspath(os.path.join(workdir or os.getcwd(), tmpdirname))
+
+
+def make_tmpdir(opts, workdir=None):
+    tmpdirname = tmpdir_path(opts, workdir)
 
     try:
-        os.mkdir(tmpdirname)
+        os.makedirs(tmpdirname)
     except FileExistsError:
         pass
     if opts.verbose:
         print("created temporary directory", tmpdirname)
+    return tmpdirname
 
-    runner = FlowRunner(str(mlir_module), opts, tmpdirname)
-    asyncio.run(runner.run_flow())
 
+def report_run(runner):
+    opts = runner.opts
     if opts.profiling:
         runner.dumpprofile()
+        trace_file = os.path.join(runner.tmpdirname, "trace.json")
+        runner.trace.write(trace_file)
+        print(f"Build timeline written to {trace_file}")
+        if runner.pass_statistics:
+            statistics_file = os.path.join(runner.tmpdirname, "pass_statistics.json")
+            with open(statistics_file, "w") as f:
+                json.dump({"pipelines": runner.pass_statistics}, f, indent=2)
+            print(f"Pass statistics written to {statistics_file}")
+
+    if opts.history and runner.stage_times:
+        record_history(runner)
+
+    if opts.verbose and runner.manifest is not None:
+        print(f"{runner.manifest.up_to_date_count} stages up to date")
+    if opts.verbose and runner.cache is not None:
+        print(
+            f"Artifact cache {runner.cache.root}: "
+            f"{runner.cache.hits} hits, {runner.cache.misses} misses"
+        )
+
+
+def history_design_name(opts):
+    return os.path.basename(opts.filename) if opts.filename else "<module>"
+
+
+# Append the stage times of `runner` to the compile-time history and warn about
+# the stages that got slower.
+def record_history(runner):
+    import sqlite3
+    import aie.compiler.aiecc.history
+
+    opts = runner.opts
+    design = runner.label[: -len(": ")] or history_design_name(opts)
+    timings = {
+        stage: (aie.compiler.aiecc.history.tool_version(sorted(tools)), s, n)
+        for stage, (tools, s, n) in runner.stage_times.items()
+    }
+    try:
+        with aie.compiler.aiecc.history.CompileHistory(
+            opts.cache_dir or aie.compiler.aiecc.cache.default_cache_dir()
+        ) as history:
+            history.record(design, timings)
+            regressions = history.regressions(design, list(timings), recent=1)
+    except (OSError, sqlite3.Error) as e:
+        # The history is only informative, don't fail the build over it.
+        if opts.verbose:
+            print(f"Could not update the compile-time history: {e}")
+        return
+    for c in regressions:
+        print(f"warning: {aie.compiler.aiecc.history.describe(c)}", file=sys.stderr)
+
+
+def profile_report(opts):
+    import aie.compiler.aiecc.history
+
+    with aie.compiler.aiecc.history.CompileHistory(
+        opts.cache_dir or aie.compiler.aiecc.cache.default_cache_dir()
+    ) as history:
+        designs = [history_design_name(opts)] if opts.filename else None
+        aie.compiler.aiecc.history.print_report(history, designs)
+
+
+# Key of compiling design file `opts.filename` with `opts` in the current
+# environment (see setup_environment), for --incremental builds.  It is computed
+# from the file itself, before it is parsed, so that an up to date build can be
+# detected without loading MLIR.
+def design_build_key(opts, workdir=None):
+    if not opts.incremental or not opts.execute or opts.profiling:
+        return None
+    h = hashlib.sha256()
+    h.update(aie.compiler.aiecc.cache.tool_fingerprint(__file__).encode())
+    h.update(os.path.abspath(workdir or os.getcwd()).encode())
+    h.update(json.dumps(vars(opts), sort_keys=True, default=str).encode())
+    try:
+        h.update(aie.compiler.aiecc.cache.file_digest(opts.filename).encode())
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+# Whether the build `build_key` completed and compiling it again would do
+# nothing at all.
+def build_up_to_date(opts, build_key, workdir=None):
+    if build_key is None:
+        return False
+    manifest = aie.compiler.aiecc.manifest.BuildManifest(tmpdir_path(opts, workdir))
+    return manifest.up_to_date_build(build_key)
+
+
+def compile_module(mlir_module, opts, build_key=None):
+    if opts.aiesim and not opts.xbridge:
+        sys.exit("AIE Simulation (--aiesim) currently requires --xbridge")
+
+    if opts.verbose:
+        sys.stderr.write(f"\ncompiling {opts.filename}\n")
+
+    tmpdirname = make_tmpdir(opts)
+
+    runner = FlowRunner(str(mlir_module), opts, tmpdirname, build_key=build_key)
+    try:
+        asyncio.run(runner.run_flow())
+    except CompileError as e:
+        sys.exit(e.returncode)
+
+    report_run(runner)
+
+
+def run(mlir_module, args=None):
+    global opts
+    if args is not None:
+        opts = aie.compiler.aiecc.cl_arguments.parse_args(args)
+
+    setup_environment(opts)
+    compile_module(mlir_module, opts)
+
+
+def parse_design(filename):
+    from aie.ir import Context, Location, Module
+
+    with Context() as ctx, Location.unknown():
+        with open(filename, "r") as f:
+            module = Module.parse(f.read())
+        return str(module)
+
+
+# Compile one design of a batch; returns (status, message).
+async def compile_design(
+    design, args, batch_opts, limit, progress_bar, memory=None, executor=None
+):
+    # Everything this design does is one group of the shared limit.
+    current_group.set(design.name)
+    loop = asyncio.get_running_loop()
+    if design.generate:
+        async with limit:
+            if batch_opts.verbose:
+                print(" ".join(design.generate) + " > " + design.file)
+            os.makedirs(os.path.dirname(design.file), exist_ok=True)
+            with open(design.file, "w") as f:
+                proc = await asyncio.create_subprocess_exec(
+                    *design.generate, cwd=design.generate_cwd, stdout=f
+                )
+                await proc.wait()
+            if proc.returncode != 0:
+                return "FAILED", f"generator exited with {proc.returncode}"
+
+    opts = aie.compiler.aiecc.cl_arguments.parse_args(
+        [*args, *design.args, design.file]
+    )
+    opts.aietools_path = batch_opts.aietools_path
+    if opts.aiesim and not opts.xbridge:
+        return "FAILED", "AIE Simulation (--aiesim) currently requires --xbridge"
+    if batch_opts.tmpdir:
+        # Designs must not share a temporary directory.
+        opts.tmpdir = os.path.join(os.path.abspath(batch_opts.tmpdir), design.name)
+    build_key = design_build_key(opts, design.workdir)
+    if build_up_to_date(opts, build_key, design.workdir):
+        return "ok", "up to date"
+    try:
+        async with limit:
+            module_str = await loop.run_in_executor(None, parse_design, design.file)
+    except Exception as e:
+        return "FAILED", str(e)
+
+    os.makedirs(design.workdir, exist_ok=True)
+    runner = FlowRunner(
+        module_str,
+        opts,
+        make_tmpdir(opts, design.workdir),
+        workdir=design.workdir,
+        limit=limit,
+        name=design.name,
+        build_key=build_key,
+        memory=memory,
+        executor=executor,
+    )
+    try:
+        await runner.run_flow(progress_bar)
+    except CompileError as e:
+        return "FAILED", str(e)
+    except Exception as e:
+        # Keep going with the rest of the batch.
+        traceback.print_exc()
+        return "FAILED", f"{type(e).__name__}: {e}"
+    report_run(runner)
+    return "ok", ""
+
+
+async def compile_batch(designs, args, batch_opts):
+    nworkers = int(batch_opts.nthreads)
+    if nworkers == 0:
+        nworkers = os.cpu_count()
+    limit = PrioritySemaphore(nworkers, shared=SharedSlots.from_environment())
+    memory = make_memory_gate(batch_opts)
+    executor = make_executor(
+        batch_opts, nworkers, batch_opts.profiling or memory is not None
+    )
+
+    async def timed(design):
+        start = time.time()
+        status, message = await compile_design(
+            design, args, batch_opts, limit, progress_bar, memory, executor
+        )
+        return design, status, time.time() - start, message
+
+    try:
+        with make_progress_bar() as progress_bar:
+            return await asyncio.gather(*(timed(d) for d in designs))
+    finally:
+        executor.shutdown()
+        if memory is not None:
+            memory.estimates.save()
+
+
+def run_batch(spec_file, args=()):
+    """Compile every design of batch specification `spec_file`.
+
+    `args` are aiecc options common to all designs.  Tools of all designs run
+    under a single -j budget which is shared fairly between the designs.
+    """
+    args = list(args)
+    batch_opts = aie.compiler.aiecc.cl_arguments.parse_args(args)
+    try:
+        designs = aie.compiler.aiecc.batch.load_batch(spec_file)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"error: invalid batch specification {spec_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    setup_environment(batch_opts)
+    results = asyncio.run(compile_batch(designs, args, batch_opts))
+
+    failed = [r for r in results if r[1] != "ok"]
+    print(
+        f"Batch {spec_file}: {len(results)} designs, "
+        f"{len(results) - len(failed)} succeeded, {len(failed)} failed"
+    )
+    width = max((len(d.name) for d in designs), default=0)
+    for design, status, seconds, message in results:
+        line = f"  {status:<6}  {design.name:<{width}}  {seconds:8.3f} sec"
+        print(line + (f": {message}" if message else ""))
+    if failed:
+        sys.exit(1)
 
 
 def main():
     global opts
     opts = aie.compiler.aiecc.cl_arguments.parse_args()
+    if opts.profile_report:
+        profile_report(opts)
+        return
+    if opts.batch:
+        run_batch(opts.batch, aie.compiler.aiecc.batch.strip_batch_args(sys.argv[1:]))
+        return
     if opts.filename is None:
         print("error: the 'file' positional argument is required.")
         sys.exit(1)
 
+    setup_environment(opts)
+    build_key = design_build_key(opts)
+    if build_up_to_date(opts, build_key):
+        if opts.verbose:
+            print(f"Up to date: {opts.filename}")
+        return
+
     try:
-        with Context() as ctx, Location.unknown():
-            with open(opts.filename, "r") as f:
-                module = Module.parse(f.read())
-            module_str = str(module)
+        module_str = parse_design(opts.filename)
     except Exception as e:
         print(e)
         sys.exit(1)
-    run(module_str)
+    compile_module(module_str, opts, build_key)
@@ -0,0 +1,172 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Build manifest for incremental aiecc builds.
+
+The manifest lives in the build (.prj) directory and records, for every stage
+that ran, the key of its command line and inputs (see cache.command_key), the
+digests of its inputs and the size/mtime of the outputs it left behind.  A
+stage whose key is unchanged and whose outputs haven't been touched since is
+up to date and does not need to run again, as in ninja.
+
+Each stage also keeps the arguments its key was computed from, so the whole
+build can be checked without the design or MLIR: once a build has completed
+with a given configuration (see complete()), up_to_date_build() tells whether
+running it again would do anything at all.
+"""
+
+import json
+import os
+
+import aie.compiler.aiecc.cache
+
+# Bump this whenever the format of the manifest changes.
+MANIFEST_FORMAT_VERSION = 2
+
+
+def _output_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildManifest:
+    FILENAME = ".aiecc_manifest.json"
+
+    def __init__(self, build_dir):
+        self.path = os.path.join(build_dir, self.FILENAME)
+        self.stages = dict()
+        self.up_to_date_count = 0
+        # Key of the last build that completed, and of the one being run if
+        # it completes.
+        self.build = None
+        self.completed = None
+        # Stages that are part of the build being run.
+        self.touched = set()
+        try:
+            with open(self.path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_FORMAT_VERSION:
+                self.stages = manifest["stages"]
+                self.build = manifest.get("build")
+        except (OSError, ValueError, KeyError):
+            # A missing or corrupt manifest just means a full rebuild.
+            pass
+
+    def up_to_date(self, name, key):
+        """Whether stage `name` last ran with `key` and its outputs are intact."""
+        stage = self.stages.get(name)
+        if stage is None or stage["key"] != key:
+            return False
+        if not all(_output_stat(p) == s for p, s in stage["outputs"].items()):
+            return False
+        self.up_to_date_count += 1
+        self.touched.add(name)
+        return True
+
+    def record(
+        self,
+        name,
+        key,
+        command,
+        inputs,
+        outputs,
+        extra=(),
+        cwd=None,
+        produced=None,
+        scratch=(),
+    ):
+        """Record that stage `name` ran.
+
+        `command`, `inputs`, `outputs`, `extra`, `cwd` and `scratch` are what
+        `key` was computed from (see cache.command_key).  `produced` lists the files the
+        stage wrote if they are not known in advance, and defaults to `outputs`.
+        """
+        cwd = cwd or os.getcwd()
+        produced = [os.path.join(cwd, p) for p in (produced or outputs)]
+        self.stages[name] = {
+            "command": list(command),
+            "key": key,
+            "key_args": {
+                "inputs": list(inputs),
+                "outputs": list(outputs),
+                "extra": [str(e) for e in extra],
+                "cwd": cwd,
+                "scratch": list(scratch),
+            },
+            "inputs": {
+                os.path.join(cwd, p): aie.compiler.aiecc.cache.file_digest(
+                    os.path.join(cwd, p)
+                )
+                for p in inputs
+            },
+            "outputs": {p: _output_stat(p) for p in produced},
+        }
+        self.touched.add(name)
+
+    def refresh(self, name):
+        """Re-stat the outputs of `name` after they were rewritten in place."""
+        stage = self.stages.get(name)
+        if stage is not None:
+            stage["outputs"] = {p: _output_stat(p) for p in stage["outputs"]}
+
+    def invalidate(self, name):
+        self.stages.pop(name, None)
+
+    def complete(self, build_key):
+        """Mark the build being run, configured as `build_key`, as complete.
+
+        Stages of earlier builds that weren't part of this one are forgotten.
+        """
+        self.stages = {n: s for n, s in self.stages.items() if n in self.touched}
+        self.completed = build_key
+
+    def up_to_date_build(self, build_key):
+        """Whether the last build completed as `build_key` and is up to date.
+
+        Every stage is checked as up_to_date() would, recomputing its key from
+        its recorded arguments: changed inputs or tools are noticed as well.
+        """
+        if build_key is None or self.build != build_key or not self.stages:
+            return False
+        for stage in self.stages.values():
+            if not all(_output_stat(p) == s for p, s in stage["outputs"].items()):
+                return False
+        for stage in self.stages.values():
+            args = stage["key_args"]
+            try:
+                key = aie.compiler.aiecc.cache.command_key(
+                    stage["command"],
+                    args["inputs"],
+                    args["outputs"],
+                    args["extra"],
+                    args["cwd"],
+                    args.get("scratch", ()),
+                )
+            except OSError:
+                return False
+            if key != stage["key"]:
+                return False
+        return True
+
+    def save(self):
+        # Write a private file and rename it into place so that an interrupted
+        # build never leaves a truncated manifest behind.
+        staging = self.path + ".tmp"
+        with open(staging, "w") as f:
+            json.dump(
+                {
+                    "version": MANIFEST_FORMAT_VERSION,
+                    "build": self.completed,
+                    "stages": self.stages,
+                },
+                f,
+                indent=1,
+            )
+        os.replace(staging, self.path)
@@ -0,0 +1,230 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Memory-aware admission of aiecc's tool invocations.
+
+The -j budget counts processes, but the tools differ a lot in how much memory
+they need: a few concurrent xchesscc runs can exhaust a build container that
+easily holds a dozen llc runs.  With aiecc --mem-budget, every command
+therefore reserves an estimate of its peak RSS from a memory budget (with
+'auto', what the cgroup and /proc/meminfo say is available) on top of its
+worker slot, and only starts once that fits.  The estimates are learned from the peak RSS of previous runs of the
+same tool and action, and persist in the cache directory.
+"""
+
+import asyncio
+import collections
+import contextlib
+import itertools
+import json
+import os
+
+import aie.compiler.aiecc.profiling
+from aie.compiler.aiecc.scheduler import current_priority
+
+# Peak RSS in kilobytes assumed for tools that haven't been seen yet.
+DEFAULT_ESTIMATES_KB = {
+    "xchesscc_wrapper": 2 << 20,
+    "aie-opt": 512 << 10,
+    "aie-translate": 512 << 10,
+    "clang": 512 << 10,
+    "llc": 512 << 10,
+    "opt": 512 << 10,
+    "llvm-link": 256 << 10,
+    "bootgen": 256 << 10,
+    "xclbinutil": 256 << 10,
+}
+DEFAULT_ESTIMATE_KB = 1 << 20
+
+# Fraction of the available memory the budget leaves to everything else.
+HEADROOM = 0.1
+
+# Estimates are the largest of this many recent observations.
+SAMPLES = 8
+
+# Limits at least this large mean "unlimited" in cgroup v1.
+_UNLIMITED = 1 << 60
+
+
+def _read_int(path):
+    try:
+        with open(path, "r") as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _mem_available_kb():
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+# Memory left under the limits of the cgroups (v2, or v1) of this process and
+# their ancestors, in kilobytes.
+def _cgroup_available_kb():
+    available = []
+    try:
+        with open("/proc/self/cgroup", "r") as f:
+            cgroups = [line.strip().split(":", 2) for line in f]
+    except OSError:
+        cgroups = []
+    for _, controllers, path in cgroups:
+        if controllers == "":
+            root, limit_file, usage_file = (
+                "/sys/fs/cgroup",
+                "memory.max",
+                "memory.current",
+            )
+        elif "memory" in controllers.split(","):
+            root = "/sys/fs/cgroup/memory"
+            limit_file, usage_file = "memory.limit_in_bytes", "memory.usage_in_bytes"
+        else:
+            continue
+        directory = os.path.join(root, path.lstrip("/"))
+        while directory.startswith(root):
+            limit = _read_int(os.path.join(directory, limit_file))
+            usage = _read_int(os.path.join(directory, usage_file))
+            if limit is not None and limit < _UNLIMITED and usage is not None:
+                available.append(max(limit - usage, 0) // 1024)
+            if directory == root:
+                break
+            directory = os.path.dirname(directory)
+    return min(available, default=None)
+
+
+def available_memory_kb():
+    """Memory available to this process and its children, in kilobytes."""
+    available = [
+        a for a in (_mem_available_kb(), _cgroup_available_kb()) if a is not None
+    ]
+    return min(available, default=None)
+
+
+def default_budget_kb():
+    available = available_memory_kb()
+    if available is None:
+        return None
+    return int(available * (1 - HEADROOM))
+
+
+class RssEstimates:
+    """Peak RSS of tools in previous runs, keyed like profiling.stage_of()."""
+
+    FILENAME = "rss_estimates.json"
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, self.FILENAME)
+        self.samples = self._load()
+        self.observed = collections.defaultdict(list)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                samples = json.load(f)
+            return {k: [int(s) for s in v] for k, v in samples.items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return dict()
+
+    def estimate(self, command):
+        samples = self.samples.get(aie.compiler.aiecc.profiling.stage_of(command))
+        if samples:
+            return max(samples)
+        return DEFAULT_ESTIMATES_KB.get(
+            os.path.basename(command[0]), DEFAULT_ESTIMATE_KB
+        )
+
+    def observe(self, command, rss_kb):
+        stage = aie.compiler.aiecc.profiling.stage_of(command)
+        samples = self.samples.setdefault(stage, [])
+        samples.append(rss_kb)
+        del samples[:-SAMPLES]
+        self.observed[stage].append(rss_kb)
+
+    def save(self):
+        if not self.observed:
+            return
+        # Other builds may have saved their observations since we loaded.
+        samples = self._load()
+        for stage, observed in self.observed.items():
+            samples[stage] = (samples.get(stage, []) + observed)[-SAMPLES:]
+        staging = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(staging, "w") as f:
+                json.dump(samples, f, indent=1)
+            os.replace(staging, self.path)
+        except OSError:
+            # The estimates are only a hint, don't fail the build over them.
+            pass
+        self.observed.clear()
+
+
+class MemoryGate:
+    """Admits commands while their estimated peak RSS fits in `budget_kb`.
+
+    Waiting commands are admitted in the order of the critical path priority
+    of their TaskGraph node, and a command is always admitted when nothing else
+    is running, however much memory it is estimated to need.
+    """
+
+    def __init__(self, budget_kb, estimates):
+        self.budget_kb = budget_kb
+        self.estimates = estimates
+        self.reserved_kb = 0
+        self.running = 0
+        # (priority, arrival, kilobytes, future) of every waiting command.
+        self._waiters = []
+        self._counter = itertools.count()
+
+    def _fits(self, kb):
+        return self.running == 0 or self.reserved_kb + kb <= self.budget_kb
+
+    def _wake(self):
+        self._waiters = [w for w in self._waiters if not w[3].done()]
+        self._waiters.sort(key=lambda w: (-w[0], w[1]))
+        # Strictly in order, so that big jobs are not starved by small ones.
+        while self._waiters and self._fits(self._waiters[0][2]):
+            _, _, kb, future = self._waiters.pop(0)
+            self.reserved_kb += kb
+            self.running += 1
+            future.set_result(None)
+
+    async def acquire(self, kb):
+        if not self._waiters and self._fits(kb):
+            self.reserved_kb += kb
+            self.running += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((current_priority.get(), next(self._counter), kb, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(kb)
+            raise
+
+    def release(self, kb):
+        self.reserved_kb -= kb
+        self.running -= 1
+        self._wake()
+
+    @contextlib.asynccontextmanager
+    async def admit(self, *commands):
+        """Reserve the estimated memory of `commands`, which run together."""
+        kb = sum(self.estimates.estimate(command) for command in commands)
+        await self.acquire(kb)
+        try:
+            yield
+        finally:
+            self.release(kb)
@@ -0,0 +1,141 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Build timeline recording for aiecc --profile.
+
+The timeline is written in the Chrome trace-event format, which can be opened
+with chrome://tracing or https://ui.perfetto.dev.  Every worker slot of the -j
+budget gets its own lane; every command is a span on the lane of the slot it
+ran in.
+"""
+
+import contextvars
+import json
+import os
+import subprocess
+import time
+
+# (col, row) of the core whose processing the current asyncio task is doing.
+current_core = contextvars.ContextVar("aiecc_current_core", default=None)
+
+# Lane of spans recorded outside of any worker slot.
+UNSCHEDULED_LANE = -1
+
+
+# The tool and, for the MLIR tools, the action it is asked to perform.
+def stage_of(command):
+    tool = os.path.basename(command[0])
+    if tool in ("aie-opt", "aie-translate"):
+        for arg in command[1:]:
+            if arg.startswith("--"):
+                return f"{tool} {arg.split('=')[0]}"
+    return tool
+
+
+def run_with_rusage(command, **kwargs):
+    """Run `command` to completion; returns its exit code and resource usage.
+
+    This blocks, so call it from a worker thread.  Unlike asyncio's child
+    watcher, reaping the child with wait4 gives us its own CPU time and peak
+    RSS rather than the aggregate of all children.
+    """
+    return wait_with_rusage(subprocess.Popen(command, **kwargs))
+
+
+def wait_with_rusage(proc):
+    """Reap Popen `proc`; returns its exit code and resource usage."""
+    _, status, rusage = os.wait4(proc.pid, 0)
+    # Let Popen know the child has been reaped.
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, rusage
+
+
+class TraceRecorder:
+    def __init__(self):
+        self.origin = time.time()
+        self.events = []
+        self.lanes = set()
+
+    def _us(self, t):
+        return int((t - self.origin) * 1e6)
+
+    def command(self, command, start, end, slot=None, rusage=None, **args):
+        lane = UNSCHEDULED_LANE if slot is None else slot
+        self.lanes.add(lane)
+        core = current_core.get()
+        args = dict(args, command=" ".join(command))
+        if core is not None:
+            args["core"] = "(%d, %d)" % core
+        if rusage is not None:
+            args["cpu_user_s"] = rusage.ru_utime
+            args["cpu_sys_s"] = rusage.ru_stime
+            # ru_maxrss is in kilobytes on Linux.
+            args["max_rss_kb"] = rusage.ru_maxrss
+        name = stage_of(command)
+        if core is not None:
+            name += " (%d, %d)" % core
+        self.events.append(
+            {
+                "name": name,
+                "cat": stage_of(command),
+                "ph": "X",
+                "ts": self._us(start),
+                "dur": max(self._us(end) - self._us(start), 1),
+                "pid": 0,
+                "tid": lane,
+                "args": args,
+            }
+        )
+
+    def queued(self, name, start, end, slot):
+        """Record how long `name` waited for worker slot `slot`."""
+        if end - start <= 0:
+            return
+        self.events.append(
+            {
+                "name": f"queued: {name}",
+                "cat": "queue",
+                "ph": "X",
+                "ts": self._us(start),
+                "dur": max(self._us(end) - self._us(start), 1),
+                "pid": 1,
+                "tid": name,
+                "args": {"slot": slot, "wait_s": end - start},
+            }
+        )
+
+    def write(self, path):
+        metadata = [
+            {"ph": "M", "name": "process_name", "pid": 0, "args": {"name": "workers"}},
+            {
+                "ph": "M",
+                "name": "process_name",
+                "pid": 1,
+                "args": {"name": "admission queue"},
+            },
+        ]
+        for lane in sorted(self.lanes):
+            metadata.append(
+                {
+                    "ph": "M",
+                    "name": "thread_name",
+                    "pid": 0,
+                    "tid": lane,
+                    "args": {
+                        "name": (
+                            "unscheduled"
+                            if lane == UNSCHEDULED_LANE
+                            else f"worker {lane}"
+                        )
+                    },
+                }
+            )
+        with open(path, "w") as f:
+            json.dump(
+                {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"},
+                f,
+            )
@@ -0,0 +1,240 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Dependency-graph scheduling of the aiecc flow.
+
+The flow is described as a TaskGraph: every node is a coroutine that may only
+start once the nodes it depends on have finished.  Nodes that run tools take a
+slot of a PrioritySemaphore sized to the -j budget.  Waiting nodes are admitted
+longest remaining critical path first, so the work that gates the end of the
+build is never stuck behind work that doesn't.  When several flows share one
+semaphore (aiecc --batch), slots are shared fairly between them first.  Flows
+in different processes (the requests of the compile server) are kept within a
+common budget by SharedSlots.
+"""
+
+import asyncio
+import collections
+import contextvars
+import fcntl
+import heapq
+import itertools
+import os
+import time
+
+# Priority of the graph node the current asyncio task is running.
+current_priority = contextvars.ContextVar("aiecc_node_priority", default=0.0)
+# Name of the graph node the current asyncio task is running.
+current_node = contextvars.ContextVar("aiecc_node", default=None)
+# Index of the PrioritySemaphore slot held by the current asyncio task.
+current_slot = contextvars.ContextVar("aiecc_slot", default=None)
+# The flow (e.g. design of a batch) the current asyncio task works for.
+current_group = contextvars.ContextVar("aiecc_group", default=None)
+
+
+class SharedSlots:
+    """Slots shared between processes, e.g. the requests of the compile server.
+
+    Every slot is a lock file in `directory`, held with flock() by the process
+    using it.  A process that dies gives its slots back with its locks, so
+    killed requests can't leak them.  The directory is passed to aiecc in
+    $AIECC_SHARED_SLOTS.
+    """
+
+    ENV = "AIECC_SHARED_SLOTS"
+    # Seconds between attempts to take a slot while all are held.
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.endswith(".slot")
+        )
+
+    @classmethod
+    def create(cls, directory, count):
+        for i in range(count):
+            open(os.path.join(directory, f"{i}.slot"), "w").close()
+        return cls(directory)
+
+    @classmethod
+    def from_environment(cls):
+        directory = os.getenv(cls.ENV)
+        return cls(directory) if directory else None
+
+    def try_acquire(self):
+        """A descriptor holding a free slot, or None if all are held."""
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    async def acquire(self):
+        while (fd := self.try_acquire()) is None:
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return fd
+
+    def release(self, fd):
+        os.close(fd)
+
+
+class PrioritySemaphore:
+    """An asyncio semaphore whose waiters are woken highest priority first.
+
+    The priority of a waiter is the critical path priority of the TaskGraph
+    node it belongs to, unless one is passed explicitly to acquire().  Before
+    priorities are compared, a freed slot goes to a waiter of the group (see
+    `current_group`) that holds the fewest slots, so that concurrent flows
+    get an equal share.
+
+    Every slot has an index, which the holder can read from `current_slot`.
+    If set, `on_acquire(slot, requested, granted)` is called whenever a slot
+    is handed out, with the times it was asked for and granted.
+
+    With `shared` SharedSlots, the holder of a slot also holds one of those.
+    """
+
+    def __init__(self, value, shared=None):
+        self.shared = shared
+        # Descriptor of the shared slot held with each of ours.
+        self._shared_fds = dict()
+        self._free = list(range(value))
+        # (priority, arrival, group, future) of every waiting task.
+        self._waiters = []
+        # Ties are broken first come, first served.
+        self._counter = itertools.count()
+        self._held = collections.Counter()
+        self._slot_group = dict()
+        self.on_acquire = None
+
+    def locked(self):
+        return not self._free
+
+    def _grant(self, slot, group):
+        self._held[group] += 1
+        self._slot_group[slot] = group
+
+    async def acquire(self, priority=None):
+        if priority is None:
+            priority = current_priority.get()
+        group = current_group.get()
+        requested = time.time()
+        if self._free and not self._waiters:
+            slot = heapq.heappop(self._free)
+            self._grant(slot, group)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append((priority, next(self._counter), group, future))
+            try:
+                slot = await future
+            except asyncio.CancelledError:
+                # The slot may have been handed over right before cancellation.
+                if future.done() and not future.cancelled():
+                    self.release(future.result())
+                raise
+        if self.shared is not None:
+            try:
+                self._shared_fds[slot] = await self.shared.acquire()
+            except asyncio.CancelledError:
+                self.release(slot)
+                raise
+        current_slot.set(slot)
+        if self.on_acquire is not None:
+            self.on_acquire(slot, requested, time.time())
+        return True
+
+    def release(self, slot=None):
+        if slot is None:
+            slot = current_slot.get()
+            current_slot.set(None)
+        if slot in self._shared_fds:
+            self.shared.release(self._shared_fds.pop(slot))
+        self._held[self._slot_group.pop(slot)] -= 1
+        self._waiters = [w for w in self._waiters if not w[3].done()]
+        if not self._waiters:
+            heapq.heappush(self._free, slot)
+            return
+        waiter = min(self._waiters, key=lambda w: (self._held[w[2]], -w[0], w[1]))
+        self._waiters.remove(waiter)
+        # Hand the slot over directly.
+        self._grant(slot, waiter[2])
+        waiter[3].set_result(slot)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class TaskGraph:
+    def __init__(self):
+        self.nodes = dict()
+
+    def add(self, name, fn, deps=(), cost=1.0, limit=None):
+        """Add node `name` running coroutine function `fn` after `deps`.
+
+        `cost` is a rough estimate of the node's run time, used to compute
+        critical path priorities.  If `limit` is given, the node holds one of
+        its slots while it runs.
+        """
+        assert name not in self.nodes, f"duplicate task {name}"
+        for dep in deps:
+            assert dep in self.nodes, f"unknown dependency {dep} of {name}"
+        self.nodes[name] = (fn, list(deps), cost, limit)
+        return name
+
+    def priorities(self):
+        """Cost of the longest path from each node to the end of the flow."""
+        successors = {name: [] for name in self.nodes}
+        for name, (_, deps, _, _) in self.nodes.items():
+            for dep in deps:
+                successors[dep].append(name)
+        priority = dict()
+        # Nodes can only depend on nodes added before them, so walking them
+        # in reverse insertion order visits successors first.
+        for name in reversed(list(self.nodes)):
+            cost = self.nodes[name][2]
+            priority[name] = cost + max(
+                (priority[s] for s in successors[name]), default=0.0
+            )
+        return priority
+
+    async def run(self):
+        priority = self.priorities()
+        tasks = dict()
+
+        async def run_node(name):
+            fn, deps, _, limit = self.nodes[name]
+            if deps:
+                await asyncio.gather(*(tasks[d] for d in deps))
+            current_priority.set(priority[name])
+            current_node.set(name)
+            if limit is None:
+                return await fn()
+            async with limit:
+                return await fn()
+
+        # Start the nodes on the critical path first so that equal-priority
+        # ties in the semaphore also favour them.
+        for name in sorted(self.nodes, key=lambda n: -priority[n]):
+            tasks[name] = asyncio.ensure_future(run_node(name))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            # Don't leave the rest of a failed flow running.
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return {name: task.result() for name, task in tasks.items()}
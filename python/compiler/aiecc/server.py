@@ -0,0 +1,240 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+aiecc compile server.
+
+The server imports aiecc (and with it rich, aiofiles and the aie dialects) once
+and then listens on a Unix socket.  Every request is served by a child forked
+from that warm process, so it starts compiling right away.  The tools of all
+requests run within one budget of slots (see scheduler.SharedSlots), on top
+of each request's own -j.  The client sends its command line, working
+directory, environment and stdin/stdout/stderr over the socket and exits with
+the status of the compilation, so running it is indistinguishable from running
+aiecc.py.  A request whose client goes away is interrupted like aiecc.py is by
+Ctrl-C.
+
+This module must stay cheap to import: the client is meant to be thin.
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import traceback
+
+# Message header: length of the JSON request; reply: exit status.
+_LENGTH = struct.Struct("!I")
+_STATUS = struct.Struct("!i")
+
+
+def default_socket_path():
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.getenv(
+        "AIECC_SERVER_SOCKET",
+        os.path.join(runtime_dir, f"aiecc-{os.getuid()}.sock"),
+    )
+
+
+def _recv_exactly(conn, n):
+    data = b""
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by peer")
+        data += chunk
+    return data
+
+
+def _exit_status(e):
+    # Mirror what the interpreter does with an uncaught SystemExit.
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+# The client sends nothing once the request is in, so anything to read on
+# `conn` means it has gone away: interrupt the request.
+def _interrupt_on_disconnect(conn):
+    select.select([conn], [], [])
+    try:
+        gone = not conn.recv(1, socket.MSG_PEEK)
+    except OSError:
+        gone = True
+    if gone:
+        os.kill(os.getpid(), signal.SIGINT)
+
+
+def _serve_request(conn, entry, slots_dir):
+    header, fds, _, _ = socket.recv_fds(conn, _LENGTH.size, 3)
+    if len(header) < _LENGTH.size:
+        header += _recv_exactly(conn, _LENGTH.size - len(header))
+    (length,) = _LENGTH.unpack(header)
+    request = json.loads(_recv_exactly(conn, length))
+
+    for fd, target in zip(fds, (0, 1, 2)):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.chdir(request["cwd"])
+    os.environ.clear()
+    os.environ.update(request["env"])
+    # See scheduler.SharedSlots.
+    os.environ["AIECC_SHARED_SLOTS"] = slots_dir
+    sys.argv = request["argv"]
+    threading.Thread(target=_interrupt_on_disconnect, args=(conn,), daemon=True).start()
+
+    try:
+        entry()
+        status = 0
+    except SystemExit as e:
+        status = _exit_status(e)
+    except KeyboardInterrupt:
+        status = 130
+    except BaseException:
+        traceback.print_exc()
+        status = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn.sendall(_STATUS.pack(status))
+
+
+def serve(socket_path=None, max_requests=None, entry=None, jobs=None):
+    """Serve compile requests on `socket_path` until interrupted.
+
+    At most `max_requests` requests are compiled at a time; further clients
+    wait in the listen queue.  Together they run at most `jobs` tools at a
+    time.  `entry` is what a request runs, aiecc's main() by default.
+    """
+    if entry is None:
+        import aie.compiler.aiecc.main
+        from aie.ir import Context, Location, Module
+
+        entry = aie.compiler.aiecc.main.main
+        # Load and register the dialects now rather than in every request.
+        # The context must not leave threads behind across fork().
+        with Context() as ctx, Location.unknown():
+            ctx.enable_multithreading(False)
+            Module.parse("module {}")
+
+    socket_path = socket_path or default_socket_path()
+    max_requests = max_requests or os.cpu_count()
+    from aie.compiler.aiecc.scheduler import SharedSlots
+
+    slots_dir = tempfile.TemporaryDirectory(prefix="aiecc-server-")
+    SharedSlots.create(slots_dir.name, jobs or os.cpu_count())
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(socket_path)
+    sock.listen()
+
+    # Clean up the socket when terminated, too.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    children = set()
+    try:
+        while True:
+            # Reap finished requests, blocking while at capacity.
+            while children:
+                flags = 0 if len(children) >= max_requests else os.WNOHANG
+                pid, _ = os.waitpid(-1, flags)
+                if pid == 0:
+                    break
+                children.discard(pid)
+            # Wake up periodically to reap children while idle.
+            if not select.select([sock], [], [], 0.1 if children else None)[0]:
+                continue
+            conn, _ = sock.accept()
+            pid = os.fork()
+            if pid == 0:
+                status = 1
+                try:
+                    # Interrupted requests clean up like aiecc.py on Ctrl-C.
+                    signal.signal(signal.SIGINT, signal.default_int_handler)
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    sock.close()
+                    _serve_request(conn, entry, slots_dir.name)
+                    status = 0
+                finally:
+                    os._exit(status)
+            children.add(pid)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        os.unlink(socket_path)
+        slots_dir.cleanup()
+
+
+def client_main(socket_path=None, fallback=None):
+    """Run aiecc with the current command line on the server.
+
+    Behaves like aiecc's main(): output goes to this process's stdout/stderr
+    and it exits with the status of the compilation.  If no server is
+    listening, `fallback` is run instead (aiecc's main() by default).
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or default_socket_path())
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        if fallback is None:
+            from aie.compiler.aiecc.main import main as fallback
+        return fallback()
+
+    request = json.dumps(
+        {"argv": sys.argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+    ).encode()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with sock:
+        socket.send_fds(sock, [_LENGTH.pack(len(request)) + request], [0, 1, 2])
+        try:
+            (status,) = _STATUS.unpack(_recv_exactly(sock, _STATUS.size))
+        except ConnectionError:
+            print("aiecc server terminated the request", file=sys.stderr)
+            status = 1
+    sys.exit(status)
+
+
+def serve_main():
+    parser = argparse.ArgumentParser(
+        description="Serve aiecc compile requests from a warm process."
+    )
+    parser.add_argument(
+        "--socket",
+        dest="socket_path",
+        default=default_socket_path(),
+        help="Unix socket to listen on (default is $AIECC_SERVER_SOCKET or $XDG_RUNTIME_DIR/aiecc-<uid>.sock)",
+    )
+    parser.add_argument(
+        "-j",
+        dest="max_requests",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of requests compiled concurrently (default is the number of CPUs)",
+    )
+    parser.add_argument(
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of tools run at a time by all requests together (default is the number of CPUs)",
+    )
+    args = parser.parse_args()
+    print(f"aiecc server listening on {args.socket_path}", file=sys.stderr)
+    serve(args.socket_path, args.max_requests, jobs=args.jobs)
@@ -0,0 +1,243 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Reference aiecc worker for aiecc --remote-worker.
+
+The worker listens on a TCP port and runs the commands aiecc sends it, at most
+-j at a time, each in a scratch directory of its own that holds the command's
+inputs; see executor.py for the protocol.  It runs whatever a client that
+knows its token asks it to.  The token is taken from $AIECC_WORKER_TOKEN, a
+random one is generated and printed if that isn't set; aiecc needs the same
+token in its environment.
+
+Example usage:
+$ export AIECC_WORKER_TOKEN=$(openssl rand -hex 32)
+$ aiecc-worker.py --host 0.0.0.0 --port 7700 -j 32
+$ aiecc.py --remote-worker buildhost:7700 -j 32 design.mlir
+"""
+
+import argparse
+import hmac
+import json
+import os
+import secrets
+import select
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+
+from aie.compiler.aiecc.executor import (
+    HEADER_LENGTH,
+    MAX_HEADER_LENGTH,
+    PROTOCOL_VERSION,
+    SANDBOX,
+    TOKEN_ENV,
+    encode_header,
+    kill_group,
+)
+from aie.compiler.aiecc.profiling import wait_with_rusage
+
+
+def _read_header(rfile):
+    data = rfile.read(HEADER_LENGTH.size)
+    if len(data) < HEADER_LENGTH.size:
+        raise ConnectionError("connection closed by peer")
+    (length,) = HEADER_LENGTH.unpack(data)
+    if length > MAX_HEADER_LENGTH:
+        raise ValueError(f"header of {length} bytes is too long")
+    return json.loads(rfile.read(length))
+
+
+# Resolve a path of the request inside the scratch directory `root`.
+def _sandboxed(root, path):
+    resolved = os.path.normpath(os.path.join(root, path))
+    if os.path.isabs(path) or not resolved.startswith(root + os.sep):
+        raise ValueError(f"path outside of the scratch directory: {path}")
+    return resolved
+
+
+# The client sends nothing once the inputs are in, so anything to read on
+# `conn` means it has gone away, and with it the need for the tool.
+def _kill_on_disconnect(conn, proc, done):
+    while not done.is_set():
+        readable, _, _ = select.select([conn], [], [], 0.2)
+        if not readable:
+            continue
+        try:
+            gone = not conn.recv(1, socket.MSG_PEEK)
+        except OSError:
+            gone = True
+        if gone:
+            kill_group(proc.pid)
+        return
+
+
+def _failure(message):
+    return {
+        "returncode": 1,
+        "stdout": "",
+        "stderr": message + "\n",
+        "rusage": {"ru_utime": 0.0, "ru_stime": 0.0, "ru_maxrss": 0},
+        "outputs": [],
+    }
+
+
+def run_request(request, conn, rfile, root, slots):
+    """Run `request` in the scratch directory `root`; returns the reply header
+    and the paths of the outputs to send back.  The contents of the inputs are
+    read from `rfile`, the tool is killed if connection `conn` is closed."""
+    if request.get("version") != PROTOCOL_VERSION:
+        return _failure(f"unsupported protocol version {request.get('version')}"), []
+
+    for path, size, mode in request["inputs"]:
+        target = _sandboxed(root, path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            remaining = size
+            while remaining:
+                chunk = rfile.read(min(remaining, 1 << 20))
+                if not chunk:
+                    raise ConnectionError("connection closed by peer")
+                f.write(chunk)
+                remaining -= len(chunk)
+        os.chmod(target, mode)
+    for path in [request["cwd"], *request["directories"]]:
+        os.makedirs(_sandboxed(root, path), exist_ok=True)
+    for path in request["outputs"]:
+        os.makedirs(os.path.dirname(_sandboxed(root, path)), exist_ok=True)
+
+    command = [arg.replace(SANDBOX, root) for arg in request["command"]]
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        with slots:
+            try:
+                proc = subprocess.Popen(
+                    command,
+                    cwd=_sandboxed(root, request["cwd"]),
+                    stdin=subprocess.DEVNULL,
+                    stdout=out,
+                    stderr=err,
+                    start_new_session=True,
+                )
+            except OSError as e:
+                return _failure(f"{command[0]}: {e.strerror}"), []
+            done = threading.Event()
+            watcher = threading.Thread(
+                target=_kill_on_disconnect, args=(conn, proc, done), daemon=True
+            )
+            watcher.start()
+            try:
+                returncode, rusage = wait_with_rusage(proc)
+            finally:
+                done.set()
+                watcher.join()
+        out.seek(0)
+        err.seek(0)
+        # Paths in the tool's messages are the client's paths.
+        stdout, stderr = (
+            f.read().decode(errors="replace").replace(root, SANDBOX) for f in (out, err)
+        )
+
+    outputs = [p for p in request["outputs"] if os.path.isfile(_sandboxed(root, p))]
+    reply = {
+        "returncode": returncode,
+        "stdout": stdout,
+        "stderr": stderr,
+        "rusage": {
+            "ru_utime": rusage.ru_utime,
+            "ru_stime": rusage.ru_stime,
+            "ru_maxrss": rusage.ru_maxrss,
+        },
+        "outputs": [[p, os.path.getsize(_sandboxed(root, p))] for p in outputs],
+    }
+    return reply, [_sandboxed(root, p) for p in outputs]
+
+
+class WorkerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = _read_header(self.rfile)
+            if not self.server.authenticate(request):
+                self.wfile.write(encode_header({"error": "invalid token"}))
+                print(
+                    f"aiecc worker: {self.client_address}: invalid token",
+                    file=sys.stderr,
+                )
+                return
+            with tempfile.TemporaryDirectory(prefix="aiecc-worker-") as root:
+                root = os.path.realpath(root)
+                try:
+                    reply, files = run_request(
+                        request, self.connection, self.rfile, root, self.server.slots
+                    )
+                except (ValueError, KeyError, TypeError) as e:
+                    reply, files = _failure(f"invalid request: {e}"), []
+                self.wfile.write(encode_header(reply))
+                for path in files:
+                    with open(path, "rb") as f:
+                        self.wfile.write(f.read())
+        except (ConnectionError, ValueError) as e:
+            print(f"aiecc worker: {self.client_address}: {e}", file=sys.stderr)
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, jobs, token):
+        if not token:
+            raise ValueError("the worker needs a token")
+        super().__init__(address, WorkerHandler)
+        self.slots = threading.BoundedSemaphore(jobs)
+        self.token = token.encode()
+
+    def authenticate(self, request):
+        token = request.get("token") if isinstance(request, dict) else None
+        if not isinstance(token, str):
+            return False
+        return hmac.compare_digest(token.encode(), self.token)
+
+
+def worker_main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="aiecc-worker.py",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default is 127.0.0.1, use 0.0.0.0 for all)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=0,
+        help="Port to listen on (default is any free port)",
+    )
+    parser.add_argument(
+        "-j",
+        dest="jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="Run at most this many commands at a time (default is the number of CPUs)",
+    )
+    opts = parser.parse_args(args)
+
+    token = os.getenv(TOKEN_ENV)
+    if not token:
+        token = secrets.token_hex(32)
+        print(f"{TOKEN_ENV}={token}", flush=True)
+    with WorkerServer((opts.host, opts.port), opts.jobs, token) as server:
+        host, port = server.server_address[:2]
+        print(f"aiecc worker listening on {host}:{port}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
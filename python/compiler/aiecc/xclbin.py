@@ -0,0 +1,84 @@
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Reproducible xclbin packaging.
+
+xclbinutil stamps every xclbin with the time and a random UUID, and the PDI
+UUID in aie_partition.json used to be random too, so two builds of the same
+design never produced the same bytes.  Here the UUIDs are derived from the
+contents instead: the PDI UUID from the files bootgen makes the PDI from, the
+xclbin UUID from the xclbin itself.  Unchanged designs then package to
+identical xclbins, which artifact stores can deduplicate and the runtime
+doesn't need to register again.
+"""
+
+import hashlib
+import os
+import re
+import struct
+import uuid
+
+from aie.compiler.aiecc.cache import file_digest
+
+# Offsets of the fields of struct axlf (see xclbin.h in XRT) that xclbinutil
+# fills with the time or random values.
+MAGIC = b"xclbin2\0"
+UNIQUE_ID_OFFSET = 296
+TIMESTAMP_OFFSET = 312
+UUID_OFFSET = 416
+UUID_LENGTH = 16
+
+_U64 = struct.Struct("<Q")
+
+
+def content_uuid(*parts):
+    """A UUID (version 8, custom) that is a hash of `parts`."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    digest = bytearray(h.digest()[:16])
+    digest[6] = (digest[6] & 0x0F) | 0x80
+    digest[8] = (digest[8] & 0x3F) | 0x80
+    return str(uuid.UUID(bytes=bytes(digest)))
+
+
+def pdi_uuid(bif):
+    """UUID of the PDI bootgen makes from BIF text `bif`: a hash of the
+    contents of the files it names, so that it changes when the PDI does."""
+    parts = [re.sub(r"file=\S*/", "file=", bif)]
+    for path in re.findall(r"file=(\S+)", bif):
+        try:
+            parts.append(file_digest(path))
+        except OSError:
+            parts.append("missing")
+    return content_uuid(*parts)
+
+
+def make_deterministic(path, timestamp=None):
+    """Replace the build time and the random IDs xclbinutil put in xclbin
+    `path` with `timestamp` (by default $SOURCE_DATE_EPOCH, or 0) and a hash
+    of the rest of the file."""
+    if timestamp is None:
+        timestamp = int(os.getenv("SOURCE_DATE_EPOCH", "0"))
+    with open(path, "r+b") as f:
+        data = bytearray(f.read())
+        if not data.startswith(MAGIC) or len(data) < UUID_OFFSET + UUID_LENGTH:
+            raise ValueError(f"{path} is not an xclbin")
+        uuid_field = slice(UUID_OFFSET, UUID_OFFSET + UUID_LENGTH)
+        _U64.pack_into(data, UNIQUE_ID_OFFSET, 0)
+        _U64.pack_into(data, TIMESTAMP_OFFSET, 0)
+        data[uuid_field] = bytes(UUID_LENGTH)
+        xclbin_uuid = uuid.UUID(content_uuid(bytes(data)))
+        data[uuid_field] = xclbin_uuid.bytes
+        _U64.pack_into(
+            data, UNIQUE_ID_OFFSET, int.from_bytes(xclbin_uuid.bytes[:8], "little")
+        )
+        _U64.pack_into(data, TIMESTAMP_OFFSET, timestamp)
+        f.seek(0)
+        f.write(data)
+    return str(xclbin_uuid)
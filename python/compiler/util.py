@@ -4,9 +4,13 @@
 #
 # (c) Copyright 2024 AMD Inc.
 
+import concurrent.futures
 import contextlib
+import functools
 import hashlib
+import io
 import json
+import multiprocessing
 import os
 from pathlib import Path
 import re
@@ -22,9 +26,11 @@ from .aiecc.main import (
     emit_design_bif,
     emit_design_kernel_json,
     emit_partition,
-    generate_cores_list,
     mem_topology,
 )
+from .aiecc.cache import ArtifactCache, command_key
+from .aiecc.design import analyze_design
+from .aiecc.xclbin import make_deterministic, pdi_uuid
 from .._mlir_libs._mlir.ir import _GlobalDebug
 from ..dialects.aie import (
     aie_llvm_link,
@@ -33,11 +39,12 @@ from ..dialects.aie import (
     translate_aie_vec_to_cpp,
     translate_mlir_to_llvmir,
 )
-from ..extras.runtime.passes import Pipeline, run_pipeline
+from ..extras.runtime.passes import Pipeline, run_pipelines
 
 # this is inside the aie-python-extras (shared) namespace package
 from ..extras.util import find_ops
-from ..ir import Context, Module
+from ..ir import Context, Location, Module
+from ..passmanager import PassManager
 
 VITIS_DIR = Path(os.getenv("VITIS_DIR", "/opt/tools/Xilinx/Vitis/2023.2")).absolute()
 XRT_DIR = Path(os.getenv("XRT_DIR", "/opt/xilinx/xrt")).absolute()
@@ -93,6 +100,16 @@ XCHESS_ARGS = lambda workdir: [
     str(workdir),
 ]
 
+# Number of cores compile_with_vectorization/compile_without_vectorization
+# compile at a time, unless they are given `workers`.  With more than one, the
+# cores are compiled in spawned worker processes, which import the caller's
+# __main__ again: scripts need an `if __name__ == "__main__":` guard.
+COMPILE_WORKERS = int(os.getenv("AIE_COMPILE_WORKERS", "1"))
+
+# Whether xchesscc's outputs are kept in (and restored from) aiecc's artifact
+# cache, see _xchesscc.
+XCHESS_CACHE = os.getenv("AIE_XCHESS_CACHE", "1") != "0"
+
 # https://github.com/amd/xdna-driver/blob/d8ff9afc5c202c2bee22e6d36d1fc24dcdb6ea71/src/shim/ipu/hwctx.cpp#L58
 os.environ["XRT_HACK_UNSECURE_LOADING_XCLBIN"] = "1"
 
@@ -116,6 +133,37 @@ def _run_command(cmd, workdir, *, debug=False):
         print(stderr)
 
 
+@functools.lru_cache(maxsize=None)
+def _artifact_cache():
+    return ArtifactCache()
+
+
+def _xchesscc(args, workdir, inputs, outputs, *, debug=False):
+    """Run xchesscc with `args` in `workdir`, unless the cache has `outputs`
+    of the same command on `inputs` with the same aietools, in which case they
+    are restored into `workdir`."""
+    if not XCHESS_CACHE:
+        _run_command([*XCHESS_ARGS(workdir), *args], workdir, debug=debug)
+        return
+    cache = _artifact_cache()
+    # The same work done in another workdir has the same key.
+    key = command_key(
+        [*XCHESS_ARGS(workdir), *args],
+        inputs,
+        outputs,
+        extra=[AIETOOLS_DIR],
+        cwd=workdir,
+        scratch=[str(workdir)],
+    )
+    outputs = [os.path.join(workdir, output) for output in outputs]
+    if cache.fetch(key, outputs):
+        if debug:
+            print(f"using cached {', '.join(map(os.path.basename, outputs))}")
+        return
+    _run_command([*XCHESS_ARGS(workdir), *args], workdir, debug=debug)
+    cache.store(key, outputs)
+
+
 def aie_llvm_link_with_chess_intrinsic_wrapper(input_ll):
     return chesshack(aie_llvm_link([input_ll, _CHESS_INTRINSIC_WRAPPER_LL]))
 
@@ -137,14 +185,19 @@ def chess_compile(input_ll, workdir, output_filename="input", debug=False):
         f.write(input_ll)
 
     # chess compile
-    cmd = [
-        *XCHESS_ARGS(workdir),
+    args = [
         "-c",  # compile/assemble only, do not link
         f"{output_filename}.ll",
         "-o",
         f"{output_filename}.o",
     ]
-    _run_command(cmd, workdir, debug=debug)
+    _xchesscc(
+        args,
+        workdir,
+        [f"{output_filename}.ll"],
+        [f"{output_filename}.o"],
+        debug=debug,
+    )
 
 
 def chess_compile_cpp_to_ll(cpp, workdir, prefix="aievec", debug=False):
@@ -155,8 +208,7 @@ def chess_compile_cpp_to_ll(cpp, workdir, prefix="aievec", debug=False):
         temp_xchess_input.flush()
 
         output_path = temp_xchess_input.name + ".ll"
-        cmd = [
-            *XCHESS_ARGS(workdir),
+        args = [
             "-c",
             "-f",
             "+f",  # only run LLVM frontend (emits IR)
@@ -166,7 +218,7 @@ def chess_compile_cpp_to_ll(cpp, workdir, prefix="aievec", debug=False):
             "-o",
             output_path,
         ]
-        _run_command(cmd, workdir, debug=debug)
+        _xchesscc(args, workdir, [temp_xchess_input.name], [output_path], debug=debug)
     with open(output_path, "r") as temp_xchess_output:
         aievec_ll = temp_xchess_output.read()
     return aievec_ll
@@ -228,8 +280,7 @@ def make_core_elf(core_bcf, workdir, object_filename="input", debug=False):
     with open(workdir / f"{core_name}.bcf", "w") as f:
         f.write(core_bcf)
 
-    cmd = [
-        *XCHESS_ARGS(workdir),
+    args = [
         f"{object_filename}.o",
         *input_files,
         "+l",  # linker configuration file
@@ -237,7 +288,9 @@ def make_core_elf(core_bcf, workdir, object_filename="input", debug=False):
         "-o",
         f"{core_name}.elf",
     ]
-    _run_command(cmd, workdir, debug=debug)
+    inputs = [f"{object_filename}.o", f"{core_name}.bcf"]
+    inputs += [f for f in input_files if os.path.isfile(workdir / f)]
+    _xchesscc(args, workdir, inputs, [f"{core_name}.elf"], debug=debug)
 
 
 def make_design_pdi(workdir, *, enable_cores=True, debug=False):
@@ -262,9 +315,15 @@ def make_xclbin(
 ):
     with open(workdir / "mem_topology.json", "w") as f:
         json.dump(mem_topology, f, indent=2)
+    # Name the PDI after what make_design_pdi made it from, if it did.
+    uuid = None
+    if (workdir / "design.bif").exists():
+        uuid = pdi_uuid((workdir / "design.bif").read_text())
     with open(workdir / "aie_partition.json", "w") as f:
         json.dump(
-            emit_partition(str(module), start_columns=start_columns),
+            emit_partition(
+                analyze_design(module), start_columns=start_columns, pdi_uuid=uuid
+            ),
             f,
             indent=2,
         )
@@ -286,6 +345,7 @@ def make_xclbin(
         xclbin_path,
     ]
     _run_command(cmd, workdir, debug=debug)
+    make_deterministic(xclbin_path)
     return xclbin_path
 
 
@@ -296,6 +356,116 @@ def _global_debug(debug):
     _GlobalDebug.flag = False
 
 
+# The design the cores are compiled from, in the process compiling them: every
+# worker process parses the design once and lowers each core it is handed on
+# a clone of that module.  Compiled serially, this is the caller's module.
+_core_worker_context = None
+_core_worker_module = None
+
+
+def _init_core_worker(input_with_addresses):
+    global _core_worker_context, _core_worker_module
+    _core_worker_context = Context()
+    # Parallelism comes from the pool, don't oversubscribe the machine.
+    _core_worker_context.enable_multithreading(False)
+    with _core_worker_context, Location.unknown():
+        _core_worker_module = Module.parse(input_with_addresses)
+
+
+def _compile_core(col, row, *, workdir, aievec_ll=None, debug=False):
+    # Everything the core prints is returned, so that the logs of cores
+    # compiled at the same time don't interleave.
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log), _core_worker_context, Location.unknown():
+            core_bcf = generate_bcf(_core_worker_module.operation, col, row)
+            core_mod = _core_worker_module.operation.clone(ip=False)
+            pm = PassManager.parse(str(AIE_LOWER_TO_LLVM(col, row)))
+            if debug:
+                pm.enable_ir_printing()
+            pm.run(core_mod.operation)
+            core_input_ll = translate_mlir_to_llvmir(core_mod.operation)
+            if aievec_ll is None:
+                core_ll = aie_llvm_link_with_chess_intrinsic_wrapper(core_input_ll)
+            else:
+                core_ll = chess_llvm_link(
+                    [chesshack(core_input_ll), aievec_ll, _CHESS_INTRINSIC_WRAPPER_LL],
+                    workdir,
+                    prefix=f"core_{col}_{row}_chess_llvm_link_output",
+                    input_prefixes=[
+                        f"core_{col}_{row}_aie_input",
+                        f"core_{col}_{row}_aievec_input",
+                        f"core_{col}_{row}_chess_intrinsic_wrapper",
+                    ],
+                    debug=debug,
+                )
+            chess_compile(
+                core_ll, workdir, output_filename=f"core_{col}_{row}", debug=debug
+            )
+            make_core_elf(
+                core_bcf, workdir, object_filename=f"core_{col}_{row}", debug=debug
+            )
+    except Exception as e:
+        raise Exception(
+            f"compiling core {col} {row} failed:\n{log.getvalue()}{e}"
+        ) from e
+    return log.getvalue()
+
+
+def _compile_cores(
+    cores, input_with_addresses, workers, compile_core=_compile_core, **kwargs
+):
+    """Compile `cores` of the design `input_with_addresses` to ELFs with
+    `compile_core`, in `workers` processes or, by default, in this one; their
+    logs are printed in the order of `cores`."""
+    global _core_worker_context, _core_worker_module
+    if workers is None:
+        workers = COMPILE_WORKERS
+    workers = min(workers, len(cores))
+    cols = [col for col, _, _ in cores]
+    rows = [row for _, row, _ in cores]
+    compile_core = functools.partial(compile_core, **kwargs)
+    pool = None
+    if workers <= 1:
+        _core_worker_context = input_with_addresses.context
+        _core_worker_module = input_with_addresses
+        logs = map(compile_core, cols, rows)
+    else:
+        # Spawned rather than forked: this process owns MLIR contexts (and
+        # their thread pools) which must not be duplicated.
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_core_worker,
+            initargs=(str(input_with_addresses),),
+        )
+        logs = pool.map(compile_core, cols, rows)
+    try:
+        for col, row, log in zip(cols, rows, logs):
+            print(f"compiling core {col} {row}")
+            print(log, end="")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        else:
+            _core_worker_context = _core_worker_module = None
+
+
+def _lower_design(module, pipeline, debug):
+    """Lower `module` with `pipeline` to the input_with_addresses of its cores
+    and, routed after that like aiecc does, to the input_physical of its CDO.
+    The lowering runs once, only the routing is done on a clone."""
+    lowered = run_pipelines(
+        module,
+        {
+            "input_with_addresses": pipeline,
+            "input_physical": pipeline + CREATE_PATH_FINDER_FLOWS,
+        },
+        enable_ir_printing=debug,
+    )
+    return lowered["input_with_addresses"], lowered["input_physical"]
+
+
 def compile_with_vectorization(
     mod_aie,
     mod_aievec,
@@ -306,12 +476,13 @@ def compile_with_vectorization(
     cdo_debug=False,
     partition_start_col=1,
     enable_cores=True,
+    workers=None,
 ):
     debug = debug or xaie_debug or cdo_debug
-    input_with_addresses = run_pipeline(
+    input_with_addresses, input_physical = _lower_design(
         mod_aie,
         Pipeline().convert_linalg_to_affine_loops() + INPUT_WITH_ADDRESSES_PIPELINE,
-        enable_ir_printing=debug,
+        debug,
     )
 
     aievec_cpp = translate_aie_vec_to_cpp(mod_aievec.operation, aieml=True)
@@ -325,55 +496,16 @@ def compile_with_vectorization(
             aievec_ll, workdir, output_filename=f"{kernel.sym_name.value}", debug=debug
         )
 
-    for col, row, _ in generate_cores_list(str(mod_aie)):
-        print(f"compiling core {col} {row}")
-        with Context():
-            core_mod = Module.parse(str(input_with_addresses))
-            core_bcf = generate_bcf(core_mod.operation, col, row)
-            core_lowered_to_llvm_dialect = run_pipeline(
-                core_mod, AIE_LOWER_TO_LLVM(col, row), enable_ir_printing=debug
-            )
-            core_input_ll = translate_mlir_to_llvmir(
-                core_lowered_to_llvm_dialect.operation
-            )
-            # TODO(max) connect each core to its own kernel...
-            if kernel:
-                chess_compile(
-                    aie_llvm_link_with_chess_intrinsic_wrapper(core_input_ll),
-                    workdir,
-                    output_filename=f"core_{col}_{row}",
-                    debug=debug,
-                )
-            else:
-                fullylinked_ll = chess_llvm_link(
-                    [chesshack(core_input_ll), aievec_ll, _CHESS_INTRINSIC_WRAPPER_LL],
-                    workdir,
-                    prefix=f"core_{col}_{row}_chess_llvm_link_output",
-                    input_prefixes=[
-                        f"core_{col}_{row}_aie_input",
-                        f"core_{col}_{row}_aievec_input",
-                        f"core_{col}_{row}_chess_intrinsic_wrapper",
-                    ],
-                    debug=debug,
-                )
-
-                chess_compile(
-                    fullylinked_ll,
-                    workdir,
-                    output_filename=f"core_{col}_{row}",
-                    debug=debug,
-                )
-        make_core_elf(
-            core_bcf, workdir, object_filename=f"core_{col}_{row}", debug=debug
-        )
-
-    input_physical = run_pipeline(
-        mod_aie,
-        CREATE_PATH_FINDER_FLOWS
-        + Pipeline().convert_linalg_to_affine_loops()
-        + INPUT_WITH_ADDRESSES_PIPELINE,
-        enable_ir_printing=debug,
+    _compile_cores(
+        analyze_design(input_with_addresses).cores,
+        input_with_addresses,
+        workers,
+        workdir=workdir,
+        # TODO(max) connect each core to its own kernel...
+        aievec_ll=None if kernel else aievec_ll,
+        debug=debug,
     )
+
     with _global_debug(debug):
         generate_cdo(
             input_physical.operation,
@@ -396,44 +528,25 @@ def compile_without_vectorization(
     cdo_debug=False,
     partition_start_col=1,
     enable_cores=True,
+    workers=None,
 ):
     debug = debug or xaie_debug or cdo_debug
-    module = run_pipeline(module, Pipeline().canonicalize())
-    lowered_linalg = run_pipeline(
+    input_with_addresses, input_physical = _lower_design(
         module,
-        Pipeline().convert_linalg_to_loops().fold_memref_alias_ops(),
-        enable_ir_printing=debug,
-    )
-    input_with_addresses = run_pipeline(
-        lowered_linalg, INPUT_WITH_ADDRESSES_PIPELINE, enable_ir_printing=debug
+        Pipeline().canonicalize()
+        + Pipeline().convert_linalg_to_loops().fold_memref_alias_ops()
+        + INPUT_WITH_ADDRESSES_PIPELINE,
+        debug,
     )
 
-    for col, row, _ in generate_cores_list(str(module)):
-        print(f"compiling core {col} {row}")
-        with Context():
-            core_mod = Module.parse(str(input_with_addresses))
-            core_bcf = generate_bcf(core_mod.operation, col, row)
-            core_lowered_to_llvm_dialect = run_pipeline(
-                core_mod, AIE_LOWER_TO_LLVM(col, row), enable_ir_printing=debug
-            )
-            core_input_ll = translate_mlir_to_llvmir(
-                core_lowered_to_llvm_dialect.operation
-            )
-            chess_compile(
-                aie_llvm_link_with_chess_intrinsic_wrapper(core_input_ll),
-                workdir,
-                output_filename=f"core_{col}_{row}",
-                debug=debug,
-            )
-        make_core_elf(
-            core_bcf, workdir, object_filename=f"core_{col}_{row}", debug=debug
-        )
-
-    input_physical = run_pipeline(
-        module,
-        CREATE_PATH_FINDER_FLOWS + INPUT_WITH_ADDRESSES_PIPELINE,
-        enable_ir_printing=debug,
+    _compile_cores(
+        analyze_design(input_with_addresses).cores,
+        input_with_addresses,
+        workers,
+        workdir=workdir,
+        debug=debug,
     )
+
     with _global_debug(debug):
         generate_cdo(
             input_physical.operation,
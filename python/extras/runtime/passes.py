@@ -1,14 +1,16 @@
+import itertools
 import logging
 import os
 import sys
 import tempfile
+import time
+from collections import Counter
 from contextlib import ExitStack
 from io import StringIO
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
-from ..context import disable_multithreading
-from ...ir import Module, StringAttr
-from ...passmanager import PassManager
+# The MLIR bindings are imported where they are used: building a Pipeline
+# should not require loading them (aiecc's startup depends on it).
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,8 @@ class MlirCompilerError(Exception):
 
 
 def get_module_name_for_debug_dump(module):
+    from ...ir import StringAttr
+
     if "debug_module_name" not in module.operation.attributes:
         return "UnnammedModule"
     return StringAttr(module.operation.attributes["debug_module_name"]).value
@@ -30,12 +34,48 @@ def run_pipeline(
     enable_ir_printing=False,
     print_pipeline=False,
     verify=True,
+    copy: Optional[str] = "parse",
+    pass_statistics: Optional[list] = None,
+    keep_input=False,
 ):
-    module = Module.parse(str(module))
+    """Runs `pipeline` on `module`, with a nice repro report if it fails.
+
+    `copy` says what the pipeline runs on:
+      "parse"  a copy printed and parsed again (in a context of its own if
+               `module` is text), returned as a Module;
+      "clone"  a clone of `module`, which is much cheaper;
+      None     `module` itself, in place.
+    A clone has no Module, so with "clone" and None the module the pipeline
+    ran on is returned as the OpView of its builtin.module op, which has
+    `.operation`, `.body` and `.context` like a Module.  In place, the repro
+    report of a failure shows the module as the pipeline left it, unless
+    `keep_input` asks for a clone of it to be kept until the pipeline is done.
+    If `pass_statistics` is a list, the passes run one at a time and their
+    profile_passes() records are appended to it.
+    """
+    from ..context import disable_multithreading
+    from ...ir import Module
+    from ...passmanager import PassManager
+
+    # Registers ModuleOp, the OpView a clone is returned as.
+    from ...dialects import builtin as _builtin
+
+    if copy == "parse":
+        # The input stays untouched, the report is made from it.
+        source = module
+        module = Module.parse(str(module))
+    elif copy == "clone":
+        source = module
+        # ip=False: don't insert the clone at the current insertion point.
+        module = module.operation.clone(ip=False)
+    elif copy is None:
+        # Only a clone survives the pipeline failing halfway.
+        source = module.operation.clone(ip=False) if keep_input else module
+    else:
+        raise ValueError(f"unknown copy mode {copy!r}")
 
     if isinstance(pipeline, Pipeline):
         pipeline = str(pipeline)
-    """Runs `pipeline` on `module`, with a nice repro report if it fails."""
     module_name = get_module_name_for_debug_dump(module)
     try:
         original_stderr = sys.stderr
@@ -43,21 +83,32 @@ def run_pipeline(
         # Lower module in place to make it ready for compiler backends.
         with ExitStack() as stack:
             stack.enter_context(module.context)
-            asm_for_error_report = module.operation.get_asm(
-                large_elements_limit=10,
-                enable_debug_info=True,
-            )
-            pm = PassManager.parse(pipeline)
-            pm.enable_verifier(verify)
-            if print_pipeline:
-                print(pm)
             if enable_ir_printing:
                 stack.enter_context(disable_multithreading())
-                pm.enable_ir_printing()
-
-            pm.run(module.operation)
+            if pass_statistics is not None:
+                pass_statistics.extend(
+                    profile_passes(
+                        module, pipeline, verify, enable_ir_printing, print_pipeline
+                    )
+                )
+            else:
+                pm = PassManager.parse(pipeline)
+                pm.enable_verifier(verify)
+                if print_pipeline:
+                    print(pm)
+                if enable_ir_printing:
+                    pm.enable_ir_printing()
+
+                pm.run(module.operation)
     except Exception as e:
         print(e, file=sys.stderr)
+        if isinstance(source, str):
+            asm_for_error_report = source
+        else:
+            asm_for_error_report = source.operation.get_asm(
+                large_elements_limit=10,
+                enable_debug_info=True,
+            )
         filename = os.path.join(tempfile.gettempdir(), module_name + ".mlir")
         with open(filename, "w") as f:
             f.write(asm_for_error_report)
@@ -79,7 +130,192 @@ def run_pipeline(
     finally:
         sys.stderr = original_stderr
 
-    return module
+    if copy == "parse":
+        return module
+    return module.operation.opview
+
+
+def _split_top_level(text):
+    """Split `text` at the commas that aren't nested in (), {} or []."""
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in "({[":
+            depth += 1
+        elif c in ")}]":
+            depth -= 1
+        elif c == "," and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return [p for p in parts if p]
+
+
+def _anchor(entry):
+    """The op name `entry` nests a pipeline under, or None for a pass.  Pass
+    options are in braces, so the first "(" or "{" tells them apart."""
+    paren, brace = entry.find("("), entry.find("{")
+    if paren < 0 or 0 <= brace < paren or not entry.endswith(")"):
+        return None
+    return entry[:paren]
+
+
+def split_pipeline(pipeline: Union[str, "Pipeline"]) -> List[str]:
+    """The passes of `pipeline` as separate pipelines of one pass each, in
+    order.  Passes nested under an op (e.g. `aie.device(...)`) keep their
+    anchor: `builtin.module(aie.device(a,b))` splits into
+    `builtin.module(aie.device(a))` and `builtin.module(aie.device(b))`."""
+
+    def leaves(entry):
+        anchor = _anchor(entry)
+        if anchor is None:
+            return [entry]
+        return [
+            f"{anchor}({leaf})"
+            for part in _split_top_level(entry[len(anchor) + 1 : -1])
+            for leaf in leaves(part)
+        ]
+
+    return leaves(str(pipeline).strip())
+
+
+def join_pipeline(passes: List[str]) -> str:
+    """The inverse of split_pipeline(): one pipeline running `passes`, with
+    consecutive passes under the same anchor nested together again."""
+    joined = []
+    for anchor, group in itertools.groupby(passes, _anchor):
+        if anchor is None:
+            joined.extend(group)
+        else:
+            nested = [p[len(anchor) + 1 : -1] for p in group]
+            joined.append(f"{anchor}({join_pipeline(nested)})")
+    return ",".join(joined)
+
+
+def run_pipelines(
+    module,
+    pipelines: Dict[str, Union[str, "Pipeline"]],
+    enable_ir_printing=False,
+    verify=True,
+    copy: Optional[str] = "clone",
+    pass_statistics: Optional[list] = None,
+):
+    """Run several `pipelines`, by name, on `module` and return the module
+    each one produced, by name.
+
+    The pipelines share their common prefixes: a pass all of them start with
+    runs once, and the module is cloned only where they diverge (or where one
+    ends and others go on).  `copy` is as for run_pipeline() and says what
+    the first pass runs on; `module` is left untouched unless it is None.
+    The modules are returned as OpViews, like run_pipeline() returns a clone.
+    """
+    passes = {name: split_pipeline(pipeline) for name, pipeline in pipelines.items()}
+    results = {}
+
+    def fork(mod, names, depth):
+        # `mod` has had the first `depth` passes of all `names` run on it.
+        done = [name for name in names if len(passes[name]) == depth]
+        branches = {}
+        for name in names:
+            if len(passes[name]) > depth:
+                branches.setdefault(passes[name][depth], []).append(name)
+        consumers = len(done) + len(branches)
+        for i, name in enumerate(done):
+            results[name] = mod if i == consumers - 1 else mod.operation.clone(ip=False)
+        for i, group in enumerate(branches.values(), len(done)):
+            # Run the passes the group shares as one pipeline.
+            end = depth + 1
+            while all(len(passes[n]) > end for n in group) and (
+                len({passes[n][end] for n in group}) == 1
+            ):
+                end += 1
+            fork(
+                run_pipeline(
+                    mod,
+                    join_pipeline(passes[group[0]][depth:end]),
+                    enable_ir_printing=enable_ir_printing,
+                    verify=verify,
+                    copy=None if i == consumers - 1 else "clone",
+                    pass_statistics=pass_statistics,
+                ),
+                group,
+                end,
+            )
+
+    if copy == "parse":
+        from ...ir import Module
+
+        module = Module.parse(str(module))
+    elif copy == "clone":
+        module = module.operation.clone(ip=False)
+    elif copy is not None:
+        raise ValueError(f"unknown copy mode {copy!r}")
+    fork(module.operation.opview, list(pipelines), 0)
+    return {name: results[name] for name in pipelines}
+
+
+def count_ops(module) -> Counter:
+    """The number of ops of `module` (not counting itself) by op name."""
+    counts = Counter()
+    worklist = [module.operation]
+    while worklist:
+        op = worklist.pop()
+        for region in op.regions:
+            for block in region.blocks:
+                for child in block.operations:
+                    counts[child.operation.name] += 1
+                    worklist.append(child.operation)
+    return counts
+
+
+def profile_passes(
+    module,
+    pipeline: Union[str, "Pipeline"],
+    verify=True,
+    enable_ir_printing=False,
+    print_pipeline=False,
+):
+    """Run the passes of `pipeline` on `module` in place, one at a time (see
+    split_pipeline()), and return a record for each:
+
+      {"pass": the one-pass pipeline, "seconds": its wall time,
+       "ops_before": number of ops, "ops_after": number of ops,
+       "ops_changed": {op name: change in the number of these ops}}
+
+    Running them one at a time (and counting the ops) is slower than running
+    the whole pipeline; this is for finding out which pass is the expensive
+    one.  `enable_ir_printing` and `print_pipeline` are as for run_pipeline()
+    and apply to every pass.  Must be called in the module's context."""
+    from ...passmanager import PassManager
+
+    records = []
+    before = count_ops(module)
+    for one_pass in split_pipeline(pipeline):
+        pm = PassManager.parse(one_pass)
+        pm.enable_verifier(verify)
+        if print_pipeline:
+            print(pm)
+        if enable_ir_printing:
+            pm.enable_ir_printing()
+        start = time.perf_counter()
+        pm.run(module.operation)
+        seconds = time.perf_counter() - start
+        after = count_ops(module)
+        changed = {
+            name: after[name] - before[name]
+            for name in sorted(before.keys() | after.keys())
+            if after[name] != before[name]
+        }
+        records.append(
+            {
+                "pass": one_pass,
+                "seconds": seconds,
+                "ops_before": sum(before.values()),
+                "ops_after": sum(after.values()),
+                "ops_changed": changed,
+            }
+        )
+        before = after
+    return records
 
 
 class Pipeline:
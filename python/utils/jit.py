@@ -0,0 +1,192 @@
+# jit.py -*- Python -*-
+#
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+"""
+Compile and run designs written in Python, without rebuilding unchanged ones.
+
+Example usage:
+>>> from aie.utils.jit import jit
+>>> @jit(options=["--no-xchesscc", "--no-xbridge"])
+... def passthrough(n):
+...     @device(AIEDevice.ipu)
+...     def device_body():
+...         ...
+>>> out = np.zeros(1024, dtype=np.int32)
+>>> passthrough(np.arange(1024, dtype=np.int32), out, n=1024)
+
+Calling the decorated function generates the design with its keyword arguments
+in a fresh mlir_mod_ctx().  The build is cached under a hash of the generated
+module and the compile options, in the aiecc cache directory, so a design is
+only compiled the first time it is run, also across processes.  The positional
+arguments are NumPy arrays which are bound to the kernel's buffers in order
+(the first one to group id 2, like setup_aie() does), written to the device
+before the run and updated with the buffers' contents after it.
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import tempfile
+from typing import Sequence
+
+import numpy as np
+
+import aie.compiler.aiecc
+import aie.compiler.aiecc.cl_arguments
+import aie.compiler.aiecc.configure
+import aie.compiler.aiecc.main
+from aie.compiler.aiecc.api import DEFAULT_OPTIONS
+from aie.compiler.aiecc.cache import (
+    CACHE_FORMAT_VERSION,
+    ArtifactCache,
+    default_cache_dir,
+    tool_fingerprint,
+)
+from aie.extras.context import mlir_mod_ctx
+
+# Group id of the buffer the first array is bound to.
+FIRST_GROUP_ID = 2
+
+# The tools aiecc runs, from the aie install or the PATH, and from Peano.
+AIE_TOOLS = ["aie-opt", "aie-translate", "xchesscc", "xclbinutil", "bootgen"]
+PEANO_TOOLS = ["clang", "opt", "llc"]
+
+
+# Fingerprint of everything besides the module and the options that goes
+# into a build: aiecc itself, the aie bindings and the tools.
+@functools.lru_cache(maxsize=None)
+def toolchain_fingerprint(peano_install_dir):
+    import aie._mlir_libs._aie
+
+    aiecc_dir = os.path.dirname(aie.compiler.aiecc.main.__file__)
+    files = sorted(glob.glob(os.path.join(aiecc_dir, "*.py")))
+    files.append(aie._mlir_libs._aie.__file__)
+    bin_dir = os.path.join(aie.compiler.aiecc.configure.install_path(), "bin")
+    tools = [
+        (
+            os.path.join(bin_dir, tool)
+            if os.path.isfile(os.path.join(bin_dir, tool))
+            else tool
+        )
+        for tool in AIE_TOOLS
+    ]
+    tools += [os.path.join(peano_install_dir, "bin", tool) for tool in PEANO_TOOLS]
+    h = hashlib.sha256()
+    for path in files + tools:
+        h.update(b"\0tool:" + tool_fingerprint(path).encode())
+    h.update(b"\0aietools:" + os.getenv("AIETOOLS", "").encode())
+    return h.hexdigest()
+
+
+class JitKernel:
+    def __init__(
+        self,
+        design,
+        options: Sequence[str] = (),
+        kernel_name="MLIR_AIE",
+        cache_dir=None,
+    ):
+        functools.update_wrapper(self, design)
+        self.design = design
+        self.kernel_name = kernel_name
+        self.options = [*options, f"--xclbin-kernel-name={kernel_name}"]
+        self.cache = ArtifactCache(
+            os.path.join(cache_dir or default_cache_dir(), "jit")
+        )
+        # Keyed by the cache key: the loaded application and the shapes and
+        # dtypes its buffers were registered for.
+        self.applications = {}
+        self._scratch = None
+
+    def module(self, **params):
+        """The text of the design generated with `params`."""
+        with mlir_mod_ctx() as ctx:
+            self.design(**params)
+            if not ctx.module.operation.verify():
+                raise ValueError(f"{self.__name__} generated an invalid module")
+            return str(ctx.module)
+
+    def key(self, module):
+        h = hashlib.sha256()
+        h.update(CACHE_FORMAT_VERSION.encode())
+        h.update(b"\0module:" + module.encode())
+        for option in self.options:
+            h.update(b"\0option:" + option.encode())
+        # A different aiecc or tool may build the same module differently.
+        opts = aie.compiler.aiecc.cl_arguments.parse_args(
+            [*DEFAULT_OPTIONS, *self.options]
+        )
+        h.update(
+            b"\0toolchain:" + toolchain_fingerprint(opts.peano_install_dir).encode()
+        )
+        return h.hexdigest()
+
+    def build(self, **params):
+        """Build the design for `params` unless it is cached.  Returns the
+        cache key and the paths of the xclbin and the instructions."""
+        module = self.module(**params)
+        key = self.key(module)
+        paths = self.cache.lookup(key, 2)
+        if paths is None:
+            paths = self._compile(key, module)
+        return key, paths
+
+    def _compile(self, key, module):
+        if self._scratch is None:
+            self._scratch = tempfile.TemporaryDirectory(prefix="aie-jit-")
+        tmpdir = os.path.join(self._scratch.name, key)
+        artifacts = aie.compiler.aiecc.compile(module, self.options, tmpdir=tmpdir)
+        if artifacts.xclbin is None or artifacts.insts is None:
+            raise RuntimeError(f"{self.__name__}: aiecc made no xclbin or insts")
+        paths = [
+            os.path.join(tmpdir, "final.xclbin"),
+            os.path.join(tmpdir, "insts.txt"),
+        ]
+        self.cache.store(key, paths)
+        # Run from the scratch directory if the cache couldn't take them.
+        return self.cache.lookup(key, 2) or paths
+
+    def __call__(self, *arrays, **params):
+        key, (xclbin, insts) = self.build(**params)
+        signature = [(a.shape, a.dtype) for a in arrays]
+        app, registered = self.applications.get(key, (None, None))
+        if app is None:
+            from aie.utils.xrt import AIE_Application
+
+            app = AIE_Application(xclbin, insts, self.kernel_name)
+        if registered != signature:
+            app.buffers[FIRST_GROUP_ID:] = [None] * len(app.buffers[FIRST_GROUP_ID:])
+            for group_id, (shape, dtype) in enumerate(signature, FIRST_GROUP_ID):
+                app.register_buffer(group_id, shape=shape, dtype=dtype)
+        self.applications[key] = (app, signature)
+
+        for group_id, a in enumerate(arrays, FIRST_GROUP_ID):
+            app.buffers[group_id].write(np.ascontiguousarray(a))
+        app.run()
+        for group_id, a in enumerate(arrays, FIRST_GROUP_ID):
+            if a.flags.writeable:
+                a[...] = app.buffers[group_id].read()
+
+
+def jit(
+    design=None,
+    *,
+    options: Sequence[str] = (),
+    kernel_name="MLIR_AIE",
+    cache_dir=None,
+):
+    """Decorator turning a function that generates a design into a JitKernel
+    that builds, caches and runs it.  `options` are aiecc options on top of
+    aie.compiler.aiecc.api.DEFAULT_OPTIONS; the cache is in `cache_dir`/jit,
+    by default in the aiecc cache directory."""
+    if design is None:
+        return functools.partial(
+            jit, options=options, kernel_name=kernel_name, cache_dir=cache_dir
+        )
+    return JitKernel(design, options, kernel_name, cache_dir)
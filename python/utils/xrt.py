@@ -32,8 +32,12 @@ class AIE_Application:
         self.context = xrt.hw_context(self.device, self.xclbin.get_uuid())
         self.kernel = xrt.kernel(self.context, xkernel.get_name())
 
-        ## Set up instruction stream
-        insts = read_insts(insts_path)
+        ## Set up instruction stream, which can also be given directly, e.g. as
+        ## the insts of aie.compiler.aiecc.compile()
+        if isinstance(insts_path, np.ndarray):
+            insts = insts_path
+        else:
+            insts = read_insts(insts_path)
         self.n_insts = len(insts)
         self.insts_buffer = AIE_Buffer(
             self, 0, insts.dtype, insts.shape, xrt.bo.cacheable
@@ -14,6 +14,8 @@
 // RUN: %PYTHON aiecc.py --no-unified --compile --no-link --xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=XCHESSCC
 // RUN: %PYTHON aiecc.py --no-unified --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=PEANO
 // RUN: %PYTHON aiecc.py --no-unified --no-compile --no-link -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=NOCOMPILE
+// RUN: %PYTHON aiecc.py --no-unified --in-process --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=INPROCESS
+// RUN: %PYTHON aiecc.py --no-unified --in-process --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=ROUTE
 
 // Note that llc determines the architecture from the llvm IR.
 
@@ -26,6 +28,13 @@
 // PEANO-NOT: xchesscc_wrapper
 // NOCOMPILE-NOT: xchesscc_wrapper
 // NOCOMPILE-NOT: {{^[^ ]*llc}}
+// INPROCESS-NOT: --aie-standard-lowering
+// INPROCESS: lower core (1, 2) in-process
+// INPROCESS-NOT: --mlir-to-llvmir
+// INPROCESS: {{^[^ ]*llc}}
+// ROUTE-NOT: --aie-create-pathfinder-flows
+// ROUTE: route in-process -o {{.*}}input_physical.mlir
+// ROUTE-NOT: --aie-create-pathfinder-flows
 
 module {
   %12 = aie.tile(1, 2)
@@ -14,10 +14,14 @@
 // RUN: %PYTHON aiecc.py --no-unified --compile --no-link --xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=XCHESSCC
 // RUN: %PYTHON aiecc.py --no-unified --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=PEANO
 // RUN: %PYTHON aiecc.py --no-unified --no-compile --no-link -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=NOCOMPILE
+// RUN: %PYTHON aiecc.py --no-unified --pipe --compile --no-link --xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=XCHESSCC-PIPE
+// RUN: %PYTHON aiecc.py --no-unified --pipe --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=PEANO-PIPE
+// RUN: %PYTHON aiecc.py --unified --pipe --compile --no-link --no-xchesscc -nv %VitisSysrootFlag% --host-target=%aieHostTargetTriplet% %s -I%aie_runtime_lib%/test_lib/include %extraAieCcFlags% -L%aie_runtime_lib%/test_lib/lib -ltest_lib %S/test.cpp -o test.elf | FileCheck %s --check-prefix=UNIFIED-PIPE
 
 // Note that llc determines the architecture from the llvm IR.
 // XCHESSCC-NOT: {{^[^ ]*llc}}
 // XCHESSCC: xchesscc_wrapper aie2
+// XCHESSCC: llvm-link {{.*}}chess_intrinsic_wrapper.ll -S | chesshack > {{[^ ]*}}chesslinked.ll
 // XCHESSCC-NOT: {{^[^ ]*llc}}
 // PEANO-NOT: xchesscc_wrapper
 // PEANO: {{^[^ ]*llc}}
@@ -26,6 +30,14 @@
 // NOCOMPILE-NOT: xchesscc_wrapper
 // NOCOMPILE-NOT: {{^[^ ]*llc}}
 
+// With --pipe, each core streams from aie-opt to the compiler.
+// XCHESSCC-PIPE: aie-opt {{.*}}--aiex-standard-lowering {{.*}}input_with_addresses.mlir | aie-opt --pass-pipeline={{.*}} - | aie-translate --mlir-to-llvmir - | llvm-link - {{[^ ]*}}chess_intrinsic_wrapper.ll -S | chesshack > {{[^ ]*}}core_1_2.llchesslinked.ll
+// XCHESSCC-PIPE: xchesscc_wrapper aie2 {{.*}} {{[^ ]*}}core_1_2.llchesslinked.ll
+// PEANO-PIPE-NOT: core_1_2.opt.mlir
+// PEANO-PIPE: aie-opt {{.*}}--aiex-standard-lowering {{.*}}input_with_addresses.mlir | aie-opt --pass-pipeline={{.*}} - | aie-translate --mlir-to-llvmir - | {{[^ ]*}}opt --passes=default<O2>,strip -S - | {{[^ ]*}}llc - -O2 --march=aie2 {{.*}}-o {{[^ ]*}}core_1_2.o
+// PEANO-PIPE-NOT: core_1_2.opt.mlir
+// UNIFIED-PIPE: aie-opt --pass-pipeline={{.*}} {{[^ ]*}}input_with_addresses.mlir | aie-translate --mlir-to-llvmir - | {{[^ ]*}}opt --passes=default<O2> -inline-threshold=10 -S - | {{[^ ]*}}llc - -O2 --march=aie2 {{.*}}-o {{[^ ]*}}input.o
+
 module {
   aie.device(xcve2302) {
   %12 = aie.tile(1, 2)
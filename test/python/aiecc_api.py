@@ -0,0 +1,41 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import tempfile
+
+from aie.compiler.aiecc import compile
+from aie.ir import Context, Location, Module
+
+module = """
+module {
+  aie.device(ipu) {
+    %12 = aie.tile(0, 2)
+    %buf = aie.buffer(%12) : memref<256xi32>
+    %4 = aie.core(%12)  {
+      %0 = arith.constant 0 : i32
+      %1 = arith.constant 0 : index
+      memref.store %0, %buf[%1] : memref<256xi32>
+      aie.end
+    }
+  }
+}
+"""
+
+with Context() as ctx, Location.unknown():
+    mlir_module = Module.parse(module)
+
+# The outputs go to the scratch directory, not the working directory.
+# CHECK-DAG: aie-translate --aie-ipu-instgen {{.*}} -o {{.*}}/insts.txt
+# CHECK-DAG: xclbinutil {{.*}} --output {{.*}}/final.xclbin
+tmpdir = tempfile.mkdtemp()
+artifacts = compile(mlir_module, ["--no-compile", "-nv"], tmpdir=tmpdir)
+# Nothing was run, so there is nothing to return.
+# CHECK: xclbin: None pdi: None insts: None
+print("xclbin:", artifacts.xclbin, "pdi:", artifacts.pdi, "insts:", artifacts.insts)
+# CHECK: kept: True
+print("kept:", artifacts.tmpdir == tmpdir and os.path.isdir(tmpdir))
+# CHECK: final.xclbin here: False
+print("final.xclbin here:", os.path.exists("final.xclbin"))
@@ -0,0 +1,68 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import asyncio
+
+from aie.compiler.aiecc.batch import expand_batch, strip_batch_args
+from aie.compiler.aiecc.scheduler import PrioritySemaphore, current_group
+
+spec = {
+    "args": ["--no-compile-host"],
+    "designs": ["add_one.mlir", {"name": "copy", "file": "copy.mlir", "workdir": "b"}],
+    "sweeps": [
+        {
+            "name": "mm_{M}x{K}",
+            "parameters": {"M": [256, 512], "K": {"from": 64, "to": 128, "step": 64}},
+            "generate": ["python3", "aie2.py", "-M", "{M}", "-K", "{K}"],
+            "file": "build/aie_{M}x{K}.mlir",
+            "workdir": "build",
+            "args": ["--xclbin-name=final_{M}x{K}.xclbin"],
+        }
+    ],
+}
+
+# CHECK: add_one /spec/add_one.mlir /spec ['--no-compile-host'] None
+# CHECK: copy /spec/copy.mlir /spec/b ['--no-compile-host'] None
+# CHECK: mm_256x64 /spec/build/aie_256x64.mlir /spec/build ['--no-compile-host', '--xclbin-name=final_256x64.xclbin'] ['python3', 'aie2.py', '-M', '256', '-K', '64']
+# CHECK: mm_256x128
+# CHECK: mm_512x64
+# CHECK: mm_512x128
+for d in expand_batch(spec, "/spec"):
+    print(d.name, d.file, d.workdir, d.args, d.generate)
+
+try:
+    expand_batch({"designs": ["a.mlir", "sub/a.mlir"]}, "/spec")
+except ValueError as e:
+    # CHECK: duplicate design name 'a' in batch
+    print(e)
+
+# CHECK: ['-j', '8', '--no-xchesscc']
+print(
+    strip_batch_args(["--batch", "sweep.json", "-j", "8", "--batch=x", "--no-xchesscc"])
+)
+
+
+async def fair_share():
+    limit = PrioritySemaphore(2)
+    order = []
+
+    async def stage(group, name, priority):
+        current_group.set(group)
+        await limit.acquire(priority)
+        order.append(name)
+        await asyncio.sleep(0.01)
+        limit.release()
+
+    # Design "a" queues up first and has the more critical work, but as soon
+    # as "b" is waiting too, the slots are split evenly between them.
+    tasks = [asyncio.ensure_future(stage("a", f"a{i}", 10)) for i in range(4)]
+    await asyncio.sleep(0)
+    tasks += [asyncio.ensure_future(stage("b", f"b{i}", 1)) for i in range(2)]
+    await asyncio.gather(*tasks)
+    return order
+
+
+# CHECK: ['a0', 'a1', 'b0', 'a2', 'b1', 'a3']
+print(asyncio.run(fair_share()))
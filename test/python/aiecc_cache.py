@@ -0,0 +1,65 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import shutil
+import tempfile
+
+from aie.compiler.aiecc.cache import ArtifactCache, command_key
+
+tmp = tempfile.mkdtemp()
+cache = ArtifactCache(os.path.join(tmp, "cache"))
+
+
+def build_dir(name, contents):
+    d = os.path.join(tmp, name)
+    os.makedirs(d)
+    with open(os.path.join(d, "core_1_2.ll"), "w") as f:
+        f.write(contents)
+    return d
+
+
+def key(d):
+    src, dst = os.path.join(d, "core_1_2.ll"), os.path.join(d, "core_1_2.o")
+    return command_key(["cp", src, dst], [src], [dst])
+
+
+a = build_dir("a", "define void @core_1_2() { ret void }")
+b = build_dir("b", "define void @core_1_2() { ret void }")
+c = build_dir("c", "define void @core_1_2() { unreachable }")
+
+# CHECK: same inputs, different directories: True
+print("same inputs, different directories:", key(a) == key(b))
+# CHECK: different inputs: False
+print("different inputs:", key(a) == key(c))
+
+obj = os.path.join(a, "core_1_2.o")
+# CHECK: hit before store: False
+print("hit before store:", cache.fetch(key(a), [obj]))
+shutil.copyfile(os.path.join(a, "core_1_2.ll"), obj)
+cache.store(key(a), [obj])
+
+restored = os.path.join(b, "core_1_2.o")
+# CHECK: hit after store: True
+print("hit after store:", cache.fetch(key(b), [restored]))
+# CHECK: restored: define void @core_1_2() { ret void }
+print("restored:", open(restored).read())
+# CHECK: hits=1 misses=1
+print(f"hits={cache.hits} misses={cache.misses}")
+
+
+# xchesscc is told where to keep its intermediate files, which differs per
+# build directory and mustn't take part in the key.
+def xchesscc_key(d):
+    src, dst = os.path.join(d, "core_1_2.ll"), os.path.join(d, "core_1_2.o")
+    work = os.path.join(d, "work")
+    command = ["xchesscc_wrapper", "aie2", "+w", work, "-c", src, "-o", dst]
+    return command_key(command, [src], [dst], scratch=[work])
+
+
+# CHECK: xchesscc, different directories: True
+print("xchesscc, different directories:", xchesscc_key(a) == xchesscc_key(b))
+# CHECK: xchesscc, different inputs: False
+print("xchesscc, different inputs:", xchesscc_key(a) == xchesscc_key(c))
@@ -0,0 +1,126 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+from aie.compiler.aiecc.main import canonicalize_core_llvmir, rename_script_symbols
+
+core_1_2 = """
+@in_1_2 = external global [16 x i32]
+@out_1_2 = external global [16 x i32]
+define void @core_1_2() {
+  %1 = load i32, ptr @in_1_2
+  store i32 %1, ptr @out_1_2
+  ret void
+}
+"""
+core_1_3 = (
+    core_1_2.replace("core_1_2", "core_1_3")
+    .replace("in_1_2", "in_1_3")
+    .replace("out_1_2", "out_1_3")
+)
+core_1_4 = core_1_3.replace("[16 x i32]", "[32 x i32]")
+
+canonical_1_2, names_1_2 = canonicalize_core_llvmir(core_1_2)
+canonical_1_3, names_1_3 = canonicalize_core_llvmir(core_1_3)
+canonical_1_4, _ = canonicalize_core_llvmir(core_1_4)
+
+# CHECK: ['core_1_2', 'in_1_2', 'out_1_2']
+print(names_1_2)
+# CHECK: 1_2 == 1_3: True
+print("1_2 == 1_3:", canonical_1_2 == canonical_1_3)
+# CHECK: 1_2 == 1_4: False
+print("1_2 == 1_4:", canonical_1_2 == canonical_1_4)
+
+# The BCF of (1, 3) also describes the buffers of its southern neighbour
+# (1, 2), whose names must not clash with the ones it is renamed to.
+bcf_1_3 = """_symbol core_1_3 _after _main_init
+_symbol in_1_3 0x38000 0x40
+_symbol out_1_3 0x38040 0x40
+_symbol in_1_2 0x30000 0x40
+_include _file kernel.o
+"""
+
+# CHECK: _symbol core_1_2 _after _main_init
+# CHECK: _symbol in_1_2 0x38000 0x40
+# CHECK: _symbol out_1_2 0x38040 0x40
+# CHECK: _symbol __aiecc_unused_in_1_2 0x30000 0x40
+# CHECK: _include _file kernel.o
+print(rename_script_symbols(bcf_1_3, dict(zip(names_1_3, names_1_2))))
+
+import asyncio
+import os
+import tempfile
+import types
+
+from aie.compiler.aiecc.main import FlowRunner
+from aie.compiler.aiecc.scheduler import PrioritySemaphore
+
+
+# Compile cores (1, 2), (1, 3) and (1, 4) with two -j slots, the first two
+# sharing an object.  The compile of the shared object, by whichever of the
+# two gets to it first, is slow and, if `error`, fails.
+async def compile_cores(tmpdir, error):
+    events = []
+    objects = {}
+
+    async def compile_core(task, core, file_core_llvmir, file_core_obj, *args):
+        shared = core[:2] != (1, 4)
+        await asyncio.sleep(0.1 if shared else 0)
+        if error and shared:
+            raise RuntimeError(error)
+        events.append("done shared" if shared else "done (1, 4)")
+
+    runner = types.SimpleNamespace(
+        opts=types.SimpleNamespace(execute=True, verbose=False),
+        core_objects={},
+        limit=PrioritySemaphore(2),
+        compile_core=compile_core,
+    )
+
+    async def process_core(core, llvmir):
+        async with runner.limit:
+            file_core_llvmir = os.path.join(tmpdir, "core_%d_%d.ll" % core[:2])
+            with open(file_core_llvmir, "w") as f:
+                f.write(llvmir)
+            try:
+                obj, _ = await FlowRunner.compile_core_once(
+                    runner,
+                    None,
+                    core,
+                    file_core_llvmir,
+                    "core_%d_%d.o" % core[:2],
+                    "AIE2",
+                    None,
+                )
+                objects[core[:2]] = obj
+            except RuntimeError as e:
+                events.append(f"{core[:2]} failed: {e}")
+
+    await asyncio.wait_for(
+        asyncio.gather(
+            process_core((1, 2, None), core_1_2),
+            process_core((1, 3, None), core_1_3),
+            process_core((1, 4, None), core_1_4),
+        ),
+        10,
+    )
+    return events, objects
+
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    events, objects = asyncio.run(compile_cores(tmpdir, None))
+    # The core waiting for the shared object doesn't hold a slot, so (1, 4)
+    # gets one and finishes first.
+    # CHECK: (1, 4) first: True
+    print("(1, 4) first:", events == ["done (1, 4)", "done shared"])
+    # CHECK: shared: True
+    print("shared:", objects[1, 2] == objects[1, 3] != objects[1, 4])
+
+    # A failed compile fails the cores waiting for it rather than hanging.
+    events, objects = asyncio.run(compile_cores(tmpdir, "xchesscc failed"))
+    # CHECK: (1, 2) failed: xchesscc failed
+    # CHECK: (1, 3) failed: xchesscc failed
+    print("\n".join(sorted(e for e in events if "failed" in e)))
+    # CHECK: (1, 4): core_1_4.o
+    print("(1, 4):", objects[1, 4])
@@ -0,0 +1,68 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+from aie.compiler.aiecc.design import TARGET_ARCH, analyze_design_str
+from aie.dialects.aie import AIEDevice
+from aie.compiler.aiecc.main import emit_partition
+
+design = analyze_design_str(
+    """
+module {
+  aie.device(ipu) {
+    %t00 = aie.tile(0, 0)
+    %t02 = aie.tile(0, 2)
+    %t23 = aie.tile(2, 3)
+    %buf = aie.buffer(%t02) { sym_name = "buf", address = 1024 : i32 } : memref<256xi32>
+    aie.flow(%t00, DMA : 0, %t02, DMA : 1)
+    %c02 = aie.core(%t02) { aie.end }
+    %c23 = aie.core(%t23) { aie.end } { elf_file = "custom_2_3.elf" }
+  }
+}
+"""
+)
+
+# CHECK: ipu AIE2
+print(design.device, design.target_arch)
+# CHECK: [(0, 0), (0, 2), (2, 3)]
+print(design.tiles)
+# CHECK: [0, 2]
+print(design.columns)
+# CHECK: [(0, 2, None), (2, 3, 'custom_2_3.elf')]
+print(design.cores)
+# CHECK: [BufferInfo(name='buf', tile=(0, 2), type='memref<256xi32>', address=1024)]
+print(design.buffers)
+# CHECK: [FlowInfo(source=(0, 0), source_bundle='DMA', source_channel=0, dest=(0, 2), dest_bundle='DMA', dest_channel=1)]
+print(design.flows)
+# CHECK: column_width 3
+print(
+    "column_width", emit_partition(design)["aie_partition"]["partition"]["column_width"]
+)
+# The PDI UUID is a function of the design.
+# CHECK: same uuid: True True
+uuid = emit_partition(design)["aie_partition"]["PDIs"][0]["uuid"]
+print(
+    "same uuid:",
+    uuid == emit_partition(design)["aie_partition"]["PDIs"][0]["uuid"],
+    uuid != emit_partition(design, "0x902")["aie_partition"]["PDIs"][0]["uuid"],
+)
+
+# Designs without an aie.device are AIE1, as in aie-translate.
+legacy = analyze_design_str(
+    """
+module {
+  %t12 = aie.tile(1, 2)
+  %c12 = aie.core(%t12) { aie.end }
+}
+"""
+)
+# CHECK: None AIE [(1, 2, None)]
+print(legacy.device, legacy.target_arch, legacy.cores)
+
+# Devices missing from the table would need aie-translate to be run.
+# CHECK: devices without target arch: []
+print(
+    "devices without target arch:",
+    [d.name for d in AIEDevice if d.name not in TARGET_ARCH],
+)
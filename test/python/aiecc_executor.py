@@ -0,0 +1,186 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import aie.compiler.aiecc.executor
+from aie.compiler.aiecc.executor import (
+    HEADER_LENGTH,
+    MAX_HEADER_LENGTH,
+    LocalExecutor,
+    ProcessPoolExecutor,
+    RemoteExecutor,
+)
+from aie.compiler.aiecc.worker import WorkerServer
+
+UPPERCASE = """
+import sys
+with open(sys.argv[1]) as f, open(sys.argv[2], "w") as g:
+    g.write(f.read().upper())
+print("wrote", sys.argv[2])
+"""
+
+
+async def main():
+    server = WorkerServer(("127.0.0.1", 0), 2, "secret")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = "%s:%d" % server.server_address[:2]
+
+    workdir = tempfile.mkdtemp()
+    # Outputs don't have to be in the working directory.
+    outdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, "in.txt"), "w") as f:
+        f.write("hello")
+    out = os.path.join(outdir, "out.txt")
+    command = [sys.executable, "-c", UPPERCASE, "in.txt", out]
+
+    # The command runs in a scratch directory of the worker, but its messages
+    # and outputs are in terms of the local paths.
+    # CHECK: outdir: [[OUTDIR:.*]]
+    # CHECK: wrote [[OUTDIR]]/out.txt
+    # CHECK: remote: 0 HELLO
+    print("outdir:", outdir)
+    executor = RemoteExecutor([address], token="secret")
+    returncode, rusage = await executor.run(command, workdir, ["in.txt"], [out])
+    with open(out) as f:
+        print("remote:", returncode, f.read())
+    # CHECK: rusage: True
+    print("rusage:", rusage.ru_maxrss > 0)
+
+    # Commands that don't declare their files run locally.
+    # CHECK: select: False True
+    print(
+        "select:", executor.select(None, None).remote, executor.select([], [out]).remote
+    )
+
+    # A failing command fails just the same remotely.
+    # CHECK: failed: 3
+    returncode, _ = await executor.run(
+        [sys.executable, "-c", "raise SystemExit(3)"], workdir, [], [out]
+    )
+    print("failed:", returncode)
+
+    # A worker doesn't run commands for clients without its token, they run
+    # locally instead.
+    os.remove(out)
+    # CHECK: wrong token: 0 HELLO, workers left: 0
+    executor = RemoteExecutor([address], token="guess")
+    returncode, _ = await executor.run(command, workdir, ["in.txt"], [out])
+    with open(out) as f:
+        print(
+            "wrong token:",
+            returncode,
+            f.read() + ", workers left:",
+            len(executor.workers),
+        )
+
+    # A worker hangs up on headers too long to be read before the token is
+    # checked.
+    with socket.create_connection(server.server_address[:2]) as conn:
+        conn.sendall(HEADER_LENGTH.pack(MAX_HEADER_LENGTH + 1) + b"{")
+        # CHECK: oversized header: b''
+        print("oversized header:", conn.recv(1))
+
+    # Commands run locally once no worker can be reached.
+    os.remove(out)
+    # CHECK: unreachable: 0 HELLO
+    executor = RemoteExecutor(["127.0.0.1:1"])
+    returncode, _ = await executor.run(command, workdir, ["in.txt"], [out])
+    with open(out) as f:
+        print("unreachable:", returncode, f.read())
+    # CHECK: workers left: 0
+    print("workers left:", len(executor.workers))
+
+    # Cancelling a command kills the tool and whatever it started, and reaps
+    # it, before the cancellation propagates.  Remote tools are killed by the
+    # worker when the connection goes away.
+    # The tool ignores SIGTERM, so it has to be killed after the grace period.
+    aie.compiler.aiecc.executor.TERMINATE_GRACE = 0.2
+    pidfile = os.path.join(workdir, "pid")
+    stubborn = ["sh", "-c", f"trap '' TERM; sleep 30 & echo $! > {pidfile}; wait"]
+    for name, executor in [
+        ("local", LocalExecutor()),
+        ("measured", LocalExecutor(measure=True)),
+        ("remote", RemoteExecutor([address], token="secret")),
+    ]:
+        if os.path.exists(pidfile):
+            os.remove(pidfile)
+        run = asyncio.ensure_future(executor.run(stubborn, workdir, [], [pidfile]))
+        while not os.path.exists(pidfile) and name != "remote":
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.5)
+        start = time.time()
+        run.cancel()
+        try:
+            await run
+        except asyncio.CancelledError:
+            pass
+        if name == "remote":
+            # Give the worker a moment to notice.
+            await asyncio.sleep(0.5)
+        else:
+            with open(pidfile) as f:
+                sleeper = int(f.read())
+            # Killed orphans may linger as zombies until init reaps them.
+            try:
+                with open(f"/proc/{sleeper}/stat") as f:
+                    alive = f.read().rsplit(")", 1)[1].split()[0] != "Z"
+            except FileNotFoundError:
+                alive = False
+            # CHECK: cancel local: stopped True, grandchild alive False
+            # CHECK: cancel measured: stopped True, grandchild alive False
+            print(
+                f"cancel {name}: stopped {time.time() - start < 10}, "
+                f"grandchild alive {alive}"
+            )
+        executor.shutdown()
+    # CHECK: worker idle: True
+    print("worker idle:", server.slots._value == 2)
+    server.shutdown()
+
+    # The output of a command can go to a log.
+    # CHECK: log: hello
+    log = os.path.join(workdir, "echo.log")
+    await LocalExecutor().run(["echo", "hello"], workdir, log=log)
+    with open(log) as f:
+        print("log:", f.read().strip())
+
+    # The stages of a pipeline stream into each other; what a stage writes can
+    # also be kept in a file, and the output of the last one captured.
+    # CHECK: pipeline: [0, 0] HELLO kept hello
+    tee = os.path.join(workdir, "echo.txt")
+    results, captured = await LocalExecutor().run_pipeline(
+        [["echo", "hello"], ["tr", "a-z", "A-Z"]], workdir, tees={0: tee}, capture=True
+    )
+    with open(tee) as f:
+        kept = f.read().strip()
+    print("pipeline:", [r for r, _ in results], captured.decode().strip(), "kept", kept)
+    # CHECK: failing pipeline: [0, 0, 4]
+    results, _ = await LocalExecutor(measure=True).run_pipeline(
+        [["echo", "hello"], ["cat"], ["sh", "-c", "cat; exit 4"]], workdir
+    )
+    print("failing pipeline:", [r for r, _ in results])
+
+    # CHECK: local: 0 True
+    executor = LocalExecutor(measure=True)
+    returncode, rusage = await executor.run(["true"], workdir)
+    print("local:", returncode, rusage is not None)
+    executor.shutdown()
+
+    # CHECK: pool: True
+    executor = ProcessPoolExecutor(1)
+    print("pool:", await executor.call(os.getpid) != os.getpid())
+    executor.shutdown()
+
+
+# Spawned pool workers import this file too.
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import io
+import tempfile
+
+from aie.compiler.aiecc.history import (
+    CompileHistory,
+    compare,
+    describe,
+    print_report,
+    tool_version,
+)
+
+# CHECK: same: 0.98 False
+ratio, pvalue = compare([1.0, 1.1, 0.9, 1.0, 1.05], [1.0, 0.95, 1.02])
+print(f"same: {ratio:.2f}", pvalue < 0.01)
+# CHECK: slower: 1.30 True
+ratio, pvalue = compare([1.0, 1.1, 0.9, 1.0, 1.05, 0.95], [1.3, 1.32, 1.28])
+print(f"slower: {ratio:.2f}", pvalue < 0.01)
+# A single build is judged by how much the baseline varies.
+# CHECK: single: True False
+print(
+    "single:",
+    compare([1.0, 1.02, 0.98, 1.0, 1.01], [1.3])[1] < 0.01,
+    compare([1.0, 1.6, 0.5, 1.2, 0.8], [1.3])[1] < 0.01,
+)
+
+old, new = tool_version(["llc:1"]), tool_version(["llc:2"])
+history = CompileHistory(tempfile.mkdtemp())
+# Twelve builds with the old llc, then three with a 30% slower one.  Stages
+# that ran several times are compared per invocation.
+for i in range(15):
+    llc = 0.4 + 0.01 * (i % 3) if i < 12 else 0.52 + 0.01 * (i % 3)
+    history.record(
+        "add_one.mlir",
+        {
+            "llc": (old if i < 12 else new, 4 * llc, 4),
+            "aie-opt --aie-create-pathfinder-flows": (old, 1.0 + 0.02 * (i % 2), 1),
+        },
+        when=i,
+    )
+    if i == 12:
+        # The build that introduces the slowdown already flags it.
+        # CHECK: warning: add_one.mlir: llc is 27% slower than in previous builds (0.520 vs 0.410 sec, p<0.0001), the tool has changed since
+        for c in history.regressions("add_one.mlir", recent=1):
+            print("warning:", describe(c))
+
+# CHECK: design        stage                                  builds  baseline  latest  change  trend
+# CHECK: add_one.mlir  aie-opt --aie-create-pathfinder-flows  15      1.010     1.000   -0.3%
+# CHECK: add_one.mlir  llc                                    15      0.410     0.540   +29.3%  {{.*}}  SLOWER (p={{.*}})
+out = io.StringIO()
+flagged = print_report(history, out=out)
+print(out.getvalue())
+# CHECK: flagged: 1
+print("flagged:", flagged)
+
+# CHECK: No compile-time history
+print_report(CompileHistory(tempfile.mkdtemp()))
@@ -0,0 +1,78 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import tempfile
+
+from aie.compiler.aiecc.cache import command_key
+from aie.compiler.aiecc.manifest import BuildManifest
+
+prj = tempfile.mkdtemp()
+src, dst = os.path.join(prj, "insts.mlir"), os.path.join(prj, "insts.txt")
+
+
+def write(path, contents):
+    with open(path, "w") as f:
+        f.write(contents)
+
+
+def build(manifest):
+    command = ["aie-translate", "--aie-ipu-instgen", src, "-o", dst]
+    key = command_key(command, [src], [dst])
+    if manifest.up_to_date(dst, key):
+        return "up to date"
+    write(dst, open(src).read().upper())
+    manifest.record(dst, key, command, [src], [dst])
+    return "rebuilt"
+
+
+write(src, "ipu.write32")
+manifest = BuildManifest(prj)
+# CHECK: first build: rebuilt
+print("first build:", build(manifest))
+manifest.save()
+
+# The manifest persists across runs in the build directory.
+manifest = BuildManifest(prj)
+# CHECK: no change: up to date
+print("no change:", build(manifest))
+
+# Rewriting an input with the same contents does not invalidate it.
+write(src, "ipu.write32")
+# CHECK: same contents: up to date
+print("same contents:", build(manifest))
+
+write(src, "ipu.sync")
+# CHECK: changed input: rebuilt
+print("changed input:", build(manifest))
+
+os.remove(dst)
+# CHECK: deleted output: rebuilt
+print("deleted output:", build(manifest))
+
+# A completed build can be checked as a whole, without running any stage.
+manifest.complete("build-1")
+manifest.save()
+manifest = BuildManifest(prj)
+# CHECK: same build: True
+print("same build:", manifest.up_to_date_build("build-1"))
+# CHECK: other build: False
+print("other build:", manifest.up_to_date_build("build-2"))
+write(src, "ipu.write32")
+# CHECK: changed input of the build: False
+print("changed input of the build:", manifest.up_to_date_build("build-1"))
+
+# Stages that weren't part of the last completed build are forgotten.
+other = os.path.join(prj, "other.txt")
+write(other, "")
+manifest.record(other, "key", ["true"], [], [other])
+manifest.save()
+manifest = BuildManifest(prj)
+build(manifest)
+# CHECK: stages: ['insts.txt', 'other.txt']
+print("stages:", sorted(os.path.basename(s) for s in manifest.stages))
+manifest.complete("build-1")
+# CHECK: stages after the build: ['insts.txt']
+print("stages after the build:", [os.path.basename(s) for s in manifest.stages])
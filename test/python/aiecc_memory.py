@@ -0,0 +1,82 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import asyncio
+import tempfile
+
+from aie.compiler.aiecc.memory import MemoryGate, RssEstimates
+
+cache_dir = tempfile.mkdtemp()
+estimates = RssEstimates(cache_dir)
+# Tools that haven't been seen yet get a default estimate.
+# CHECK: llc: 524288
+print("llc:", estimates.estimate(["llc", "core_0_2.ll"]))
+
+# Observations are keyed by tool and action, and persist.
+estimates.observe(["aie-opt", "--aie-create-pathfinder-flows", "in.mlir"], 300)
+estimates.observe(["aie-opt", "--aie-create-pathfinder-flows", "in.mlir"], 200)
+estimates.observe(["llc", "core_0_2.ll"], 800)
+estimates.save()
+estimates = RssEstimates(cache_dir)
+# CHECK: pathfinder: 300
+print("pathfinder:", estimates.estimate(["aie-opt", "--aie-create-pathfinder-flows"]))
+# CHECK: other aie-opt: 524288
+print("other aie-opt:", estimates.estimate(["aie-opt", "--aie-localize-locks"]))
+
+
+async def main():
+    gate = MemoryGate(1200, estimates)
+    events = []
+    peak = [0]
+
+    async def run(name, command):
+        async with gate.admit(command):
+            events.append(f"start {name}")
+            peak[0] = max(peak[0], gate.reserved_kb)
+            await asyncio.sleep(0.01)
+        events.append(f"end {name}")
+
+    pathfinder = ["aie-opt", "--aie-create-pathfinder-flows"]
+    # The first llc leaves no room for the second one.  Commands are admitted
+    # in order, so the pathfinder waits for its turn and then runs alongside.
+    await asyncio.gather(
+        run("llc 0", ["llc", "core_0_2.ll"]),
+        run("llc 1", ["llc", "core_0_3.ll"]),
+        run("pathfinder", pathfinder),
+    )
+    # CHECK: start llc 0
+    # CHECK-NEXT: end llc 0
+    # CHECK-NEXT: start llc 1
+    # CHECK-NEXT: start pathfinder
+    # CHECK-NEXT: end llc 1
+    # CHECK-NEXT: end pathfinder
+    print("\n".join(events))
+    # CHECK: peak: 1100 KB
+    print(f"peak: {peak[0]} KB")
+
+    # A command larger than the whole budget still runs, on its own.
+    events.clear()
+    gate = MemoryGate(100, estimates)
+    await asyncio.gather(
+        run("llc", ["llc", "core_0_2.ll"]), run("pathfinder", pathfinder)
+    )
+    # CHECK: start llc
+    # CHECK-NEXT: end llc
+    # CHECK-NEXT: start pathfinder
+    print("\n".join(events))
+
+
+asyncio.run(main())
+
+from aie.compiler.aiecc.cl_arguments import parse_args
+from aie.compiler.aiecc.main import make_memory_gate
+
+# The gate is only used when asked for.
+# CHECK: default: none None
+opts = parse_args(["design.mlir"])
+print("default:", opts.mem_budget, make_memory_gate(opts))
+# CHECK: 16G: 16777216
+opts = parse_args(["--mem-budget=16G", "design.mlir"])
+print("16G:", make_memory_gate(opts).budget_kb)
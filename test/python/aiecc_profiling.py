@@ -0,0 +1,54 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+from aie.compiler.aiecc.profiling import TraceRecorder, run_with_rusage, stage_of
+from aie.compiler.aiecc.scheduler import PrioritySemaphore, TaskGraph, current_slot
+
+# CHECK: aie-opt --aie-localize-locks
+print(stage_of(["aie-opt", "--aie-localize-locks", "in.mlir"]))
+# CHECK: llc
+print(stage_of(["/opt/peano/bin/llc", "-O2", "core.ll"]))
+
+# CHECK: returncode=3 has rusage: True
+ret, rusage = run_with_rusage([sys.executable, "-c", "import sys; sys.exit(3)"])
+print(f"returncode={ret} has rusage:", rusage.ru_maxrss > 0)
+
+trace = TraceRecorder()
+limit = PrioritySemaphore(2)
+limit.on_acquire = lambda slot, requested, granted: trace.queued(
+    f"slot {slot}", requested, granted, slot
+)
+
+
+def stage(name):
+    async def run():
+        slot = current_slot.get()
+        await asyncio.sleep(0.01)
+        trace.command([name], 0, 0, slot=slot)
+
+    return run
+
+
+graph = TaskGraph()
+for i in range(4):
+    graph.add(f"core_{i}", stage(f"core_{i}"), limit=limit)
+asyncio.run(graph.run())
+
+# CHECK: lanes: [0, 1]
+print("lanes:", sorted(trace.lanes))
+
+path = os.path.join(tempfile.mkdtemp(), "trace.json")
+trace.write(path)
+events = json.load(open(path))["traceEvents"]
+# CHECK: ['worker 0', 'worker 1']
+print([e["args"]["name"] for e in events if e["name"] == "thread_name"])
+# CHECK: spans: 4
+print("spans:", sum(e["ph"] == "X" and e["pid"] == 0 for e in events))
@@ -0,0 +1,75 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+from aie.compiler.aiecc.scheduler import PrioritySemaphore, SharedSlots, TaskGraph
+
+
+async def main():
+    # A single worker makes the admission order observable.
+    limit = PrioritySemaphore(1)
+    order = []
+
+    def stage(name):
+        async def run():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+        return run
+
+    graph = TaskGraph()
+    # The wrapper gates every core, so it is on the critical path even though
+    # it is cheap; the IPU instructions gate nothing.
+    graph.add("ipu", stage("ipu"), cost=1, limit=limit)
+    graph.add("host", stage("host"), cost=3, limit=limit)
+    wrapper = graph.add("chess_wrapper", stage("chess_wrapper"), cost=2, limit=limit)
+    cores = [
+        graph.add(f"core_{i}", stage(f"core_{i}"), deps=[wrapper], cost=10, limit=limit)
+        for i in range(2)
+    ]
+    graph.add("xclbin", stage("xclbin"), deps=cores, cost=1, limit=limit)
+
+    # CHECK: {'ipu': 1.0, 'host': 3.0, 'chess_wrapper': 13.0, 'core_0': 11.0, 'core_1': 11.0, 'xclbin': 1.0}
+    priorities = graph.priorities()
+    print({n: float(priorities[n]) for n in graph.nodes})
+
+    # The cores only become ready once the wrapper is done, by which time the
+    # host compilation has been admitted; after that they overtake the IPU.
+    await graph.run()
+    # CHECK: ['chess_wrapper', 'host', 'core_0', 'core_1', 'ipu', 'xclbin']
+    print(order)
+
+    # Semaphores sharing slots, here in one process for simplicity, hold at
+    # most that many between them.
+    shared = SharedSlots.create(tempfile.mkdtemp(), 2)
+    limits = [PrioritySemaphore(2, shared=shared) for _ in range(2)]
+    running = [0, 0]
+
+    async def run(limit):
+        async with limit:
+            running[0] += 1
+            running[1] = max(running)
+            await asyncio.sleep(0.1)
+            running[0] -= 1
+
+    await asyncio.gather(*(run(limit) for limit in limits for _ in range(3)))
+    # CHECK: at most 2 at a time
+    print(f"at most {running[1]} at a time")
+
+    # A process that dies gives its slots back.
+    process = multiprocessing.get_context("fork").Process(
+        target=lambda: shared.try_acquire() and os._exit(0)
+    )
+    process.start()
+    process.join()
+    # CHECK: after a holder died: True True
+    print("after a holder died:", *(shared.try_acquire() is not None for _ in range(2)))
+
+
+asyncio.run(main())
@@ -0,0 +1,93 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import json
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+from aie.compiler.aiecc.server import client_main, serve
+
+
+# Stands in for aiecc's main(); runs in a child forked by the server.
+def entry():
+    if sys.argv[1] == "sleep":
+        with open(os.environ["PID_FILE"], "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(30)
+    print("argv:", sys.argv[1:])
+    print("shared slots:", len(os.listdir(os.environ["AIECC_SHARED_SLOTS"])))
+    print("cwd matches:", os.getcwd() == os.environ["EXPECTED_CWD"])
+    print("server pid:", os.getppid() == int(os.environ["SERVER_PID"]))
+    sys.exit(int(sys.argv[1]))
+
+
+def run_client(*args):
+    sys.argv = ["aiecc.py", *args]
+    try:
+        client_main(socket_path, fallback=lambda: print("fallback"))
+    except SystemExit as e:
+        print("exit status:", e.code)
+    sys.stdout.flush()
+
+
+socket_path = os.path.join(tempfile.mkdtemp(), "aiecc.sock")
+
+# CHECK: fallback
+run_client("0")
+
+server = multiprocessing.get_context("fork").Process(
+    target=serve, args=(socket_path, 2, entry, 3)
+)
+server.start()
+while not os.path.exists(socket_path):
+    time.sleep(0.01)
+
+os.chdir(tempfile.mkdtemp())
+os.environ["EXPECTED_CWD"] = os.getcwd()
+os.environ["SERVER_PID"] = str(server.pid)
+
+# CHECK: argv: ['0', 'design.mlir']
+# CHECK: shared slots: 3
+# CHECK: cwd matches: True
+# CHECK: server pid: True
+# CHECK: exit status: 0
+run_client("0", "design.mlir")
+# CHECK: argv: ['3']
+# CHECK: exit status: 3
+run_client("3")
+
+# A request whose client goes away is interrupted.
+os.environ["PID_FILE"] = os.path.join(os.getcwd(), "pid")
+sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+sock.connect(socket_path)
+request = json.dumps(
+    {"argv": ["aiecc.py", "sleep"], "cwd": os.getcwd(), "env": dict(os.environ)}
+).encode()
+devnull = os.open(os.devnull, os.O_RDWR)
+socket.send_fds(sock, [struct.pack("!I", len(request)) + request], [devnull] * 3)
+while not os.path.exists(os.environ["PID_FILE"]):
+    time.sleep(0.01)
+time.sleep(0.1)
+sock.close()
+with open(os.environ["PID_FILE"]) as f:
+    pid = int(f.read())
+for _ in range(100):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        break
+    time.sleep(0.05)
+else:
+    pid = None
+# CHECK: interrupted: True
+print("interrupted:", pid is not None)
+
+server.terminate()
+server.join()
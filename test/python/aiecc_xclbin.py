@@ -0,0 +1,74 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import tempfile
+
+from aie.compiler.aiecc.xclbin import (
+    MAGIC,
+    TIMESTAMP_OFFSET,
+    UUID_OFFSET,
+    content_uuid,
+    make_deterministic,
+    pdi_uuid,
+)
+
+# Parts are kept apart.
+# CHECK: content uuid: True True
+print(
+    "content uuid:",
+    content_uuid("a", 1) == content_uuid("a", 1),
+    content_uuid("a", 1) != content_uuid("a1"),
+)
+# CHECK: version 8: 8
+print("version 8:", content_uuid("design")[14])
+
+# The PDI UUID follows the contents of the files bootgen reads, wherever they
+# are.
+dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+for d in dirs:
+    with open(os.path.join(d, "aie_cdo_init.bin"), "wb") as f:
+        f.write(b"cdo")
+bifs = [f"all:\n{{\n  file={d}/aie_cdo_init.bin\n}}\n" for d in dirs]
+first = pdi_uuid(bifs[0])
+# CHECK: pdi uuid elsewhere: True
+print("pdi uuid elsewhere:", first == pdi_uuid(bifs[1]))
+with open(os.path.join(dirs[0], "aie_cdo_init.bin"), "wb") as f:
+    f.write(b"other cdo")
+# CHECK: pdi uuid changed: True
+print("pdi uuid changed:", first != pdi_uuid(bifs[0]))
+
+
+# Stand-ins for two xclbinutil runs on the same inputs: they differ in the
+# time stamp, the unique ID and the UUID.
+def fake_xclbin(noise):
+    data = bytearray(MAGIC + bytes(600))
+    data[296:304] = noise * 8
+    data[TIMESTAMP_OFFSET : TIMESTAMP_OFFSET + 8] = noise * 8
+    data[UUID_OFFSET : UUID_OFFSET + 16] = noise * 16
+    data[500:510] = b"PDI bytes."
+    path = os.path.join(tempfile.mkdtemp(), "final.xclbin")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+paths = [fake_xclbin(b"\x01"), fake_xclbin(b"\x02")]
+uuids = [make_deterministic(p, timestamp=0) for p in paths]
+contents = [open(p, "rb").read() for p in paths]
+# CHECK: identical: True True
+print("identical:", uuids[0] == uuids[1], contents[0] == contents[1])
+# Making it deterministic again changes nothing.
+# CHECK: idempotent: True
+print(
+    "idempotent:",
+    make_deterministic(paths[0], timestamp=0) == uuids[0]
+    and open(paths[0], "rb").read() == contents[0],
+)
+# CHECK: not an xclbin
+try:
+    make_deterministic(__file__)
+except ValueError as e:
+    print("not an xclbin" if "is not an xclbin" in str(e) else e)
@@ -0,0 +1,65 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+
+import aie.compiler.util as util
+from aie.ir import Context, Location, Module
+
+DESIGN = """
+module {
+  aie.device(ipu) {
+    %t02 = aie.tile(0, 2)
+    %t03 = aie.tile(0, 3)
+    %t12 = aie.tile(1, 2)
+  }
+}
+"""
+
+
+# Stands in for util._compile_core: reports where it ran and on what.
+def describe_core(col, row, *, parent):
+    tiles = str(util._core_worker_module).count("aie.tile")
+    return f"  {tiles} tiles, in parent: {os.getpid() == parent}\n"
+
+
+def compile_cores(workers):
+    with Context(), Location.unknown():
+        module = Module.parse(DESIGN)
+        util._compile_cores(
+            [(0, 2, None), (0, 3, None), (1, 2, None)],
+            module,
+            workers,
+            compile_core=describe_core,
+            parent=os.getpid(),
+        )
+
+
+# The worker processes are spawned and import this script again.
+if __name__ == "__main__":
+    # CHECK: workers: 1
+    print("workers:", util.COMPILE_WORKERS)
+
+    # Serially, by default: the cores are compiled here, on the caller's
+    # module, and their logs are printed in order.
+    # CHECK: compiling core 0 2
+    # CHECK-NEXT: 3 tiles, in parent: True
+    # CHECK-NEXT: compiling core 0 3
+    # CHECK-NEXT: 3 tiles, in parent: True
+    # CHECK-NEXT: compiling core 1 2
+    # CHECK-NEXT: 3 tiles, in parent: True
+    compile_cores(None)
+    # CHECK: serial done: None
+    print("serial done:", util._core_worker_module)
+
+    # In a pool, each worker parses the design once; the logs are printed in
+    # the order of the cores.
+    # CHECK: compiling core 0 2
+    # CHECK-NEXT: 3 tiles, in parent: False
+    # CHECK-NEXT: compiling core 0 3
+    # CHECK-NEXT: 3 tiles, in parent: False
+    # CHECK-NEXT: compiling core 1 2
+    # CHECK-NEXT: 3 tiles, in parent: False
+    compile_cores(2)
@@ -0,0 +1,58 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import tempfile
+
+from aie.dialects.aie import AIEDevice, device, tile
+from aie.compiler.aiecc.cache import tool_fingerprint
+from aie.utils.jit import jit, toolchain_fingerprint
+
+cache_dir = tempfile.mkdtemp()
+
+
+@jit(options=["--no-xchesscc", "--no-xbridge"], cache_dir=cache_dir)
+def design(row):
+    @device(AIEDevice.ipu)
+    def device_body():
+        tile(0, row)
+
+
+# CHECK: name: design
+print("name:", design.__name__)
+
+# The key depends on the generated module, the options and the toolchain.
+key = design.key(design.module(row=2))
+# CHECK: same: True
+print("same:", key == design.key(design.module(row=2)))
+# CHECK: other params: False
+print("other params:", key == design.key(design.module(row=3)))
+other = jit(design.design, options=["--no-xchesscc"], cache_dir=cache_dir)
+# CHECK: other options: False
+print("other options:", key == other.key(other.module(row=2)))
+
+# A cached build is used as is, without compiling.
+staging = tempfile.mkdtemp()
+outputs = [os.path.join(staging, "final.xclbin"), os.path.join(staging, "insts.txt")]
+for output in outputs:
+    with open(output, "w") as f:
+        f.write(os.path.basename(output))
+design.cache.store(key, outputs)
+built, paths = design.build(row=2)
+# CHECK: cached: True ['final.xclbin', 'insts.txt']
+print("cached:", built == key, [open(p).read() for p in paths])
+
+# Updating a tool changes the fingerprint of the toolchain.
+peano = tempfile.mkdtemp()
+os.makedirs(os.path.join(peano, "bin"))
+with open(os.path.join(peano, "bin", "llc"), "w") as f:
+    f.write("llc 1")
+before = toolchain_fingerprint(peano)
+with open(os.path.join(peano, "bin", "llc"), "w") as f:
+    f.write("llc 2.0")
+toolchain_fingerprint.cache_clear()
+tool_fingerprint.cache_clear()
+# CHECK: updated llc: False
+print("updated llc:", before == toolchain_fingerprint(peano))
@@ -0,0 +1,123 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+
+# RUN: %PYTHON %s | FileCheck %s
+
+import os
+import tempfile
+
+from aie.extras.runtime.passes import (
+    MlirCompilerError,
+    Pipeline,
+    run_pipeline,
+    run_pipelines,
+    split_pipeline,
+)
+from aie.ir import Context, InsertionPoint, Location, Module, OpView
+
+SOURCE = """
+func.func @f() -> i32 {
+  %0 = arith.constant 1 : i32
+  %1 = arith.constant 2 : i32
+  %2 = arith.addi %0, %1 : i32
+  return %2 : i32
+}
+"""
+canonicalize = Pipeline().canonicalize()
+
+with Context(), Location.unknown():
+    for copy in ["parse", "clone"]:
+        module = Module.parse(SOURCE)
+        # A clone isn't inserted at the current insertion point.
+        with InsertionPoint(module.body):
+            lowered = run_pipeline(module, canonicalize, copy=copy)
+        # CHECK: parse: True False 1
+        # CHECK: clone: True False 1
+        print(
+            f"{copy}:",
+            "arith.addi" in str(module),
+            "arith.addi" in str(lowered),
+            len(module.body.operations),
+        )
+
+    # CHECK: in place: False True
+    module = Module.parse(SOURCE)
+    lowered = run_pipeline(module, canonicalize, copy=None)
+    print("in place:", "arith.addi" in str(module), str(lowered) == str(module))
+
+    # A parsed copy is a Module, the other modes return an OpView that can be
+    # used like one.
+    # CHECK: parse: Module func.func builtin.module
+    # CHECK: clone: OpView func.func builtin.module
+    # CHECK: None: OpView func.func builtin.module
+    for copy in ["parse", "clone", None]:
+        lowered = run_pipeline(Module.parse(SOURCE), canonicalize, copy=copy)
+        print(
+            f"{copy}:",
+            "OpView" if isinstance(lowered, OpView) else type(lowered).__name__,
+            lowered.body.operations[0].operation.name,
+            lowered.operation.name,
+        )
+
+    # With `keep_input`, the report has the module as it was before the
+    # pipeline ran.
+    # CHECK: failed: True
+    module = Module.parse(SOURCE)
+    try:
+        run_pipeline(module, "builtin.module(bogus)", copy=None, keep_input=True)
+    except MlirCompilerError:
+        report = os.path.join(tempfile.gettempdir(), "UnnammedModule.mlir")
+        with open(report) as f:
+            print("failed:", "arith.addi" in f.read())
+
+# CHECK: ['builtin.module(canonicalize)', 'builtin.module(func.func(cse))', 'builtin.module(func.func(canonicalize{ max-iterations=1 }))']
+print(
+    split_pipeline(
+        "builtin.module(canonicalize,func.func(cse,canonicalize{ max-iterations=1 }))"
+    )
+)
+
+with Context(), Location.unknown():
+    # The passes are printed as they run one at a time.
+    # CHECK: builtin.module(cse)
+    # CHECK-NEXT: builtin.module(canonicalize)
+    statistics = []
+    run_pipeline(
+        Module.parse(SOURCE),
+        Pipeline().cse().canonicalize(),
+        print_pipeline=True,
+        pass_statistics=statistics,
+    )
+    # CHECK: builtin.module(cse) 5 5 {}
+    # CHECK: builtin.module(canonicalize) 5 3 {'arith.addi': -1, 'arith.constant': -1}
+    for record in statistics:
+        print(
+            record["pass"],
+            record["ops_before"],
+            record["ops_after"],
+            record["ops_changed"],
+        )
+
+    # The pass all the pipelines start with runs once.
+    statistics = []
+    module = Module.parse(SOURCE)
+    lowered = run_pipelines(
+        module,
+        {
+            "cse": Pipeline().canonicalize().cse(),
+            "inline": Pipeline().canonicalize().inline(),
+            "canonicalize": Pipeline().canonicalize(),
+        },
+        pass_statistics=statistics,
+    )
+    # CHECK: ['builtin.module(canonicalize)', 'builtin.module(cse)', 'builtin.module(inline)']
+    print([record["pass"] for record in statistics])
+    # CHECK: forks: True False 3
+    print(
+        "forks:",
+        "arith.addi" in str(module),
+        "arith.addi" in str(lowered["canonicalize"]),
+        len({id(m) for m in lowered.values()}),
+    )
+    # CHECK: opviews: True
+    print("opviews:", all(isinstance(m, OpView) for m in lowered.values()))
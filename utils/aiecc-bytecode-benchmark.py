@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Compare MLIR text and bytecode for aiecc's intermediate files.
+
+aiecc writes input_with_addresses.mlir, input_physical.mlir and the per-core
+MLIR files as bytecode, which the tools downstream parse again and again.  For
+each design, this script lowers it the way aiecc does to get
+input_with_addresses.mlir and times, for both formats:
+
+  write       writing it from the Python bindings, as aiecc does
+  parse       parsing it with the Python bindings
+  aie-opt     parsing it (and printing nothing) with aie-opt, like the tools
+              that read it (only if aie-opt is on PATH)
+
+Designs with initialized buffers or long runtime sequences benefit the most.
+
+Example usage:
+$ aiecc-bytecode-benchmark.py design.mlir other_design.mlir
+$ aiecc-bytecode-benchmark.py --repeat 20 --json bytecode.json design.mlir
+"""
+
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from aie.compiler.aiecc.main import INPUT_WITH_ADDRESSES_PIPELINE, apply_passes
+from aie.ir import Context, Location, Module
+
+DEFAULT_DESIGN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "test",
+    "aiecc",
+    "simple_aie2.mlir",
+)
+
+
+def time_it(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def write_text(module, path):
+    with open(path, "w") as f:
+        f.write(str(module))
+
+
+def write_bytecode(module, path):
+    with open(path, "wb") as f:
+        module.operation.write_bytecode(f)
+
+
+def parse(path):
+    with open(path, "rb") as f:
+        Module.parse(f.read())
+
+
+def benchmark(design, repeat, workdir):
+    with Context(), Location.unknown():
+        with open(design, "r") as f:
+            module = Module.parse(f.read())
+        apply_passes(INPUT_WITH_ADDRESSES_PIPELINE.materialize(module=True), module)
+
+        result = {"design": design}
+        aie_opt = shutil.which("aie-opt")
+        for fmt, write in [("text", write_text), ("bytecode", write_bytecode)]:
+            path = os.path.join(workdir, f"input_with_addresses.{fmt}.mlir")
+            result[f"{fmt}_write_s"] = time_it(lambda: write(module, path), repeat)
+            result[f"{fmt}_bytes"] = os.path.getsize(path)
+            result[f"{fmt}_parse_s"] = time_it(lambda: parse(path), repeat)
+            if aie_opt:
+                command = [aie_opt, path, "-o", os.devnull]
+                result[f"{fmt}_aie_opt_s"] = time_it(
+                    lambda: subprocess.run(command, check=True), repeat
+                )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "designs", nargs="*", default=[DEFAULT_DESIGN], help="Designs to measure"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Runs per measurement (default 10)"
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="aiecc-bytecode-")
+    results = []
+    try:
+        for design in args.designs:
+            r = benchmark(design, args.repeat, workdir)
+            results.append(r)
+            print(os.path.basename(design))
+            print(
+                f"  size     text {r['text_bytes']:>12,} B  "
+                f"bytecode {r['bytecode_bytes']:>12,} B"
+            )
+            for step in ["write", "parse", "aie_opt"]:
+                if f"text_{step}_s" not in r:
+                    continue
+                text, bytecode = r[f"text_{step}_s"], r[f"bytecode_{step}_s"]
+                print(
+                    f"  {step:<8} text {text:10.4f} s    bytecode {bytecode:10.4f} s"
+                    f"  ({text / max(bytecode, 1e-9):.1f}x)"
+                )
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Measure how long aiecc takes to get going on its common entry points.
+
+For small designs compiled in bulk, starting aiecc (the interpreter, its
+imports, the MLIR bindings) is a large fraction of the total time.  This
+script times, in fresh processes:
+
+  import      importing aie.compiler.aiecc.main
+  help        aiecc.py --help
+  bad-arg     aiecc.py with an unknown option
+  dry-run     aiecc.py -n on a design: parses it and runs the in-process
+              lowering, but executes no tools
+  up-to-date  aiecc.py --incremental on a design that has already been built
+              (only with --build-args, as it needs the full tool flow)
+
+With --server, the aiecc.py entry points are also timed through a running
+aiecc compile server (see aiecc-server.py).
+
+Example usage:
+$ aiecc-startup-benchmark.py
+$ aiecc-startup-benchmark.py --repeat 20 --json startup.json
+$ aiecc-startup-benchmark.py --design add_one.mlir --build-args=--no-compile-host
+"""
+
+# This file is licensed under the Apache License v2.0 with LLVM Exceptions.
+# See https://llvm.org/LICENSE.txt for license information.
+# SPDX-License-Identifier: Apache-2.0 WITH LLVM-exception
+#
+# (c) Copyright 2024 Advanced Micro Devices, Inc.
+
+import argparse
+import json
+import os
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+DEFAULT_DESIGN = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "test",
+    "aiecc",
+    "simple_aie2.mlir",
+)
+
+
+def time_command(command, repeat, cwd=None, env=None):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            command,
+            cwd=cwd,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def entry_points(args, workdir):
+    aiecc = [sys.executable, args.aiecc]
+    design = os.path.abspath(args.design)
+    yield "import", [sys.executable, "-c", "import aie.compiler.aiecc.main"], True
+    yield "help", aiecc + ["--help"], False
+    yield "bad-arg", aiecc + ["--no-such-option", design], False
+    yield "dry-run", aiecc + ["-n", "--tmpdir", workdir, design], False
+    if args.build_args is not None:
+        build = aiecc + ["--incremental", "--tmpdir", workdir]
+        build += shlex.split(args.build_args) + [design]
+        # Build once, so that the timed runs find everything up to date.
+        subprocess.run(build, cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+        yield "up-to-date", build, False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--aiecc",
+        default=shutil.which("aiecc.py"),
+        help="aiecc.py to benchmark (default is the one on PATH)",
+    )
+    parser.add_argument(
+        "--design",
+        default=DEFAULT_DESIGN,
+        help="Design for the dry-run and up-to-date entry points",
+    )
+    parser.add_argument(
+        "--build-args",
+        default=None,
+        help="aiecc options to build --design with; enables up-to-date",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Runs per entry point (default 10)"
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Also time the aiecc.py entry points through a compile server",
+    )
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    if args.aiecc is None:
+        sys.exit("aiecc.py not found, pass --aiecc")
+
+    workdir = tempfile.mkdtemp(prefix="aiecc-startup-")
+    server = None
+    results = []
+    try:
+        if args.server:
+            socket_path = os.path.join(workdir, "aiecc.sock")
+            server_script = os.path.join(
+                os.path.dirname(os.path.abspath(args.aiecc)), "aiecc-server.py"
+            )
+            server = subprocess.Popen(
+                [sys.executable, server_script, "--socket", socket_path],
+                stderr=subprocess.DEVNULL,
+            )
+            while not os.path.exists(socket_path):
+                if server.poll() is not None:
+                    sys.exit("aiecc server failed to start")
+                time.sleep(0.05)
+            server_env = dict(os.environ, AIECC_SERVER_SOCKET=socket_path)
+
+        for name, command, local_only in entry_points(args, workdir):
+            variants = [(name, None)]
+            if server is not None and not local_only:
+                variants.append((name + " (server)", server_env))
+            for label, env in variants:
+                times = time_command(command, args.repeat, cwd=workdir, env=env)
+                results.append(
+                    {
+                        "name": label,
+                        "median_s": statistics.median(times),
+                        "min_s": min(times),
+                        "max_s": max(times),
+                        "runs": len(times),
+                    }
+                )
+                r = results[-1]
+                print(
+                    f"{label:<24} median {r['median_s']:7.3f} s"
+                    f"  min {r['min_s']:7.3f} s  max {r['max_s']:7.3f} s"
+                )
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"aiecc": args.aiecc, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()